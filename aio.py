@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+
+class LoopThread:
+    # One event loop on a daemon thread per process. Async clients keep their connection
+    # pools on it across calls, and sync code (job workers, the CLI) hands coroutines
+    # over with run(). Started on first use, so a forked worker gets its own.
+    def __init__(self, name="asyncio"):
+        self.name = name
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True).start()
+        return self.loop
+
+    def submit(self, coro):
+        # Returns a concurrent.futures.Future
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+    def stats(self):
+        loop = self.loop
+        return {"running": bool(loop and loop.is_running()),
+                "tasks": len(asyncio.all_tasks(loop)) if loop else 0}
+
@@ -0,0 +1,156 @@
+import json
+import zlib
+from datetime import datetime, timezone
+
+from batch import valid_url
+from db import database
+from scrape_cache import canonicalize_url
+
+# Schema fields stored in their own columns; the rest live in generatedContent
+TOP_LEVEL = ("productName", "productDescription")
+
+
+def gzip_stream(chunks, level=6):
+    # Compresses as it goes, flushing after each chunk so the client sees rows steadily
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield c.compress(chunk.encode("utf-8")) + c.flush(zlib.Z_SYNC_FLUSH)
+    yield c.flush()
+
+
+def gunzip_lines(stream, chunk_size=64 * 1024):
+    # Lines of a gzip stream (e.g. an upload) without holding the whole body
+    d = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    rest = b""
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        rest += d.decompress(data)
+        *lines, rest = rest.split(b"\n")
+        yield from lines
+    rest += d.flush()
+    yield from rest.split(b"\n")
+
+
+class CampaignArchive:
+    # Campaigns as NDJSON, one object per line in the shape /api/campaigns/<id> returns.
+    # export() walks the table in id order a chunk at a time; an interrupted export
+    # resumes from the last id it wrote. load() validates lines and inserts them in
+    # batches, each one write transaction, skipping URLs that already have a campaign.
+    def __init__(self, db_file, schema, decode, insert_many, known_urls, chunk_size=500, batch_size=1000,
+                 max_errors=20):
+        self.db = database(db_file)
+        self.schema = schema
+        self.decode = decode
+        self.insert_many = insert_many
+        self.known_urls = known_urls
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+
+    def export(self, since_id=0, limit=None, progress=None):
+        # Yields one str per chunk of rows, calling progress(rows, last_id) after each.
+        # Each chunk is a short read on a pooled connection, so a slow client never
+        # holds a read transaction open (which would keep the WAL from being
+        # checkpointed) and memory stays at one chunk.
+        last, left = since_id, limit
+        while left is None or left > 0:
+            size = self.chunk_size if left is None else min(self.chunk_size, left)
+            with self.db.connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, original_url, product_name, product_description, created_at, generated_content,
+                           content_codec
+                    FROM campaigns WHERE id > ? ORDER BY id LIMIT ?
+                """, (last, size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            if left is not None:
+                left -= len(rows)
+            yield "".join(self._line(row) for row in rows)
+            if progress:
+                progress(len(rows), last)
+
+    def _line(self, row):
+        cid, url, name, description, created_at, value, tag = row
+        head = json.dumps({"id": cid, "originalUrl": url, "productName": name, "productDescription": description,
+                           "createdAt": created_at})
+        # generated_content is JSON text already; it's spliced in rather than re-serialised
+        content = self.decode(value, tag) if value is not None else "null"
+        return f'{head[:-1]}, "generatedContent": {content}}}\n'
+
+    def validate(self, record):
+        # Returns the campaign to insert, or raises ValueError
+        if not isinstance(record, dict):
+            raise ValueError("not a JSON object")
+        url = record.get("originalUrl")
+        if not isinstance(url, str) or not valid_url(url.strip()):
+            raise ValueError("originalUrl must be an http(s) URL")
+        content = record.get("generatedContent")
+        if not isinstance(content, dict):
+            raise ValueError("generatedContent must be an object")
+        campaign = {"originalUrl": url.strip(), "generatedContent": {}}
+        for name, spec in self.schema.items():
+            source, target = (record, campaign) if name in TOP_LEVEL else (content, campaign["generatedContent"])
+            value = source.get(name, spec.get("default"))
+            # Types only: archived campaigns predate today's item limits
+            if spec["type"] == "array":
+                if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                    raise ValueError(f"{name} must be a list of strings")
+            elif not isinstance(value, str):
+                raise ValueError(f"{name} must be a string")
+            target[name] = value
+        created_at = record.get("createdAt")
+        if created_at is not None:
+            try:
+                created = datetime.fromisoformat(str(created_at))
+            except ValueError:
+                raise ValueError("createdAt must be an ISO timestamp")
+            if created.tzinfo:
+                created = created.astimezone(timezone.utc)
+            # The format CURRENT_TIMESTAMP writes, which the (created_at, id) cursors compare
+            created_at = created.strftime("%Y-%m-%d %H:%M:%S")
+        campaign["createdAt"] = created_at
+        return campaign
+
+    def load(self, lines):
+        # lines: NDJSON as str or bytes lines. Returns what happened to them; the first
+        # max_errors invalid lines are reported with their line numbers.
+        counts = {"imported": 0, "duplicates": 0, "invalid": 0, "errors": [], "firstId": None, "lastId": None}
+        batch = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                batch.append(self.validate(json.loads(line)))
+            except ValueError as e:
+                counts["invalid"] += 1
+                if len(counts["errors"]) < self.max_errors:
+                    counts["errors"].append({"line": number, "error": str(e)})
+                continue
+            if len(batch) >= self.batch_size:
+                self._insert(batch, counts)
+                batch = []
+        self._insert(batch, counts)
+        return counts
+
+    def _insert(self, batch, counts):
+        if not batch:
+            return
+        with self.db.transaction(immediate=True) as conn:
+            # Earlier batches are committed by now, so this covers repeats within the file too
+            seen = self.known_urls(conn, [c["originalUrl"] for c in batch])
+            fresh = []
+            for campaign in batch:
+                key = canonicalize_url(campaign["originalUrl"])
+                if key in seen:
+                    counts["duplicates"] += 1
+                    continue
+                seen.add(key)
+                fresh.append(campaign)
+            ids = self.insert_many(conn, fresh)
+        if ids:
+            counts["imported"] += len(ids)
+            counts["firstId"] = counts["firstId"] or ids[0]
+            counts["lastId"] = ids[-1]
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+
+from http_cache import StaticBody
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+CONTENT_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+CSS_SPACE = re.compile(r"\s+")
+CSS_PUNCT = re.compile(r"\s*([{}:;,>])\s*")
+
+
+def minify_css(source):
+    css = CSS_COMMENT.sub("", source)
+    css = CSS_SPACE.sub(" ", css)
+    css = CSS_PUNCT.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(source):
+    # Line-based only: drops indentation, blank lines and whole-line // comments but
+    # keeps every newline, so automatic semicolon insertion and strings are untouched.
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+class AssetBundle:
+    # Loads static/ once at startup, minifies each file and serves it under a
+    # content-hashed name, so the URL changes whenever the file does.
+    def __init__(self, directory=STATIC_DIR, cache_control=IMMUTABLE):
+        self.directory = directory
+        self.cache_control = cache_control
+        self.urls = {}
+        self.files = {}
+        self.load()
+
+    def load(self):
+        urls, files = {}, {}
+        for filename in sorted(os.listdir(self.directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext not in CONTENT_TYPES:
+                continue
+            with open(os.path.join(self.directory, filename), encoding="utf-8") as f:
+                body = MINIFIERS[ext](f.read()).encode("utf-8")
+            fingerprinted = f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+            files[fingerprinted] = StaticBody(body, CONTENT_TYPES[ext], self.cache_control)
+            # home.css -> assets.home_css in templates
+            urls[f"{stem}_{ext[1:]}"] = f"/assets/{fingerprinted}"
+        self.urls, self.files = urls, files
+        self.version = hashlib.sha256(" ".join(sorted(files)).encode("utf-8")).hexdigest()[:10]
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["urls"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, filename):
+        return self.files.get(filename)
+
+    def stats(self):
+        return {name: {"bytes": len(body.identity), "gzip": len(body.gzip),
+                       "br": len(body.br) if body.br is not None else None}
+                for name, body in self.files.items()}
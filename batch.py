@@ -0,0 +1,153 @@
+import asyncio
+import csv
+import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db import database
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def parse_csv(text):
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "url" in header:
+        col = header.index("url")
+        rows = rows[1:]
+    else:
+        col = 0
+    return [row[col].strip() for row in rows if len(row) > col and row[col].strip()]
+
+
+def valid_url(url):
+    return url.lower().startswith(("http://", "https://"))
+
+
+class BatchRunner:
+    # With agenerate (a coroutine twin of generate) and a LoopThread, items run as tasks on
+    # that event loop instead of a thread pool, so concurrency can go to the hundreds
+    def __init__(self, db_file, generate, insert_many, concurrency=4, commit_every=25, agenerate=None, loop=None):
+        self.db = database(db_file)
+        self.generate = generate
+        self.insert_many = insert_many
+        self.concurrency = concurrency
+        self.commit_every = commit_every
+        self.agenerate = agenerate
+        self.loop = loop
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    campaign_id INTEGER,
+                    error TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (batch_id, position)
+                )
+            """)
+
+    def create(self, urls):
+        batch_id = uuid.uuid4().hex
+        rows = [(batch_id, i, url, PENDING if valid_url(url) else FAILED, None if valid_url(url) else "Invalid URL")
+                for i, url in enumerate(urls)]
+        with self.db.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO batch_items (batch_id, position, url, status, error) VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        return batch_id
+
+    def exists(self, batch_id):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT 1 FROM batch_items WHERE batch_id = ? LIMIT 1", (batch_id,)).fetchone()
+        return row is not None
+
+    def _checkpoint(self, batch_id, finished):
+        # One transaction per checkpoint: the campaigns and the item status that
+        # records them land together, so a crash never double-inserts on resume
+        # A campaign that already has an id was reused (a duplicate), not generated
+        succeeded = [(pos, campaign) for pos, campaign, _ in finished if campaign and not campaign.get("id")]
+        reused = [(pos, campaign["id"]) for pos, campaign, _ in finished if campaign and campaign.get("id")]
+        with self.db.transaction(immediate=True) as conn:
+            ids = self.insert_many(conn, [campaign for _, campaign in succeeded])
+            conn.executemany("""
+                UPDATE batch_items SET status = ?, campaign_id = ?, error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE batch_id = ? AND position = ?
+            """, [(DONE, cid, batch_id, pos) for (pos, _), cid in zip(succeeded, ids)] +
+                 [(DONE, cid, batch_id, pos) for pos, cid in reused])
+            conn.executemany("""
+                UPDATE batch_items SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE batch_id = ? AND position = ?
+            """, [(FAILED, error, batch_id, pos) for pos, campaign, error in finished if not campaign])
+
+    def run(self, batch_id, concurrency=None, force=False, retry_failed=True):
+        statuses = (PENDING, FAILED) if retry_failed else (PENDING,)
+        with self.db.connection() as conn:
+            items = conn.execute(f"""
+                SELECT position, url FROM batch_items
+                WHERE batch_id = ? AND status IN ({",".join("?" * len(statuses))})
+                ORDER BY position
+            """, (batch_id, *statuses)).fetchall()
+        items = [(pos, url) for pos, url in items if valid_url(url)]
+
+        if self.agenerate and self.loop:
+            self.loop.run(self._arun(batch_id, items, concurrency or self.concurrency, force))
+            return self.results(batch_id)
+
+        def work(pos, url):
+            try:
+                campaign = self.generate(url, force=force)
+                return pos, campaign, None if campaign else "Failed to generate campaign"
+            except Exception as e:
+                return pos, None, str(e)
+
+        finished = []
+        with ThreadPoolExecutor(max_workers=concurrency or self.concurrency) as pool:
+            futures = [pool.submit(work, pos, url) for pos, url in items]
+            for future in as_completed(futures):
+                finished.append(future.result())
+                if len(finished) >= self.commit_every:
+                    self._checkpoint(batch_id, finished)
+                    finished = []
+        if finished:
+            self._checkpoint(batch_id, finished)
+        return self.results(batch_id)
+
+    async def _arun(self, batch_id, items, concurrency, force):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def work(pos, url):
+            async with semaphore:
+                try:
+                    campaign = await self.agenerate(url, force=force)
+                    return pos, campaign, None if campaign else "Failed to generate campaign"
+                except Exception as e:
+                    return pos, None, str(e)
+
+        finished = []
+        for done in asyncio.as_completed([work(pos, url) for pos, url in items]):
+            finished.append(await done)
+            if len(finished) >= self.commit_every:
+                # The write transaction runs off the loop so in-flight generations keep going
+                await asyncio.to_thread(self._checkpoint, batch_id, finished)
+                finished = []
+        if finished:
+            await asyncio.to_thread(self._checkpoint, batch_id, finished)
+
+    def results(self, batch_id):
+        with self.db.connection() as conn:
+            rows = conn.execute("""
+                SELECT position, url, status, campaign_id, error FROM batch_items
+                WHERE batch_id = ? ORDER BY position
+            """, (batch_id,)).fetchall()
+        results = [{"position": r[0], "url": r[1], "status": r[2], "campaignId": r[3], "error": r[4]} for r in rows]
+        counts = {s: sum(1 for r in results if r["status"] == s) for s in (PENDING, DONE, FAILED)}
+        return {"batchId": batch_id, "total": len(results), **counts, "results": results}
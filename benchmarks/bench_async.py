@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# The generation pipeline on threads (generate_campaign in a pool, what batches used to
+# do) against the asyncio one (async_generate_campaign on the pipeline loop) at rising
+# concurrency. Pages come from benchmarks/stub_site.py and completions from
+# benchmarks/stub_llm.py, each in its own process, so the app's process only does the
+# app's work. Reports throughput, latency and the threads it took.
+#
+#   python benchmarks/bench_async.py [--concurrency 8,64,256] [--llm-latency 1.0] [--rounds 2]
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+from load import FIXTURES, free_port, percentile, wait_for  # noqa: E402
+
+
+def summary(latencies, elapsed, failed, peak_threads):
+    latencies.sort()
+    return {"rps": len(latencies) / elapsed, "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+            "failed": failed, "threads": peak_threads}
+
+
+class ThreadCounter:
+    # Peak live threads in this process while a run is going
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def _watch(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_threads(main, urls, concurrency):
+    def one(url):
+        start = time.perf_counter()
+        ok = main.generate_campaign(url, force=True) is not None
+        return ok, time.perf_counter() - start
+
+    with ThreadCounter() as threads:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, urls))
+        elapsed = time.perf_counter() - start
+    return summary([t for ok, t in results if ok], elapsed, sum(not ok for ok, _ in results), threads.peak)
+
+
+def run_async(main, urls, concurrency):
+    async def batch():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(url):
+            async with semaphore:
+                start = time.perf_counter()
+                ok = await main.async_generate_campaign(url, force=True) is not None
+                return ok, time.perf_counter() - start
+
+        return await asyncio.gather(*(one(url) for url in urls))
+
+    with ThreadCounter() as threads:
+        start = time.perf_counter()
+        results = main.pipeline.run(batch())
+        elapsed = time.perf_counter() - start
+    return summary([t for ok, t in results if ok], elapsed, sum(not ok for ok, _ in results), threads.peak)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="8,64,256")
+    parser.add_argument("--rounds", type=int, default=2, help="URLs per run = rounds x concurrency")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    llm_port, site_port = free_port(), free_port()
+    procs = [
+        subprocess.Popen([sys.executable, os.path.join(HERE, "stub_llm.py"), "--port", str(llm_port),
+                          "--latency", str(args.llm_latency)], stdout=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, os.path.join(HERE, "stub_site.py"), "--port", str(site_port),
+                          "--latency", str(args.site_latency)], stdout=subprocess.DEVNULL),
+    ]
+    try:
+        for port in (llm_port, site_port):
+            wait_for(port)
+        # main reads its settings at import: point it at the stubs, take the quota and
+        # duplicate shortcuts out, and keep its database in a scratch directory
+        os.environ.update(GROQ_BASE_URL=f"http://127.0.0.1:{llm_port}", GROQ_API_KEY="stub", DEDUP_ENABLED="0",
+                          LLM_RPM="1000000", LLM_TPM="1000000000", LLM_FALLBACK_RPM="1000000",
+                          LLM_FALLBACK_TPM="1000000000", OPENAI_FALLBACK_BASE_URL="", OPENAI_FALLBACK_API_KEY="",
+                          FETCH_POOL_SIZE=str(max(levels)))
+        os.chdir(tempfile.mkdtemp(prefix="bench-async-"))
+        sys.path.insert(0, ROOT)
+        sys.stdout, stdout = open(os.devnull, "w"), sys.stdout  # the app's per-field prints
+        import main as app
+        app.init_db()
+        sys.stdout = stdout
+
+        print(f"LLM latency {args.llm_latency * 1000:g} ms, page latency {args.site_latency * 1000:g} ms, "
+              f"{args.rounds} x concurrency URLs per run\n")
+        print(f"{'pipeline':<9}{'conc':>6}{'urls':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'failed':>8}{'threads':>9}")
+        for concurrency in levels:
+            for name, run in (("threads", run_threads), ("asyncio", run_async)):
+                urls = [f"http://127.0.0.1:{site_port}/{FIXTURES[i % len(FIXTURES)]}/{name}-{concurrency}-{i}"
+                        for i in range(args.rounds * concurrency)]
+                sys.stdout = open(os.devnull, "w")
+                try:
+                    r = run(app, urls, concurrency)
+                finally:
+                    sys.stdout = stdout
+                print(f"{name:<9}{concurrency:>6}{len(urls):>6}{r['rps']:>9.1f}{r['p50'] * 1000:>9.0f}"
+                      f"{r['p95'] * 1000:>9.0f}{r['failed']:>8}{r['threads']:>9}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# generated_content storage: plain JSON against codec.py's zlib and zstd, each with and
+# without a dictionary trained on the stored campaigns. Campaigns are synthetic but
+# shaped like the model's output (the same keys, stock phrasing, varying products).
+# Reports bytes per row, database size after VACUUM, and read latency for a campaign by
+# id and for a page of 20 with their content.
+#
+#   python benchmarks/bench_codec.py [--campaigns 5000] [--reads 3000]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import codec  # noqa: E402
+from codec import ContentCodec  # noqa: E402
+from db import database  # noqa: E402
+
+BRANDS = ["Nike", "Glossier", "Allbirds", "Patagonia", "Oura", "Stanley", "Dyson", "Aesop", "Hoka", "Fenty",
+          "Yeti", "Loewe", "Rhode", "Olaplex", "Lululemon", "Bose", "Brooklinen", "Away", "Therabody", "Ember"]
+ITEMS = ["Tee", "Serum", "Runner", "Jacket", "Ring", "Tumbler", "Hair Dryer", "Hand Balm", "Trail Shoe",
+         "Lip Gloss", "Cooler", "Tote", "Cleanser", "Bond Repair Oil", "Leggings", "Earbuds", "Sheet Set",
+         "Carry-On", "Massage Gun", "Smart Mug"]
+TRAITS = ["lightweight", "breathable", "waterproof", "recycled", "clinically tested", "vegan", "ultra-soft",
+          "all-day", "travel-ready", "award-winning", "sustainably made", "insulated"]
+SENTENCES = [
+    "Meet the {product}, the {trait} upgrade your routine has been waiting for.",
+    "Designed for people who refuse to compromise, it blends {trait} comfort with everyday style.",
+    "Whether you're heading to the gym or the office, the {product} keeps up with you.",
+    "Thousands of customers already made the switch, and they're not looking back.",
+    "It's {trait}, {trait2} and built to last, so you can focus on what matters.",
+    "Order today and get free shipping plus 30-day hassle-free returns.",
+    "Limited stock available: grab yours before it sells out again.",
+    "Feel the difference from the very first day.",
+    "{brand} spent two years perfecting every detail so you don't have to think twice.",
+    "This is the {product} you'll reach for every single day.",
+    "Join the {brand} community and discover why everyone is talking about it.",
+    "Treat yourself, or someone you love, to something genuinely better.",
+]
+FEATURES = ["Free shipping on all orders", "30-day money-back guarantee", "Made from {trait} materials",
+            "Available in {n} colors", "Lifetime warranty", "Dermatologist approved", "Machine washable",
+            "Carbon-neutral delivery", "Fits in any bag", "Rated {rating} stars by {count} customers",
+            "Ships in 24 hours", "Plastic-free packaging", "{trait} design for all-day wear",
+            "Backed by {n} years of research", "Easy 1-click returns", "Exclusive online colorway"]
+CELEBRITIES = ["Zendaya", "Ryan Reynolds", "Serena Williams", "Hailey Bieber", "Pedro Pascal", "Simone Biles"]
+
+
+def campaign(rng):
+    brand, item = rng.choice(BRANDS), rng.choice(ITEMS)
+    product = f"{brand} {rng.choice(TRAITS).title()} {item}"
+    fill = lambda s: s.format(product=product, brand=brand, trait=rng.choice(TRAITS), trait2=rng.choice(TRAITS),  # noqa: E731
+                              n=rng.randint(2, 12), rating=round(rng.uniform(4.2, 4.9), 1),
+                              count=f"{rng.randint(1, 90) * 1000:,}")
+    paragraphs = [" ".join(fill(s) for s in rng.sample(SENTENCES, rng.randint(2, 4))) for _ in range(3)]
+    return {
+        "adCopy": "\n\n".join(paragraphs),
+        "keywords": [product, f"{brand} {item}", f"best {item.lower()}", f"{rng.choice(TRAITS)} {item.lower()}",
+                     f"{item.lower()} gift", f"buy {item.lower()} online"][:rng.randint(4, 6)],
+        "celebrityEndorsement": f"{rng.choice(CELEBRITIES)} would love the {product} because it matches "
+                                f"their {rng.choice(TRAITS)} lifestyle and effortless style.",
+        "features": [fill(f) for f in rng.sample(FEATURES, rng.randint(4, 6))],
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(name, codec_name, train, contents, reads, seed):
+    workdir = tempfile.mkdtemp(prefix="codec-")
+    path = os.path.join(workdir, "campaigns.db")
+    db = database(path)
+    with db.transaction() as conn:
+        conn.execute("""
+            CREATE TABLE campaigns (id INTEGER PRIMARY KEY AUTOINCREMENT, original_url TEXT, product_name TEXT,
+                                    product_description TEXT, generated_content TEXT, content_codec TEXT,
+                                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+        """)
+        conn.executemany("INSERT INTO campaigns (original_url, product_name, generated_content) VALUES (?, ?, ?)",
+                         [(f"https://example.com/p/{i}", f"Product {i}", c) for i, c in enumerate(contents)])
+    # The same path the app takes: rows arrive as plain JSON, compact() (after train())
+    # rewrites them
+    content = ContentCodec(path, codec=codec_name)
+    content.init_db()
+    start = time.perf_counter()
+    if train:
+        content.train(samples=1000)
+    train_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    content.compact(batch_size=1000)
+    encode_us = (time.perf_counter() - start) / len(contents) * 1e6
+    db.vacuum(full=True)
+    with db.connection() as conn:
+        stored = conn.execute("SELECT sum(length(generated_content)) FROM campaigns").fetchone()[0]
+    size = os.path.getsize(path)
+
+    rng = random.Random(seed)
+    by_id, pages = [], []
+    with db.connection() as conn:
+        for _ in range(reads):
+            t0 = time.perf_counter()
+            row = conn.execute("SELECT generated_content, content_codec FROM campaigns WHERE id = ?",
+                               (rng.randint(1, len(contents)),)).fetchone()
+            content.loads(*row)
+            by_id.append(time.perf_counter() - t0)
+        for _ in range(reads // 20):
+            t0 = time.perf_counter()
+            first = rng.randint(1, len(contents) - 20)
+            for row in conn.execute("SELECT generated_content, content_codec FROM campaigns WHERE id >= ? "
+                                    "ORDER BY id LIMIT 20", (first,)):
+                content.loads(*row)
+            pages.append(time.perf_counter() - t0)
+    db.close()
+    return {"name": name, "rowBytes": stored / len(contents), "fileBytes": size, "encodeUs": encode_us,
+            "trainMs": train_seconds * 1000, "getP50": percentile(by_id, 0.5) * 1e6,
+            "getP95": percentile(by_id, 0.95) * 1e6, "pageP50": percentile(pages, 0.5) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--campaigns", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    contents = [json.dumps(campaign(rng)) for _ in range(args.campaigns)]
+
+    modes = [("plain JSON", "none", False), ("zlib", "zlib", False), ("zlib + dictionary", "zlib", True)]
+    if codec.zstandard:
+        modes += [("zstd", "zstd", False), ("zstd + dictionary", "zstd", True)]
+    print(f"{args.campaigns} campaigns, {sum(map(len, contents)) / len(contents):.0f} bytes of JSON each on average; "
+          f"{args.reads} reads by id, {args.reads // 20} pages of 20\n")
+    print(f"{'codec':<20}{'bytes/row':>10}{'ratio':>7}{'db file':>11}{'encode us':>11}{'get p50 us':>12}"
+          f"{'get p95 us':>12}{'page p50 us':>13}")
+    plain = None
+    for name, codec_name, train in modes:
+        r = run(name, codec_name, train, contents, args.reads, args.seed)
+        plain = plain or r
+        print(f"{name:<20}{r['rowBytes']:>10.0f}{r['rowBytes'] / plain['rowBytes']:>7.2f}"
+              f"{r['fileBytes'] / 1024:>9.0f}KB{r['encodeUs']:>11.1f}{r['getP50']:>12.1f}{r['getP95']:>12.1f}"
+              f"{r['pageP50']:>13.1f}")
+    if not codec.zstandard:
+        print("\nzstd: not installed (pip install zstandard) - skipped")
+
+
+if __name__ == "__main__":
+    main()
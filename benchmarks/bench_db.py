@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Concurrent read/write benchmark: the original connect-per-call, rollback-journal
+# access pattern against db.Database (pooled connections, WAL, tuned pragmas).
+#
+#   python benchmarks/bench_db.py [--readers 8] [--writers 2] [--seconds 5] [--rows 5000]
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import Database  # noqa: E402
+
+SCHEMA = """
+    CREATE TABLE campaigns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        original_url TEXT,
+        product_name TEXT,
+        product_description TEXT,
+        generated_content TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+INSERT = """
+    INSERT INTO campaigns (original_url, product_name, product_description, generated_content)
+    VALUES (?, ?, ?, ?)
+"""
+SELECT = """
+    SELECT id, original_url, product_name, product_description, generated_content, created_at
+    FROM campaigns WHERE id = ?
+"""
+CONTENT = json.dumps({"adCopy": "Lorem ipsum " * 150, "keywords": ["a", "b", "c", "d", "e"],
+                      "celebrityEndorsement": "Great", "features": ["one", "two", "three", "four"]})
+
+
+def row(i):
+    return (f"https://instagram.com/p/{i}/", f"Product {i}", "A product " * 20, CONTENT)
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany(INSERT, [row(i) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+class Legacy:
+    # What save_campaign()/get_campaign() used to do on every call
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, cid):
+        conn = sqlite3.connect(self.path)
+        conn.execute(SELECT, (cid,)).fetchone()
+        conn.close()
+
+    def write(self, i):
+        conn = sqlite3.connect(self.path)
+        conn.execute(INSERT, row(i))
+        conn.commit()
+        conn.close()
+
+
+class Pooled:
+    def __init__(self, path):
+        self.db = Database(path, pool_size=32)
+
+    def read(self, cid):
+        with self.db.connection() as conn:
+            conn.execute(SELECT, (cid,)).fetchone()
+
+    def write(self, i):
+        with self.db.transaction() as conn:
+            conn.execute(INSERT, row(i))
+
+
+def run(store, readers, writers, seconds, rows):
+    stop = time.monotonic() + seconds
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    latencies = {"reads": [], "writes": []}
+    lock = threading.Lock()
+
+    def loop(kind, op):
+        n, errors, lat = 0, 0, []
+        i = 0
+        while time.monotonic() < stop:
+            i += 1
+            start = time.perf_counter()
+            try:
+                op(i % rows + 1)
+                n += 1
+                lat.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts[kind] += n
+            counts["errors"] += errors
+            latencies[kind] += lat
+
+    threads = [threading.Thread(target=loop, args=("reads", store.read)) for _ in range(readers)]
+    threads += [threading.Thread(target=loop, args=("writes", store.write)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def p95(values):
+        values = sorted(values)
+        return values[int(len(values) * 0.95)] * 1000 if values else float("nan")
+
+    return {
+        "reads/s": counts["reads"] / seconds, "writes/s": counts["writes"] / seconds,
+        "read p95 ms": p95(latencies["reads"]), "write p95 ms": p95(latencies["writes"]),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, factory in (("connect-per-call", Legacy), ("pooled WAL", Pooled)):
+            path = os.path.join(tmp, f"{name.replace(' ', '_')}.db")
+            seed(path, args.rows)
+            results[name] = run(factory(path), args.readers, args.writers, args.seconds, args.rows)
+
+    keys = list(next(iter(results.values())))
+    print(f"{'':<20}" + "".join(f"{k:>15}" for k in keys))
+    for name, r in results.items():
+        print(f"{name:<20}" + "".join(f"{r[k]:>15.1f}" for k in keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Near-duplicate lookup: dedup.DuplicateIndex band lookup against a full scan of the
+# stored fingerprints, plus recall by how many bits a near-duplicate differs in.
+#
+#   python benchmarks/bench_dedup.py [--rows 100000] [--queries 500] [--threshold 0.9]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import Database  # noqa: E402
+from dedup import BITS, DuplicateIndex, hamming, to_signed, to_unsigned  # noqa: E402
+
+
+def seed(path, index, rows, rng):
+    # Unrelated pages hash to effectively independent 64-bit values; init_db() has
+    # already indexed the campaigns by URL, so the hashes replace those rows
+    db = Database(path)
+    with db.transaction() as conn:
+        conn.execute("CREATE TABLE campaigns (id INTEGER PRIMARY KEY, original_url TEXT)")
+        conn.executemany("INSERT INTO campaigns (id, original_url) VALUES (?, ?)",
+                         [(i, f"https://example.com/p/{i}") for i in range(1, rows + 1)])
+    index.init_db()
+    hashes = [rng.getrandbits(BITS) for _ in range(rows)]
+    with db.transaction() as conn:
+        conn.executemany("INSERT OR REPLACE INTO fingerprints (canonical_url, simhash, campaign_id) VALUES (?, ?, ?)",
+                         [(f"https://example.com/p/{i + 1}/", to_signed(h), i + 1) for i, h in enumerate(hashes)])
+        conn.executemany("INSERT INTO fingerprint_bands (band, value, canonical_url) VALUES (?, ?, ?)",
+                         [(band, value, f"https://example.com/p/{i + 1}/")
+                          for i, h in enumerate(hashes) for band, value in index._bands(h)])
+    return db, hashes
+
+
+def flip(h, bits, rng):
+    for bit in rng.sample(range(BITS), bits):
+        h ^= 1 << bit
+    return h
+
+
+def scan(db, h, max_distance):
+    with db.connection() as conn:
+        rows = conn.execute("SELECT campaign_id, simhash FROM fingerprints WHERE campaign_id IS NOT NULL").fetchall()
+    best = min(((hamming(h, to_unsigned(s)), cid) for cid, s in rows), default=None)
+    return best[1] if best and best[0] <= max_distance else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        index = DuplicateIndex(path, threshold=args.threshold)
+        db, hashes = seed(path, index, args.rows, rng)
+        print(f"{args.rows} fingerprints, threshold {args.threshold} = {index.max_distance} bits, "
+              f"{index.bands} bands\n")
+
+        queries = [flip(hashes[rng.randrange(args.rows)], rng.randint(0, index.max_distance), rng)
+                   for _ in range(args.queries)]
+        for name, fn, n in (("band lookup", index.find_similar, len(queries)),
+                            ("full scan", lambda h: scan(db, h, index.max_distance), 5)):
+            start = time.perf_counter()
+            for h in queries[:n]:
+                fn(h)
+            print(f"{name:<12}{(time.perf_counter() - start) / n * 1000:>10.3f} ms/lookup")
+
+        print(f"\n{'bits changed':<14}{'found':>8}")
+        for bits in range(0, index.max_distance + 4):
+            found = 0
+            for _ in range(100):
+                i = rng.randrange(args.rows)
+                match = index.find_similar(flip(hashes[i], bits, rng))
+                found += bool(match and match[0] == i + 1)
+            print(f"{bits:<14}{found:>7}%")
+        unrelated = sum(bool(index.find_similar(rng.getrandbits(BITS))) for _ in range(1000))
+        print(f"\nfalse matches for 1000 unrelated pages: {unrelated}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Compares extractor.HeadExtractor against the original BeautifulSoup scrape on the
+# fixture corpus: outputs must be identical, then both are timed.
+#
+#   python benchmarks/bench_extractor.py [--repeat 20]
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extractor import HeadExtractor  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CHUNK = 16384
+
+
+def soup_extract(html):
+    # The pre-extractor implementation of scrape_url(), minus the network fetch
+    soup = BeautifulSoup(html, "html.parser")
+    title = (soup.find("meta", property="og:title") or soup.find("meta", {"name": "og:title"}))
+    title = title.get("content", "") if title else soup.find("title").text if soup.find("title") else "Product"
+    desc = (soup.find("meta", property="og:description") or soup.find("meta", {"name": "description"}))
+    desc = desc.get("content", "") if desc else ""
+    text = soup.get_text()[:500].strip() if soup.get_text() else ""
+    return {"title": title, "description": desc, "text": text}
+
+
+def stream_extract(raw):
+    extractor = HeadExtractor()
+    for i in range(0, len(raw), CHUNK):
+        if extractor.feed_bytes(raw[i:i + CHUNK]):
+            break
+    else:
+        extractor.finish()
+    return extractor.result()
+
+
+def measure(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    fn(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'fixture':<24}{'bytes':>9}{'soup ms':>10}{'stream ms':>11}{'speedup':>9}{'soup KB':>10}{'stream KB':>11}")
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            raw = f.read()
+        html = raw.decode("utf-8")
+        expected, actual = soup_extract(html), stream_extract(raw)
+        # images has no counterpart in the original scrape
+        actual = {k: v for k, v in actual.items() if k in expected}
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {name}:\n  soup:   {expected!r}\n  stream: {actual!r}")
+            continue
+        soup_t, soup_mem = measure(soup_extract, html, args.repeat)
+        stream_t, stream_mem = measure(stream_extract, raw, args.repeat)
+        print(f"{name:<24}{len(raw):>9}{soup_t * 1000:>10.2f}{stream_t * 1000:>11.2f}{soup_t / stream_t:>8.1f}x"
+              f"{soup_mem / 1024:>10.0f}{stream_mem / 1024:>11.0f}")
+    if mismatches:
+        print(f"{mismatches} fixture(s) differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# llm_gateway against a bare SDK client (max_retries=0, what generate_campaign() used
+# to do) on local stub servers: a quota the traffic exceeds, a flaky provider, and a
+# provider that is down. Requests go to benchmarks/stub_llm.py, never a real API.
+#
+#   python benchmarks/bench_gateway.py [--requests 60] [--concurrency 12]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from groq import Groq
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_gateway import CircuitBreaker, LLMGateway, Provider  # noqa: E402
+from stub_llm import StubLLM  # noqa: E402
+
+PARAMS = {"model": "llama-3.3-70b-versatile", "messages": [{"role": "user", "content": "x" * 2000}],
+          "max_tokens": 512}
+
+
+def groq_client(stub):
+    return Groq(api_key="stub", base_url=stub.base_url, max_retries=0, timeout=10)
+
+
+def openai_client(stub):
+    return OpenAI(api_key="stub", base_url=stub.base_url + "/v1", max_retries=0, timeout=10,
+                  http_client=httpx.Client(timeout=10))
+
+
+def run(create, requests, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        try:
+            create(**PARAMS)
+            return True, time.perf_counter() - start
+        except Exception:
+            return False, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    latencies = sorted(t for _, t in results)
+    return {"ok %": 100 * sum(ok for ok, _ in results) / requests,
+            "p50 ms": latencies[len(latencies) // 2] * 1000,
+            "p95 ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "wall s": time.perf_counter() - start}
+
+
+def scenario(name, primary, fallback, rpm, args):
+    print(f"\n{name}")
+    print(f"{'':<10}{'ok %':>8}{'p50 ms':>10}{'p95 ms':>10}{'wall s':>8}  upstream")
+    for label in ("bare", "gateway"):
+        p, f = primary(), fallback()
+        if label == "bare":
+            r = run(groq_client(p).chat.completions.create, args.requests, args.concurrency)
+        else:
+            gateway = LLMGateway([
+                Provider("primary", groq_client(p), rpm=rpm, breaker=CircuitBreaker(5, 30)),
+                Provider("fallback", openai_client(f), model="small-model"),
+            ], max_retries=3, backoff=0.05, max_wait=2)
+            r = run(gateway.create, args.requests, args.concurrency)
+        print(f"{label:<10}{r['ok %']:>8.0f}{r['p50 ms']:>10.0f}{r['p95 ms']:>10.0f}{r['wall s']:>8.1f}  "
+              f"primary {p.stats()} fallback {f.stats()}")
+        p.stop()
+        f.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    fallback = lambda: StubLLM(latency=args.latency).start()  # noqa: E731
+    half = args.requests // 2
+    scenario(f"quota: provider allows {half} requests/min, traffic is {args.requests}",
+             lambda: StubLLM(latency=args.latency, rpm=half).start(), fallback, half, args)
+    scenario("flaky: 30% of provider calls fail with 500",
+             lambda: StubLLM(latency=args.latency, error_rate=0.3, seed=1).start(), fallback, None, args)
+    scenario("down: provider answers 503 to everything",
+             lambda: StubLLM(latency=args.latency, down=True).start(), fallback, None, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Keyword analytics: json.loads over every generated_content blob (the only option
+# before keywords.KeywordIndex) against the child tables and trigger-kept aggregates.
+#
+#   python benchmarks/bench_keywords.py [--rows 100000]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_search import seed  # noqa: E402
+from keywords import KeywordIndex  # noqa: E402
+
+
+def blob_top(db, limit):
+    counts = Counter()
+    with db.connection() as conn:
+        for (content,) in conn.execute("SELECT generated_content FROM campaigns"):
+            counts.update({k.strip().lower() for k in json.loads(content).get("keywords", [])})
+    return counts.most_common(limit)
+
+
+def blob_filter(db, term, limit):
+    out = []
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, generated_content FROM campaigns ORDER BY created_at DESC, id DESC")
+        for cid, content in rows:
+            if term in (k.strip().lower() for k in json.loads(content).get("keywords", [])):
+                out.append(cid)
+                if len(out) == limit:
+                    break
+    return out
+
+
+def indexed_filter(db, term, limit):
+    with db.connection() as conn:
+        return conn.execute("""
+            SELECT c.id FROM campaign_keywords k JOIN campaigns c ON c.id = k.campaign_id
+            WHERE k.keyword_id = (SELECT id FROM keywords WHERE term = ?)
+            ORDER BY k.created_at DESC, k.campaign_id DESC LIMIT ?
+        """, (term, limit)).fetchall()
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = seed(path, args.rows)
+        index = KeywordIndex(path)
+        start = time.perf_counter()
+        index.init_db()
+        print(f"{args.rows} campaigns, keyword backfill {time.perf_counter() - start:.1f}s\n")
+
+        cases = [
+            ("top 20 keywords", lambda: blob_top(db, 20), lambda: index.top(20)),
+            ("top 20 last 7 days", lambda: blob_top(db, 20), lambda: index.top(20, "2000-01-01")),
+            ("50 newest with 'vegan'", lambda: blob_filter(db, "vegan", 50), lambda: indexed_filter(db, "vegan", 50)),
+        ]
+        print(f"{'':<26}{'json blobs ms':>15}{'indexed ms':>12}")
+        for name, blob, indexed in cases:
+            print(f"{name:<26}{timed(blob, 2):>15.1f}{timed(indexed):>12.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
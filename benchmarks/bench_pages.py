@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Page weight and server time for / and /campaign/<id>: the old inline-CSS/JS templates
+# (rebuilt from static/) against the current pages with fingerprinted asset bundles.
+#
+#   python benchmarks/bench_pages.py [--repeat 500]
+
+import argparse
+import gzip
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+import main  # noqa: E402
+from flask import render_template_string  # noqa: E402
+from renderer import Template  # noqa: E402
+
+CAMPAIGN = {
+    "originalUrl": "https://www.instagram.com/p/DQKaZtVDx-6/?img_index=1",
+    "productName": "Nike Aero-FIT",
+    "productDescription": "Nike's pinnacle expression of cooling technology, designed for unrivaled air conditioning.",
+    "generatedContent": {
+        "adCopy": "Don't lose your cool with Nike Aero-FIT. " * 20,
+        "keywords": ["cooling technology", "athletic wear", "Nike Aero-FIT", "sports apparel", "innovation"],
+        "celebrityEndorsement": "\"I trust Nike Aero-FIT to keep me cool & dry.\" - Cristiano Ronaldo",
+        "features": ["Unrivaled air conditioning", "Extraordinary air flow", "Moisture-wicking fabric",
+                     "Heat-resistant technology"],
+    },
+}
+ASSET_TAG = re.compile(r'<link rel="stylesheet" href="\{\{ assets\.(\w+)_css \}\}">|'
+                       r'<script src="\{\{ assets\.(\w+)_js \}\}" defer></script>')
+
+
+def inline(template):
+    # Put each bundle's source back where it used to live in the template
+    def sub(m):
+        if m.group(1):
+            with open(os.path.join(ROOT, "static", f"{m.group(1)}.css"), encoding="utf-8") as f:
+                return f"<style>\n{f.read()}</style>"
+        with open(os.path.join(ROOT, "static", f"{m.group(2)}.js"), encoding="utf-8") as f:
+            return f"<script>\n{f.read()}</script>"
+    return ASSET_TAG.sub(sub, template)
+
+
+def gz(body):
+    return len(gzip.compress(body, compresslevel=6))
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    main.init_db()
+    cid = main.save_campaign(CAMPAIGN)
+    client = main.app.test_client()
+    old_home, old_campaign = inline(main.HOME_TEMPLATE), Template(inline(main.CAMPAIGN_TEMPLATE))
+
+    # The old views, mounted on the same app so both sides pay the same request overhead
+    @main.app.route("/old/")
+    def old_home_view():
+        return render_template_string(old_home)
+
+    @main.app.route("/old/campaign/<int:cid>")
+    def old_campaign_view(cid):
+        return old_campaign.render(campaign=main.get_campaign(cid))
+
+    def fetch(path, **headers):
+        return client.get(path, headers=headers)
+
+    gzip_hdr = {"Accept-Encoding": "gzip"}
+    pages = {"/": ("home_css", "home_js"), f"/campaign/{cid}": ("campaign_css",)}
+    inline_gzip = {}
+    print(f"{'':<28}{'first visit B':>15}{'repeat B':>10}{'us/request':>12}")
+    for path, bundles in pages.items():
+        old = "/old" + path
+        body = fetch(old, **gzip_hdr).data
+        # Old pages were sent uncompressed with no validators, so a repeat visit costs the same
+        best = min(timeit.repeat(lambda: fetch(old, **gzip_hdr), number=args.repeat, repeat=3)) / args.repeat
+        print(f"{'inline ' + path:<28}{len(body):>15}{len(body):>10}{best * 1e6:>12.1f}")
+        inline_gzip[path] = gz(body)
+
+        r = fetch(path, **gzip_hdr)
+        first = len(r.data) + sum(len(fetch(getattr(main.assets, b), **gzip_hdr).data) for b in bundles)
+        # Repeat visit: the HTML revalidates to a 304 and the immutable bundles come from cache
+        repeat = len(fetch(path, **{"If-None-Match": r.headers["ETag"]}).data)
+        best = min(timeit.repeat(lambda: fetch(path, **gzip_hdr), number=args.repeat, repeat=3)) / args.repeat
+        print(f"{'bundled ' + path:<28}{first:>15}{repeat:>10}{best * 1e6:>12.1f}")
+    print("\ninline pages gzipped would be " + ", ".join(f"{p} {n} B" for p, n in inline_gzip.items()) +
+          "; us/request includes the Flask test client round trip")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Campaign page rendering: the old chained str.replace path, renderer.Template, and
+# Flask's render_template_string, on the same campaign.
+#
+#   python benchmarks/bench_render.py [--repeat 2000]
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask, render_template_string  # noqa: E402
+from main import CAMPAIGN_TEMPLATE, assets  # noqa: E402
+from renderer import Template  # noqa: E402
+
+CAMPAIGN = {
+    "id": 1,
+    "originalUrl": "https://www.instagram.com/p/DQKaZtVDx-6/?img_index=1",
+    "productName": "Nike Aero-FIT",
+    "productDescription": "Nike's pinnacle expression of cooling technology, designed for unrivaled air conditioning.",
+    "generatedContent": {
+        "adCopy": "Don't lose your cool with Nike Aero-FIT. " * 20,
+        "keywords": ["cooling technology", "athletic wear", "Nike Aero-FIT", "sports apparel", "innovation"],
+        "celebrityEndorsement": "\"I trust Nike Aero-FIT to keep me cool & dry.\" - Cristiano Ronaldo",
+        "features": ["Unrivaled air conditioning", "Extraordinary air flow", "Moisture-wicking fabric",
+                     "Heat-resistant technology"],
+    },
+    "createdAt": "2025-12-27 20:32:07",
+}
+
+# Four ready images, shaped like ImageStore.for_campaign()'s
+IMAGES = [{
+    "src": f"/images/{n:032x}-640.jpg", "width": 640, "height": 800,
+    "srcset": ", ".join(f"/images/{n:032x}-{w}.jpg {w}w" for w in (320, 640, 1024)),
+    "sources": [{"type": "image/webp",
+                 "srcset": ", ".join(f"/images/{n:032x}-{w}.webp {w}w" for w in (320, 640, 1024))}],
+} for n in range(4)]
+
+# What build_campaign_page() renders with
+CONTEXT = {"campaign": CAMPAIGN, "assets": assets, "hero": IMAGES[:1], "gallery": IMAGES[:3], "placeholders": []}
+
+
+def chained_replace(campaign_data):
+    # The pre-renderer campaign() route body
+    html = CAMPAIGN_TEMPLATE.replace("{{ campaign.productName }}", campaign_data["productName"])
+    html = html.replace("{{ campaign.productDescription }}", campaign_data["productDescription"])
+    html = html.replace("{{ campaign.originalUrl }}", campaign_data["originalUrl"])
+    html = html.replace("{{ campaign.generatedContent.adCopy }}", campaign_data["generatedContent"]["adCopy"])
+    html = html.replace("{{ campaign.generatedContent.celebrityEndorsement }}",
+                        campaign_data["generatedContent"]["celebrityEndorsement"])
+    features_html = "".join([f'<div class="feature-item"><p>✓ {f}</p></div>'
+                             for f in campaign_data["generatedContent"]["features"]])
+    html = html.replace('{% for feature in campaign.generatedContent.features %}<div class="feature-item">'
+                        '<p>✓ {{ feature }}</p></div>{% endfor %}', features_html)
+    return html
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    template = Template(CAMPAIGN_TEMPLATE)
+    ctx = app.app_context()
+    ctx.push()
+
+    compiled = template.render(**CONTEXT)
+    assert "{%" not in compiled and "Moisture-wicking fabric" in compiled and assets.campaign_css in compiled
+    assert IMAGES[2]["src"] in compiled and IMAGES[2]["src"] in render_template_string(CAMPAIGN_TEMPLATE, **CONTEXT)
+    assert "{%" in chained_replace(CAMPAIGN), "old path unexpectedly rendered the features loop"
+
+    cases = [
+        ("chained str.replace", lambda: chained_replace(CAMPAIGN)),
+        ("renderer.Template", lambda: template.render(**CONTEXT)),
+        ("render_template_string", lambda: render_template_string(CAMPAIGN_TEMPLATE, **CONTEXT)),
+    ]
+    print(f"{'':<24}{'us/render':>12}{'renders/s':>12}")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.repeat, repeat=3)) / args.repeat
+        print(f"{name:<24}{best * 1e6:>12.1f}{1 / best:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
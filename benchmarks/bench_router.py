@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Prompt budgeting and routing on the extractor fixtures: prompt tokens and max_tokens
+# before/after, which route each page takes, what that does to the tokens-per-minute
+# quota the gateway reserves, and how the router sheds load when the 70B p95 breaks
+# the SLO (simulated latencies, no network).
+#
+#   python benchmarks/bench_router.py
+
+import glob
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+import main  # noqa: E402
+from extractor import extract_metadata  # noqa: E402
+from llm_gateway import estimate_tokens  # noqa: E402
+from router import Router, approx_tokens  # noqa: E402
+
+OLD_MAX_TOKENS = 2048
+
+
+def old_prompt_tokens(url, scraped):
+    # The pre-router prompt embedded the scraped title and description untrimmed
+    params, _, _ = main.completion_params(url, {"title": "", "description": ""})
+    return approx_tokens(params["messages"][0]["content"]) + approx_tokens(scraped["title"]) + \
+        approx_tokens(scraped["description"])
+
+
+def main_():
+    pages = {os.path.basename(p)[:-5]: extract_metadata(open(p, encoding="utf-8").read())
+             for p in sorted(glob.glob(os.path.join(ROOT, "benchmarks", "fixtures", "*.html")))}
+    pages["failed_fetch"] = {"title": "Product", "description": "", "text": ""}
+    pages["long_description"] = {"title": "Serum " * 40, "description": "Brightening vitamin C serum. " * 200,
+                                 "text": ""}
+    old_total = new_total = 0
+    print(f"{'page':<20}{'prompt before':>14}{'after':>7}{'route':>9}{'reason':>14}{'quota before':>14}{'after':>7}")
+    for name, scraped in pages.items():
+        url = f"https://example.com/{name}"
+        params, route, reason = main.completion_params(url, scraped)
+        before = old_prompt_tokens(url, scraped)
+        after = approx_tokens(params["messages"][0]["content"])
+        old_quota, new_quota = before + OLD_MAX_TOKENS, estimate_tokens(params)
+        old_total += old_quota
+        new_total += new_quota
+        print(f"{name:<20}{before:>14}{after:>7}{route.name:>9}{reason:>14}{old_quota:>14}{new_quota:>7}")
+    print(f"\nmax_tokens {OLD_MAX_TOKENS} -> {params['max_tokens']}; tokens reserved per request "
+          f"{old_total / len(pages):.0f} -> {new_total / len(pages):.0f} "
+          f"({old_total / new_total:.1f}x more requests per TPM quota)")
+
+    rng = random.Random(3)
+    router = Router("small", "large", slo_p95=10, probe_every=10)
+    print(f"\n{'70B latency':<16}{'to fast':>9}{'to 70B':>8}{'p95 70B':>9}")
+    for label, mean in (("healthy ~4s", 4), ("degraded ~14s", 14), ("recovered ~4s", 4)):
+        counts = {"fast": 0, "quality": 0}
+        for _ in range(600):
+            route, reason = router.choose(200)
+            counts[route.name] += 1
+            latency = rng.gauss(mean if route.name == "quality" else 1.5, 0.8)
+            route.latencies.append(max(0.1, latency))
+        print(f"{label:<16}{counts['fast']:>9}{counts['quality']:>8}{router.routes['quality'].p95():>9.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Search latency at scale: search.CampaignSearch (FTS5, bm25, snippets) against the
+# LIKE scan that filtering the full campaign list amounts to.
+#
+#   python benchmarks/bench_search.py [--rows 100000] [--queries 200]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import Database  # noqa: E402
+from search import CampaignSearch  # noqa: E402
+
+BRANDS = ["Nike", "Adidas", "Glossier", "Allbirds", "Patagonia", "Dyson", "Oura", "Lush", "Gymshark", "Rhode",
+          "Hydro Flask", "Stanley", "Sephora", "Fenty", "Apple", "Lego", "Casper", "Away", "Warby Parker", "Vuori"]
+PRODUCTS = ["running shoe", "serum", "hoodie", "water bottle", "backpack", "sleep ring", "moisturiser",
+            "leggings", "lip balm", "headphones", "mattress", "suitcase", "sunglasses", "yoga mat", "jacket"]
+WORDS = ("comfort lightweight breathable sustainable recycled premium cooling hydrating vegan waterproof "
+         "durable everyday performance limited edition summer winter travel gift bold minimalist classic "
+         "effortless radiant soft stretch recovery focus adventure urban trail studio glow").split()
+# Ad copy draws from WORDS plus a few thousand filler words on a Zipf curve, so common
+# terms match a large share of rows and rare ones a handful, as in real copy.
+VOCAB = WORDS + [a + b + c for a in ("ka", "lo", "mi", "ne", "su", "ta", "ve", "zo")
+                 for b in ("r", "l", "n", "s", "m", "x", "d", "p") for c in ("ion", "ent", "ary", "ish",
+                                                                         "ous", "ful", "ive", "ate")]
+ZIPF = [1 / (rank + 1) for rank in range(len(VOCAB))]
+QUERIES = ["running", "serum", "cooling", "sustainable backpack", '"limited edition"', "glow", "waterproof jack",
+           "vegan lip", "nike", "travel"]
+
+
+def campaign(rng, i):
+    brand, product = rng.choice(BRANDS), rng.choice(PRODUCTS)
+    return {
+        "originalUrl": f"https://instagram.com/p/{i}/",
+        "productName": f"{brand} {product.title()} {i}",
+        "productDescription": " ".join(rng.choices(VOCAB, ZIPF, k=20)),
+        "generatedContent": {"adCopy": " ".join(rng.choices(VOCAB, ZIPF, k=150)),
+                             "keywords": rng.sample(WORDS, 5), "celebrityEndorsement": "", "features": []},
+    }
+
+
+def seed(path, rows):
+    db = Database(path)
+    with db.transaction() as conn:
+        conn.execute("""
+            CREATE TABLE campaigns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, original_url TEXT, product_name TEXT,
+                product_description TEXT, generated_content TEXT, content_codec TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    rng = random.Random(1)
+    for start in range(0, rows, 5000):
+        batch = [campaign(rng, i) for i in range(start, min(rows, start + 5000))]
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO campaigns (original_url, product_name, product_description, "
+                             "generated_content) VALUES (?, ?, ?, ?)",
+                             [(c["originalUrl"], c["productName"], c["productDescription"],
+                               json.dumps(c["generatedContent"])) for c in batch])
+    return db
+
+
+def like_scan(db, q, limit):
+    pattern = f"%{q.strip(chr(34))}%"
+    with db.connection() as conn:
+        return conn.execute("""
+            SELECT id, original_url, product_name, product_description, created_at FROM campaigns
+            WHERE product_name LIKE ? OR product_description LIKE ? OR generated_content LIKE ?
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (pattern, pattern, pattern, limit)).fetchall()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        db = seed(path, args.rows)
+        print(f"seeded {args.rows} campaigns in {time.perf_counter() - start:.1f}s")
+        search = CampaignSearch(path)
+        start = time.perf_counter()
+        search.init_db()
+        print(f"backfilled the FTS index in {time.perf_counter() - start:.1f}s, "
+              f"db is {os.path.getsize(path) / 1e6:.0f} MB\n")
+
+        cases = [("FTS5 search", lambda q: search.search(q, args.limit)),
+                 ("LIKE scan", lambda q: like_scan(db, q, args.limit))]
+        print(f"{'':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, fn in cases:
+            samples = []
+            for i in range(args.queries):
+                q = QUERIES[i % len(QUERIES)]
+                t = time.perf_counter()
+                fn(q)
+                samples.append(time.perf_counter() - t)
+            print(f"{name:<14}" + "".join(f"{v:>10.2f}" for v in percentiles(samples)))
+
+        print(f"\n{'query':<22}{'ms':>8}{'hits/page':>11}")
+        for q in QUERIES:
+            t = time.perf_counter()
+            results, _ = search.search(q, args.limit)
+            print(f"{q:<22}{(time.perf_counter() - t) * 1000:>8.2f}{len(results):>11}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
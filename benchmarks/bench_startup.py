@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Cold start: fresh interpreters that import main (under -X importtime), run
+# create_app() on an empty database and serve GET / through the test client. Reports
+# the medians and the slowest imports, and with --check exits 1 if importing main goes
+# over --budget-ms or pulls in the LLM/HTTP stacks that are meant to load on first use.
+#
+#   python benchmarks/bench_startup.py [--runs 5] [--top 12]
+#   python benchmarks/bench_startup.py --check [--budget-ms 400]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Built on first use, never at startup
+DEFERRED = ("groq", "openai", "httpx", "httpcore", "requests", "urllib3", "bs4")
+
+PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {ROOT!r})
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+app = main.create_app()
+t2 = time.perf_counter()
+loaded = [m for m in {DEFERRED!r} if m in sys.modules]
+status = app.test_client().get("/").status_code
+t3 = time.perf_counter()
+sys.stdout = sys.__stdout__
+print("PROBE " + json.dumps({{"import": t1 - t0, "createApp": t2 - t1, "firstRequest": t3 - t2, "status": status,
+                             "loaded": loaded, "loadedAfterRequest": [m for m in {DEFERRED!r} if m in sys.modules]}}))
+"""
+
+
+def probe():
+    # One cold process in an empty directory, so init_db() creates everything from scratch
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=workdir, capture_output=True,
+                            text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    lines = [line for line in result.stdout.splitlines() if line.startswith("PROBE ")]
+    if result.returncode or not lines:
+        sys.exit(f"probe failed:\n{result.stdout}\n{result.stderr[-2000:]}")
+    return json.loads(lines[-1][6:]), importtimes(result.stderr)
+
+
+def importtimes(stderr):
+    # -X importtime lines: "import time: self_us | cumulative_us | <indent>name". Returns
+    # {name: cumulative ms} for main's direct imports, plus main itself
+    times, main_depth = {}, None
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+    # A module's line comes after its children's, so main's direct imports are the
+    # depth-1 entries that precede main's own line
+    for depth, name, ms in reversed(entries):
+        if name == "main" and main_depth is None:
+            main_depth = depth
+            times["main"] = ms
+        elif main_depth is not None:
+            if depth == main_depth:
+                break
+            if depth == main_depth + 1:
+                times[name] = ms
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--budget-ms", type=float, default=400, help="median time to import main")
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.runs)]
+    median = lambda key: statistics.median(r[key] for r, _ in runs) * 1000  # noqa: E731
+    print(f"{args.runs} cold starts (median)\n")
+    print(f"  import main     {median('import'):8.1f} ms")
+    print(f"  create_app()    {median('createApp'):8.1f} ms  (schema setup on an empty database)")
+    print(f"  first GET /     {median('firstRequest'):8.1f} ms")
+    print(f"  total           {median('import') + median('createApp') + median('firstRequest'):8.1f} ms")
+
+    modules = {}
+    for _, times in runs:
+        for name, ms in times.items():
+            modules.setdefault(name, []).append(ms)
+    slowest = sorted(((statistics.median(v), k) for k, v in modules.items() if k != "main"), reverse=True)
+    print(f"\nslowest imports under main (cumulative, -X importtime):")
+    for ms, name in slowest[:args.top]:
+        print(f"  {name:<20}{ms:8.1f} ms")
+
+    first = runs[0][0]
+    print(f"\ndeferred stacks loaded at startup: {', '.join(first['loaded']) or 'none'}")
+    print(f"after the first page:             {', '.join(first['loadedAfterRequest']) or 'none'}")
+
+    if args.check:
+        problems = []
+        if median("import") > args.budget_ms:
+            problems.append(f"import main took {median('import'):.0f} ms, budget {args.budget_ms:g} ms")
+        if first["loaded"] or first["loadedAfterRequest"]:
+            problems.append(f"imported at startup: {', '.join(sorted(set(first['loaded'] + first['loadedAfterRequest'])))}")
+        if first["status"] != 200:
+            problems.append(f"GET / returned {first['status']}")
+        if problems:
+            print("\nregressions:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print(f"\nwithin budget ({args.budget_ms:g} ms) and nothing deferred was imported")
+
+
+if __name__ == "__main__":
+    main()
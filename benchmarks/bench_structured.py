@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Parse-failure rate on the recorded completion corpus (benchmarks/fixtures/completions.jsonl,
+# the ways Llama responses break: fences, chatter around the JSON, raw newlines, unescaped
+# quotes, trailing commas, truncation at max_tokens, missing fields, refusals). Compares
+# the old fence-strip + json.loads parser with structured.StructuredOutput's local repair,
+# and with the follow-up that re-requests only the failed fields (answered by the stub's
+# canned campaign), counting the tokens a follow-up asks for against a full regeneration.
+#
+#   python benchmarks/bench_structured.py [-v]
+
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from router import max_tokens_for  # noqa: E402
+from stub_llm import CAMPAIGN  # noqa: E402
+from structured import CAMPAIGN_SCHEMA, StructuredOutput, StructuredOutputError  # noqa: E402
+
+CORPUS = os.path.join(ROOT, "benchmarks", "fixtures", "completions.jsonl")
+
+
+def old_parse(content):
+    # parse_completion() before structured output
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("```")[1].replace("json", "").strip()
+    content = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f]', '', content)
+    json.loads(content)
+
+
+def main():
+    verbose = "-v" in sys.argv
+    corpus = [json.loads(line) for line in open(CORPUS, encoding="utf-8")]
+    local = StructuredOutput(CAMPAIGN_SCHEMA)
+    followed = StructuredOutput(CAMPAIGN_SCHEMA)
+    full = max_tokens_for(local.token_budgets())
+    asked = []
+
+    def followup(valid, failed):
+        asked.append(max_tokens_for(local.token_budgets(failed)))
+        return json.dumps(CAMPAIGN)
+
+    old_failures = local_failures = final_failures = 0
+    modes = {}
+    for item in corpus:
+        try:
+            old_parse(item["content"])
+            old_ok = True
+        except ValueError:
+            old_ok = False
+        _, failed, how = local.parse(item["content"])
+        try:
+            local.complete(item["content"])
+            local_ok = True
+        except StructuredOutputError:
+            local_ok = False
+        try:
+            followed.complete(item["content"], followup)
+            final_ok = True
+        except StructuredOutputError:
+            final_ok = False
+        old_failures += not old_ok
+        local_failures += not local_ok
+        final_failures += not final_ok
+        mode = modes.setdefault(item["mode"], [0, 0, 0, 0, how, set()])
+        mode[0] += 1
+        mode[1] += not old_ok
+        mode[2] += not local_ok
+        mode[3] += not final_ok
+        mode[5].update(failed)
+        if verbose:
+            print(f"{item['name']:<30}{how:<12}{', '.join(failed)}")
+
+    print(f"{'failure mode':<26}{'n':>3}{'old':>6}{'repair':>8}{'+follow-up':>12}  re-requested")
+    for name, (n, old, loc, fin, how, fields) in modes.items():
+        print(f"{name:<26}{n:>3}{old:>6}{loc:>8}{fin:>12}  {', '.join(f for f in CAMPAIGN_SCHEMA if f in fields)}")
+    n = len(corpus)
+    print(f"\nparse failures on {n} responses: old parser {old_failures} ({old_failures / n:.0%}), "
+          f"local repair {local_failures} ({local_failures / n:.0%}), "
+          f"with field follow-up {final_failures} ({final_failures / n:.0%})")
+    print(f"follow-ups: {len(asked)}, max_tokens asked {sum(asked) / len(asked):.0f} on average "
+          f"vs {full} to regenerate the whole campaign")
+    print(json.dumps(followed.stats()))
+
+
+if __name__ == "__main__":
+    main()
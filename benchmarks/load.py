@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Load and latency suite against local stand-ins only: benchmarks/stub_llm.py for Groq,
+# benchmarks/stub_site.py for the social pages, and the app itself, each in its own
+# process. Each scenario runs at a fixed concurrency for a fixed time and reports
+# throughput and p50/p95/p99; --check compares with benchmarks/baseline.json and exits 1
+# on a regression.
+#
+#   python benchmarks/load.py [--scenarios home,list,page,generate,stream] [--concurrency 8] [--duration 5]
+#   python benchmarks/load.py --check           # fail on regression (CI)
+#   python benchmarks/load.py --save-baseline   # after an intended change
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, "baseline.json")
+FIXTURES = sorted(name[:-5] for name in os.listdir(os.path.join(HERE, "fixtures")) if name.endswith(".html"))
+SCENARIOS = ("home", "list", "page", "generate", "stream")
+# Settings that change the numbers; a baseline only applies to a run with the same ones
+SETTINGS = ("concurrency", "duration", "seed", "llm_latency", "llm_error_rate", "site_latency")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def serve(port, seed):
+    # Runs in the app subprocess: the real Flask app on a threaded WSGI server
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    from werkzeug.serving import make_server
+    import main
+    from stub_llm import CAMPAIGN
+
+    app = main.create_app()
+    campaigns = [{"originalUrl": f"https://example.com/{FIXTURES[i % len(FIXTURES)]}/seed{i}",
+                  "productName": f"{CAMPAIGN['productName']} {i}",
+                  "productDescription": CAMPAIGN["productDescription"],
+                  "generatedContent": {k: CAMPAIGN[k] for k in ("adCopy", "keywords", "celebrityEndorsement",
+                                                                 "features")}}
+                 for i in range(seed)]
+    with main.db.transaction() as conn:
+        main.insert_campaigns(conn, campaigns)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+class Client:
+    # One keep-alive connection per worker thread
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        headers = {"Accept-Encoding": "gzip"}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                    self.conn.close()
+                    self.conn = None
+                return response.status, response.headers, data
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def scenario_requests(name, site_url, seed):
+    # Returns fn(client, rng) -> ok for one request of the scenario
+    def url():
+        return f"{site_url}/{random.choice(FIXTURES)}/{uuid.uuid4().hex}"
+
+    def home(client, rng):
+        return client.request("GET", "/")[0] == 200
+
+    def listing(client, rng):
+        return client.request("GET", "/api/campaigns?limit=20")[0] == 200
+
+    def page(client, rng):
+        return client.request("GET", f"/campaign/{rng.randint(1, seed)}")[0] == 200
+
+    def generate(client, rng):
+        status, headers, _ = client.request("POST", "/api/campaigns/generate", {"url": url()})
+        if status != 202:
+            return False
+        status, _, body = client.request("GET", headers["Location"] + "/wait?timeout=60")
+        return status == 200 and json.loads(body)["status"] == "done"
+
+    def stream(client, rng):
+        status, _, body = client.request("GET", "/api/campaigns/generate/stream?url=" + urllib.parse.quote(url()))
+        if status == 200 and b"event: poll" in body:
+            # No stream slot free: the job runs anyway, and the browser polls it
+            job = json.loads(body.split(b"event: job\ndata: ", 1)[1].split(b"\n", 1)[0])
+            status, _, body = client.request("GET", job["statusUrl"] + "/wait?timeout=60")
+            return status == 200 and json.loads(body)["status"] == "done"
+        return status == 200 and b"event: done" in body
+
+    return {"home": home, "list": listing, "page": page, "generate": generate, "stream": stream}[name]
+
+
+def run_scenario(name, port, site_url, args):
+    one = scenario_requests(name, site_url, args.seed)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    warmup_until = start + min(1.0, args.duration / 5)
+    stop_at = warmup_until + args.duration
+
+    def worker(i):
+        client, rng = Client(port), random.Random(i)
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= stop_at:
+                return
+            try:
+                ok = one(client, rng)
+            except Exception:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= warmup_until:
+                with lock:
+                    latencies.append(t1 - t0)
+                    errors[0] += not ok
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - warmup_until
+    latencies.sort()
+    ms = lambda p: round(percentile(latencies, p) * 1000, 2) if latencies else None  # noqa: E731
+    return {"requests": len(latencies), "errors": errors[0], "rps": round(len(latencies) / elapsed, 1),
+            "p50": ms(0.5), "p95": ms(0.95), "p99": ms(0.99)}
+
+
+def compare(results, baseline, tolerance, floor_ms):
+    # Slower p95/p99 or lower throughput than the baseline by more than tolerance is a
+    # regression; floor_ms keeps sub-millisecond noise on the fast routes from counting
+    regressions = []
+    for name, result in results.items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        for key in ("p95", "p99"):
+            if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > floor_ms:
+                regressions.append(f"{name} {key} {result[key]} ms vs {base[key]} ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name} throughput {result['rps']}/s vs {base['rps']}/s")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name} errors {result['errors']} vs {base['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="seconds per scenario, after warm-up")
+    parser.add_argument("--seed", type=int, default=500, help="campaigns in the database before the run")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--site-latency", type=float, default=0.02)
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression against the baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--floor-ms", type=float, default=5)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.seed)
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    settings = {k: getattr(args, k) for k in SETTINGS}
+    llm_port, site_port, app_port = free_port(), free_port(), free_port()
+    workdir = tempfile.mkdtemp(prefix="load-")
+    env = dict(os.environ, GROQ_BASE_URL=f"http://127.0.0.1:{llm_port}", GROQ_API_KEY="stub",
+               # Measure the generation path itself, not the quota or duplicate shortcuts
+               DEDUP_ENABLED="0", LLM_RPM="1000000", LLM_TPM="1000000000", LLM_FALLBACK_RPM="1000000",
+               LLM_FALLBACK_TPM="1000000000", JOB_WORKERS=str(args.concurrency), JOB_MAX_PENDING="100000",
+               OPENAI_FALLBACK_BASE_URL="", OPENAI_FALLBACK_API_KEY="")
+    log = open(os.path.join(workdir, "app.log"), "w")
+    procs = [
+        subprocess.Popen([sys.executable, os.path.join(HERE, "stub_llm.py"), "--port", str(llm_port),
+                          "--latency", str(args.llm_latency), "--error-rate", str(args.llm_error_rate)],
+                         stdout=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, os.path.join(HERE, "stub_site.py"), "--port", str(site_port),
+                          "--latency", str(args.site_latency)], stdout=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(app_port), "--seed",
+                          str(args.seed)], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT),
+    ]
+    try:
+        for port in (llm_port, site_port, app_port):
+            wait_for(port)
+        print(f"concurrency {args.concurrency}, {args.duration:g}s per scenario, LLM latency "
+              f"{args.llm_latency * 1000:g} ms, LLM errors {args.llm_error_rate:.0%}, site latency "
+              f"{args.site_latency * 1000:g} ms (app log: {log.name})\n")
+        print(f"{'scenario':<10}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        results = {}
+        for name in names:
+            r = results[name] = run_scenario(name, app_port, f"http://127.0.0.1:{site_port}", args)
+            print(f"{name:<10}{r['requests']:>10}{r['errors']:>8}{r['rps']:>9}{r['p50']:>10}{r['p95']:>10}"
+                  f"{r['p99']:>10}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        log.close()
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["settings"] != settings:
+            sys.exit(f"\nbaseline was recorded with {baseline['settings']}; rerun with the same settings")
+        regressions = compare(results, baseline, args.tolerance, args.floor_ms)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Local OpenAI/Groq-compatible chat completions server for exercising llm_gateway
+# without a real API key: fixed latency, injected 5xx errors, an RPM limit that
+# answers 429 + Retry-After, and streaming.
+#
+#   python benchmarks/stub_llm.py [--port 8765] [--latency 0.2] [--error-rate 0.1] [--rpm 60]
+#   GROQ_BASE_URL=http://127.0.0.1:8765 python main.py
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAMPAIGN = {
+    "productName": "Nike Aero-FIT",
+    "productDescription": "Nike's pinnacle expression of cooling technology, designed for unrivaled air conditioning.",
+    "adCopy": "Don't lose your cool with Nike Aero-FIT. " * 12,
+    "keywords": ["cooling technology", "athletic wear", "Nike Aero-FIT", "sports apparel", "innovation"],
+    "celebrityEndorsement": "\"I trust Nike Aero-FIT to keep me cool and dry.\" - Cristiano Ronaldo",
+    "features": ["Unrivaled air conditioning", "Extraordinary air flow", "Moisture-wicking fabric",
+                 "Heat-resistant technology"],
+}
+
+
+class Server(ThreadingHTTPServer):
+    # A real API's listen backlog isn't 5: hundreds of clients connecting at once must
+    # not be stalled by SYN retransmits
+    request_queue_size = 1024
+
+
+class StubLLM:
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, rpm=None, down=False, content=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.down = down
+        self.content = content or json.dumps(CAMPAIGN)
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.served = 0
+        self.server = Server(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "served": self.served, "rateLimited": self.rate_limited,
+                    "errors": self.errors}
+
+    def _admit(self):
+        # Returns (status, retry_after) for this request
+        with self._lock:
+            self.requests += 1
+            if self.down:
+                self.errors += 1
+                return 503, None
+            if self.rpm:
+                now = time.monotonic()
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm:
+                    self.rate_limited += 1
+                    return 429, max(0.05, 60 - (now - self._window[0]))
+                self._window.append(now)
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return 500, None
+            self.served += 1
+            return 200, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    return self._json(404, {"error": {"message": "not found"}})
+                status, wait = stub._admit()
+                if status == 429:
+                    return self._json(429, {"error": {"message": "rate limit", "type": "rate_limit"}},
+                                      {"Retry-After": f"{wait:.2f}"})
+                if status != 200:
+                    return self._json(status, {"error": {"message": "stub failure"}})
+                if stub.latency:
+                    time.sleep(stub.latency)
+                model = params.get("model", "stub")
+                if params.get("stream"):
+                    return self._stream(model)
+                prompt_tokens = sum(len(m.get("content") or "") for m in params.get("messages", [])) // 4
+                completion_tokens = len(stub.content) // 4
+                self._json(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": stub.content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+            def _stream(self, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(stub.content), 24):
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "finish_reason": None,
+                                                          "delta": {"content": stub.content[i:i + 24]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--down", action="store_true")
+    args = parser.parse_args()
+    stub = StubLLM(args.port, args.latency, args.error_rate, args.rpm, args.down)
+    print(f"stub LLM on {stub.base_url} (Groq: GROQ_BASE_URL={stub.base_url}, OpenAI: {stub.base_url}/v1)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Local stand-in for Instagram/TikTok/shop pages: serves the recorded HTML in
+# benchmarks/fixtures at /<fixture>/<anything>, so every URL is distinct to the app's
+# caches but the markup is real. Optional latency per response.
+#
+#   python benchmarks/stub_site.py [--port 8766] [--latency 0.05]
+#   curl http://127.0.0.1:8766/instagram_post/123
+
+import argparse
+import glob
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class Server(ThreadingHTTPServer):
+    # Room in the accept queue for a burst of connects (socketserver's default is 5)
+    request_queue_size = 1024
+
+
+class StubSite:
+    def __init__(self, port=0, latency=0.0, fixtures=FIXTURES):
+        self.latency = latency
+        self.pages = {os.path.basename(path)[:-5]: open(path, "rb").read()
+                      for path in sorted(glob.glob(os.path.join(fixtures, "*.html")))}
+        self._lock = threading.Lock()
+        self.served = 0
+        self.server = Server(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def urls(self, n, prefix="p"):
+        # n distinct URLs cycling through the fixtures
+        names = list(self.pages)
+        return [f"{self.base_url}/{names[i % len(names)]}/{prefix}{i}" for i in range(n)]
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                # The app's fetcher hangs up once it has the <head>
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_GET(self):
+                name = self.path.lstrip("/").split("/")[0].split("?")[0]
+                body = site.pages.get(name)
+                if body is None:
+                    body = ("\n".join(f'<a href="/{n}/1">{n}</a>' for n in site.pages)).encode()
+                    status = 404 if name else 200
+                else:
+                    status = 200
+                if site.latency:
+                    time.sleep(site.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site._lock:
+                    site.served += 1
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    site = StubSite(args.port, args.latency)
+    print(f"stub site on {site.base_url}: {', '.join(site.pages)}", flush=True)
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+from db import database
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("none", "zlib", "zstd")
+# JSON strings and the structure between them, the units a zlib dictionary is built from
+FRAGMENT = re.compile(r'"(?:[^"\\]|\\.)*"|[^"]+')
+
+
+def plain(value, tag):
+    return value
+
+
+class ContentCodec:
+    # Compresses generated_content. Each row carries a tag naming how it was written
+    # (NULL for plain JSON, "zlib", or "zlib:3" for zlib with dictionary 3; the same for
+    # zstd), so rows from any codec or dictionary stay readable and compact() can move
+    # them to the current one. Dictionaries are trained from stored campaigns: zstd's
+    # trainer when zstandard is installed, otherwise a zlib preset dictionary of the
+    # fragments that recur across campaigns.
+    def __init__(self, db_file, codec="zlib", level=None, dictionary_size=None, min_size=128):
+        if codec == "zstd" and zstandard is None:
+            print("CONTENT_CODEC=zstd needs zstandard (pip install zstandard); using zlib")
+            codec = "zlib"
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        self.db = database(db_file)
+        self.codec = codec
+        self.level = level if level is not None else {"zlib": 9, "zstd": 19}.get(codec)
+        # A campaign is ~1 KB: past a few KB a zlib dictionary adds no matches, only the
+        # cost of loading it on every decode (and zlib never looks back past 32 KB)
+        self.dictionary_size = dictionary_size or {"zlib": 4096, "zstd": 16384}.get(codec)
+        if codec == "zlib":
+            self.dictionary_size = min(self.dictionary_size, 32768)
+        self.min_size = min_size
+        self.dictionary_id = None
+        self._dictionaries = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.decoded = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.decode_seconds = 0.0
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_dictionaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    samples INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            row = conn.execute("SELECT id, data FROM content_dictionaries WHERE codec = ? ORDER BY id DESC LIMIT 1",
+                               (self.codec,)).fetchone()
+        if row:
+            self._dictionaries[row[0]] = row[1]
+            self.dictionary_id = row[0]
+
+    @property
+    def tag(self):
+        # What encode() writes now
+        if self.codec == "none":
+            return None
+        return f"{self.codec}:{self.dictionary_id}" if self.dictionary_id else self.codec
+
+    def encode(self, text):
+        # Returns (value, tag) for the generated_content and content_codec columns
+        data = text.encode("utf-8")
+        tag = self.tag
+        if tag is None or len(data) < self.min_size:
+            return text, None
+        codec, dictionary = self._parse(tag)
+        value = self._compress(codec, dictionary, data)
+        if len(value) >= len(data):
+            return text, None
+        with self._lock:
+            self.encoded += 1
+            self.raw_bytes += len(data)
+            self.stored_bytes += len(value)
+        return value, tag
+
+    def decode(self, value, tag):
+        if not tag:
+            return value
+        start = time.perf_counter()
+        codec, dictionary = self._parse(tag)
+        if codec == "zlib":
+            if dictionary:
+                d = zlib.decompressobj(zdict=self._dictionary(dictionary))
+                data = d.decompress(value) + d.flush()
+            else:
+                data = zlib.decompress(value)
+        elif codec == "zstd":
+            data = self._zstd(dictionary, "decompressors").decompress(value)
+        else:
+            raise ValueError(f"Unknown content codec: {tag}")
+        with self._lock:
+            self.decoded += 1
+            self.decode_seconds += time.perf_counter() - start
+        return data.decode("utf-8")
+
+    def loads(self, value, tag):
+        return json.loads(self.decode(value, tag))
+
+    def _parse(self, tag):
+        codec, _, dictionary = tag.partition(":")
+        return codec, int(dictionary) if dictionary else None
+
+    def _compress(self, codec, dictionary, data):
+        if codec == "zlib":
+            if dictionary:
+                c = zlib.compressobj(self.level, zdict=self._dictionary(dictionary))
+                return c.compress(data) + c.flush()
+            return zlib.compress(data, self.level)
+        return self._zstd(dictionary, "compressors").compress(data)
+
+    def _dictionary(self, dictionary_id):
+        data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            with self.db.connection() as conn:
+                row = conn.execute("SELECT data FROM content_dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+            if not row:
+                raise ValueError(f"Content dictionary {dictionary_id} is missing")
+            data = self._dictionaries[dictionary_id] = row[0]
+        return data
+
+    def _zstd(self, dictionary_id, kind):
+        # zstandard's (de)compressors aren't thread-safe and building one digests the
+        # dictionary, so each thread keeps its own per dictionary
+        cache = getattr(self._local, kind, None)
+        if cache is None:
+            cache = {}
+            setattr(self._local, kind, cache)
+        if dictionary_id not in cache:
+            dict_data = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id)) if dictionary_id else None
+            if kind == "compressors":
+                cache[dictionary_id] = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            else:
+                cache[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return cache[dictionary_id]
+
+    def train(self, samples=1000, min_samples=50):
+        # Builds a dictionary from the most recent campaigns and makes it current.
+        # Returns its id, or None with too few campaigns to learn from.
+        if self.codec == "none":
+            return None
+        with self.db.connection() as conn:
+            rows = conn.execute("SELECT generated_content, content_codec FROM campaigns ORDER BY id DESC LIMIT ?",
+                                (samples,)).fetchall()
+        texts = [self.decode(value, tag).encode("utf-8") for value, tag in rows if value]
+        if len(texts) < min_samples:
+            return None
+        if self.codec == "zstd":
+            data = zstandard.train_dictionary(self.dictionary_size, texts, level=self.level).as_bytes()
+        else:
+            data = zlib_dictionary(texts, self.dictionary_size)
+        with self.db.transaction() as conn:
+            dictionary_id = conn.execute("INSERT INTO content_dictionaries (codec, data, samples) VALUES (?, ?, ?)",
+                                         (self.codec, data, len(texts))).lastrowid
+        self._dictionaries[dictionary_id] = data
+        self.dictionary_id = dictionary_id
+        return dictionary_id
+
+    def compact(self, batch_size=500, pause=0.0):
+        # Rewrites rows not in the current codec/dictionary, a batch per short write
+        # transaction so the app keeps serving; pause sleeps between batches
+        last, counts = 0, {"scanned": 0, "rewritten": 0, "before": 0, "after": 0}
+        target = self.tag
+        while True:
+            with self.db.connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, generated_content, content_codec FROM campaigns WHERE id > ? ORDER BY id LIMIT ?
+                """, (last, batch_size)).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            counts["scanned"] += len(rows)
+            updates = []
+            for cid, value, tag in rows:
+                if value is None or tag == target:
+                    continue
+                new_value, new_tag = self.encode(self.decode(value, tag))
+                if new_tag == tag:
+                    continue
+                updates.append((new_value, new_tag, cid, tag))
+                counts["before"] += len(value)
+                counts["after"] += len(new_value)
+            if updates:
+                with self.db.transaction() as conn:
+                    # Skipped if the row was rewritten meanwhile (e.g. regenerated)
+                    counts["rewritten"] += sum(conn.execute("""
+                        UPDATE campaigns SET generated_content = ?, content_codec = ?
+                        WHERE id = ? AND content_codec IS ?
+                    """, update).rowcount for update in updates)
+            if pause:
+                time.sleep(pause)
+        return counts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "codec": self.codec, "dictionary": self.dictionary_id, "encoded": self.encoded,
+                "decoded": self.decoded, "ratio": round(self.stored_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+                "avgDecodeMs": round(self.decode_seconds / self.decoded * 1000, 4) if self.decoded else None,
+            }
+
+
+def zlib_dictionary(texts, size):
+    # A zlib preset dictionary is plain text the compressor can refer back to. Fill it
+    # with the fragments (JSON strings and the structure between them) found in the
+    # most campaigns, weighted by how many bytes they would save, and put the most
+    # common last since zlib reaches nearby matches most cheaply.
+    seen = Counter()
+    for text in texts:
+        seen.update(set(FRAGMENT.findall(text.decode("utf-8", "replace"))))
+    ranked = sorted((f for f, n in seen.items() if n > 1 and len(f) > 3),
+                    key=lambda f: seen[f] * len(f), reverse=True)
+    chosen, used = [], 0
+    for fragment in ranked:
+        data = fragment.encode("utf-8")
+        if used + len(data) > size:
+            continue
+        chosen.append(data)
+        used += len(data)
+    return b"".join(reversed(chosen))
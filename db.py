@@ -0,0 +1,144 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PRAGMAS = {
+    # Only takes effect on a new database; Database.vacuum() converts an existing one
+    "auto_vacuum": os.environ.get("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.environ.get("SQLITE_CACHE_SIZE", "-16000"),  # negative = KiB, so ~16 MB
+    "mmap_size": os.environ.get("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)),
+    "busy_timeout": os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"),
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+class Database:
+    # A small pool of long-lived connections. Connections are tuned once when opened
+    # and keep sqlite3's per-connection prepared statement cache warm across requests.
+    def __init__(self, path, pool_size=8, timeout=30, cached_statements=256):
+        self.path = path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            if conn.in_transaction:
+                conn.commit()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # BEGIN IMMEDIATE takes the write lock up front, so a read-then-write
+        # sequence never fails halfway with SQLITE_BUSY
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def migrate(self, migrations):
+        # migrations: [(version, fn(conn))] in order. PRAGMA user_version records the last
+        # one applied, and BEGIN IMMEDIATE makes workers starting together apply each once.
+        with self.transaction(immediate=True) as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, step in migrations:
+                if version > current:
+                    step(conn)
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                    current = version
+        return current
+
+    def size(self):
+        with self.connection() as conn:
+            return self._size(conn)
+
+    def _size(self, conn):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        wal = os.path.getsize(self.path + "-wal") if os.path.exists(self.path + "-wal") else 0
+        incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        return {"bytes": pages * page_size, "freeBytes": free * page_size, "walBytes": wal,
+                "incremental": incremental}
+
+    def vacuum(self, pages=1000, pause=0.0, full=False):
+        # Hands free pages back to the filesystem. With auto_vacuum=INCREMENTAL that is
+        # `pages` at a time, each a short write, so the app keeps going in between. A
+        # database created before that setting is left alone unless `full`: switching it
+        # over takes a full VACUUM, which blocks writers while it copies the file (as does
+        # repacking rows that shrank in place and left their pages part-empty).
+        with self.connection() as conn:
+            before = self._size(conn)
+            if full:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            elif before["incremental"]:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                while free:
+                    # Pages are only freed as the pragma's rows are stepped through
+                    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+                    left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    if left >= free:
+                        break
+                    free = left
+                    if pause:
+                        time.sleep(pause)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return before, self._size(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {"path": self.path, "opened": self._opened, "idle": self._pool.qsize(),
+                "journalMode": PRAGMAS["journal_mode"]}
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def database(path):
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path, pool_size=int(os.environ.get("SQLITE_POOL_SIZE", "8")))
+        return _databases[path]
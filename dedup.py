@@ -0,0 +1,185 @@
+import hashlib
+import re
+import threading
+
+from db import database
+from scrape_cache import canonicalize_url
+
+BITS = 64
+WORD = re.compile(r"\w+", re.UNICODE)
+URLISH = re.compile(r"https?://\S+|www\.\S+")
+
+
+def features(scraped):
+    # Word unigrams and bigrams of the scraped title, description and text
+    text = " ".join(scraped.get(k) or "" for k in ("title", "description", "text"))
+    words = WORD.findall(URLISH.sub(" ", text.lower()))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def simhash(tokens):
+    weights = [0] * BITS
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    for token, count in counts.items():
+        h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def to_signed(value):
+    # SQLite INTEGER is a signed 64-bit value
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << BITS) if value < 0 else value
+
+
+class DuplicateIndex:
+    # Two lookups before a generation: the canonical URL, then a SimHash of the scraped
+    # page. Fingerprints are split into max_distance + 1 bands; by pigeonhole any hash
+    # within max_distance bits shares at least one band exactly, so candidates come off
+    # an index instead of a scan, and only those are compared bit by bit.
+    def __init__(self, db_file, threshold=0.9, min_tokens=20):
+        self.db = database(db_file)
+        self.max_distance = int((1 - threshold) * BITS)
+        self.bands = self.max_distance + 1
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self.url_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def init_db(self):
+        with self.db.transaction(immediate=True) as conn:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fingerprints'").fetchone()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    canonical_url TEXT PRIMARY KEY,
+                    simhash INTEGER,
+                    campaign_id INTEGER REFERENCES campaigns (id) ON DELETE SET NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    canonical_url TEXT NOT NULL REFERENCES fingerprints (canonical_url) ON DELETE CASCADE,
+                    PRIMARY KEY (band, value, canonical_url)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_url ON fingerprint_bands (canonical_url)")
+            row = conn.execute("SELECT MAX(band) FROM fingerprint_bands").fetchone()
+            if row[0] is not None and row[0] != self.bands - 1:
+                # Threshold changed: re-band the stored hashes
+                conn.execute("DELETE FROM fingerprint_bands")
+                hashes = conn.execute("SELECT canonical_url, simhash FROM fingerprints WHERE simhash IS NOT NULL")
+                conn.executemany("INSERT INTO fingerprint_bands (band, value, canonical_url) VALUES (?, ?, ?)",
+                                 [(band, value, url) for url, h in hashes.fetchall()
+                                  for band, value in self._bands(to_unsigned(h))])
+            if not exists:
+                # Campaigns saved before this index existed can still be matched by URL
+                rows = conn.execute("SELECT id, original_url FROM campaigns ORDER BY id").fetchall()
+                self.index(conn, [(cid, {"originalUrl": url}) for cid, url in rows if url])
+
+    def _bands(self, h):
+        # Split the 64 bits as evenly as possible so no band is short (and unselective)
+        edges = [band * BITS // self.bands for band in range(self.bands + 1)]
+        return [(band, h >> edges[band] & ((1 << (edges[band + 1] - edges[band])) - 1))
+                for band in range(self.bands)]
+
+    def fingerprint(self, scraped):
+        # Error, login and interstitial pages look alike across a site, and would match
+        # each other: only a page that loaded with its own title and description counts
+        status = scraped.get("status")
+        if status is not None and not 200 <= status < 300:
+            return None
+        if not (scraped.get("title") or "").strip() or not (scraped.get("description") or "").strip():
+            return None
+        tokens = features(scraped)
+        if len(tokens) < self.min_tokens:
+            # Too little text to tell products apart (e.g. a failed fetch)
+            return None
+        return simhash(tokens)
+
+    def find_url(self, url):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT campaign_id FROM fingerprints WHERE canonical_url = ? AND campaign_id IS NOT NULL",
+                               (canonicalize_url(url),)).fetchone()
+        if row:
+            with self._lock:
+                self.url_hits += 1
+            return row[0]
+        return None
+
+    def find_similar(self, h):
+        # Returns (campaign_id, similarity) of the closest stored page within the threshold
+        if h is None:
+            with self._lock:
+                self.skipped += 1
+            return None
+        bands = self._bands(h)
+        with self.db.connection() as conn:
+            rows = conn.execute(" UNION ".join(["""
+                SELECT f.campaign_id, f.simhash FROM fingerprint_bands b
+                JOIN fingerprints f ON f.canonical_url = b.canonical_url
+                WHERE b.band = ? AND b.value = ? AND f.campaign_id IS NOT NULL
+            """] * len(bands)), [v for band in bands for v in band]).fetchall()
+        best = None
+        for cid, stored in rows:
+            distance = hamming(h, to_unsigned(stored))
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (cid, distance)
+        with self._lock:
+            if best:
+                self.content_hits += 1
+            else:
+                self.misses += 1
+        return (best[0], round(1 - best[1] / BITS, 4)) if best else None
+
+    def remember(self, url, h):
+        # Stores the page's hash ahead of its campaign; index() links the two on save
+        key = canonicalize_url(url)
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT INTO fingerprints (canonical_url, simhash) VALUES (?, ?)
+                ON CONFLICT (canonical_url) DO UPDATE SET simhash = excluded.simhash
+            """, (key, to_signed(h) if h is not None else None))
+            conn.execute("DELETE FROM fingerprint_bands WHERE canonical_url = ?", (key,))
+            if h is not None:
+                conn.executemany("INSERT INTO fingerprint_bands (band, value, canonical_url) VALUES (?, ?, ?)",
+                                 [(band, value, key) for band, value in self._bands(h)])
+
+    def known(self, conn, urls):
+        # The canonical forms of urls that already have a campaign, read inside the
+        # caller's transaction so a bulk insert can skip them
+        keys = list({canonicalize_url(url) for url in urls})
+        found = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            found.update(key for (key,) in conn.execute(f"""
+                SELECT canonical_url FROM fingerprints
+                WHERE canonical_url IN ({", ".join("?" * len(chunk))}) AND campaign_id IS NOT NULL
+            """, chunk))
+        return found
+
+    def index(self, conn, items):
+        # items: [(campaign_id, campaign)]; runs inside the caller's write transaction
+        conn.executemany("""
+            INSERT INTO fingerprints (canonical_url, campaign_id) VALUES (?, ?)
+            ON CONFLICT (canonical_url) DO UPDATE SET campaign_id = excluded.campaign_id
+        """, [(canonicalize_url(campaign["originalUrl"]), cid) for cid, campaign in items])
+
+    def stats(self):
+        with self._lock:
+            return {"urlHits": self.url_hits, "contentHits": self.content_hits, "misses": self.misses,
+                    "skipped": self.skipped, "avoidedCalls": self.url_hits + self.content_hits,
+                    "maxDistance": self.max_distance}
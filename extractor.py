@@ -0,0 +1,213 @@
+import codecs
+import json
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+# Elements whose contents BeautifulSoup's get_text() does not count as text
+NON_TEXT_TAGS = {"script", "style", "template", "rt"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+# Where pages name their product images, in order of preference
+IMAGE_PROPERTIES = {"og:image", "og:image:url", "og:image:secure_url"}
+IMAGE_NAMES = {"twitter:image", "twitter:image:src"}
+
+
+class _Done(Exception):
+    pass
+
+
+# Incremental replacement for building a full BeautifulSoup tree: collects <meta>,
+# <title>, JSON-LD and the first `text_limit` characters of text, then stops once
+# the head is closed and enough text has been seen.
+class HeadExtractor(HTMLParser):
+
+    def __init__(self, text_limit=500):
+        super().__init__(convert_charrefs=True)
+        self.text_limit = text_limit
+        self.meta_property = {}
+        self.meta_name = {}
+        self.title = None
+        self.json_ld = []
+        self.images = []
+        self.done = False
+        self._title_parts = None
+        self._title_depth = 0
+        self._text = []
+        self._text_len = 0
+        self._skip_depth = 0
+        self._preserve_depth = 0
+        self._pending = []
+        self._in_json_ld = False
+        self._json_ld_parts = []
+        self._head_closed = False
+        self._decoder = None
+
+    def feed_bytes(self, chunk, encoding="utf-8"):
+        # Returns True once everything needed has been collected
+        if self._decoder is None:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        return self.feed_text(self._decoder.decode(chunk))
+
+    def feed_text(self, data):
+        if self.done:
+            return True
+        try:
+            self.feed(data)
+        except _Done:
+            self.done = True
+        return self.done
+
+    def finish(self):
+        try:
+            self.close()
+            self._flush()
+        except _Done:
+            pass
+        self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        attrs = {k: v or "" for k, v in attrs}
+        if tag == "meta":
+            if "property" in attrs:
+                self.meta_property.setdefault(attrs["property"], attrs.get("content", ""))
+            if "name" in attrs:
+                self.meta_name.setdefault(attrs["name"], attrs.get("content", ""))
+            # Every one, not just the first: product pages often list several
+            if attrs.get("property") in IMAGE_PROPERTIES or attrs.get("name") in IMAGE_NAMES:
+                self.images.append(attrs.get("content", ""))
+        elif tag == "link" and "image_src" in attrs.get("rel", "").lower().split():
+            self.images.append(attrs.get("href", ""))
+        elif tag == "title" and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        elif tag == "body":
+            self._head_closed = True
+        if self._title_parts is not None and tag == "title":
+            self._title_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        if tag in NON_TEXT_TAGS:
+            self._skip_depth += 1
+            if tag == "script" and attrs.get("type", "").lower() == "application/ld+json":
+                self._in_json_ld = True
+                self._json_ld_parts = []
+        self._check_done()
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in PRESERVE_WHITESPACE_TAGS and self._preserve_depth:
+            self._preserve_depth -= 1
+        if tag in NON_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+            if tag == "script" and self._in_json_ld:
+                self._in_json_ld = False
+                try:
+                    self.json_ld.append(json.loads("".join(self._json_ld_parts)))
+                except ValueError:
+                    pass
+        elif tag == "title" and self._title_parts is not None:
+            self._title_depth -= 1
+            if self._title_depth <= 0:
+                self.title = "".join(self._title_parts)
+                self._title_parts = None
+        elif tag == "head":
+            self._head_closed = True
+        self._check_done()
+
+    def handle_data(self, data):
+        # Adjacent data is joined into one string before it is looked at, as BeautifulSoup does
+        self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA["):
+            self._pending.append(data[6:])
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        data = "".join(self._pending)
+        self._pending = []
+        if self._skip_depth:
+            if self._in_json_ld:
+                self._json_ld_parts.append(data)
+            return
+        if not self._preserve_depth and data.translate(ASCII_SPACES) == "":
+            data = "\n" if "\n" in data else " "
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._text_len < self.text_limit:
+            self._text.append(data)
+            self._text_len += len(data)
+        self._check_done()
+
+    def _check_done(self):
+        if self._text_len < self.text_limit or self._title_parts is not None:
+            return
+        final = "og:title" in self.meta_property and "og:description" in self.meta_property
+        if self._head_closed or final:
+            raise _Done()
+
+    def result(self, base_url=None):
+        # base_url resolves relative image URLs (the page's URL after redirects)
+        if self._title_parts is not None:
+            self.title = "".join(self._title_parts)
+        if "og:title" in self.meta_property:
+            title = self.meta_property["og:title"]
+        elif "og:title" in self.meta_name:
+            title = self.meta_name["og:title"]
+        else:
+            title = self.title if self.title is not None else "Product"
+        if "og:description" in self.meta_property:
+            desc = self.meta_property["og:description"]
+        else:
+            desc = self.meta_name.get("description", "")
+        text = "".join(self._text)[:self.text_limit].strip()
+        images = {}
+        for image in self.images + json_ld_images(self.json_ld):
+            image = urljoin(base_url, image.strip()) if base_url else image.strip()
+            scheme, _, rest = image.partition("://")
+            if scheme.lower() not in ("http", "https"):
+                continue
+            # og:image and og:image:secure_url are often the same file; keep the https one
+            if rest not in images or scheme.lower() == "https":
+                images[rest] = image
+        return {"title": title, "description": desc, "text": text, "images": list(images.values())}
+
+
+def json_ld_images(data, depth=0):
+    # "image" values anywhere in JSON-LD: a URL, a list, or an ImageObject with a url
+    found = []
+    if depth > 6:
+        return found
+    if isinstance(data, list):
+        for item in data:
+            found += json_ld_images(item, depth + 1)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if key == "image":
+                for image in value if isinstance(value, list) else [value]:
+                    if isinstance(image, dict):
+                        image = image.get("url") or image.get("contentUrl")
+                    if isinstance(image, str):
+                        found.append(image)
+            elif isinstance(value, (dict, list)):
+                found += json_ld_images(value, depth + 1)
+    return found
+
+
+def extract_metadata(html, text_limit=500):
+    extractor = HeadExtractor(text_limit=text_limit)
+    if not extractor.feed_text(html):
+        extractor.finish()
+    return extractor.result()
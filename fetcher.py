@@ -0,0 +1,384 @@
+import asyncio
+import codecs
+import ipaddress
+import itertools
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+try:
+    import httpcore
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+
+class FetchError(Exception):
+    pass
+
+
+class NotHTML(FetchError):
+    pass
+
+
+class HTTPStatusError(FetchError):
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+def is_public(address):
+    # Not loopback, link-local, private, shared, reserved or multicast. An IPv4-mapped
+    # IPv6 address is judged as the IPv4 one it maps to.
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class Resolver:
+    # getaddrinfo() with a TTL for the fetcher's own connections (not the process's: the
+    # LLM clients and everything else keep resolving normally). Failed lookups aren't
+    # cached, and past max_entries expired hosts go first, then the least recently used.
+    # With public_only, addresses that aren't public are dropped, and a host left with
+    # none fails to resolve: every connection (redirects included) looks its host up
+    # here, so a URL someone else chose can't reach this machine or its network.
+    def __init__(self, ttl=300, max_entries=1024, public_only=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.public_only = public_only
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, host, port):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get((host, port))
+            if entry is None or entry[0] <= now:
+                return None
+            self._cache.move_to_end((host, port))
+            self.hits += 1
+            return entry[1]
+
+    def resolve(self, host, port):
+        # The host's addresses, in getaddrinfo order; raises OSError (gaierror) if none
+        addresses = self.cached(host, port)
+        if addresses is not None:
+            return addresses
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)]
+        if self.public_only:
+            addresses = [address for address in addresses if is_public(address)]
+            if not addresses:
+                raise OSError(f"{host} has no public address")
+        now = time.monotonic()
+        with self._lock:
+            self.misses += 1
+            if self.ttl:
+                self._cache[(host, port)] = (now + self.ttl, addresses)
+                self._cache.move_to_end((host, port))
+                if len(self._cache) > self.max_entries:
+                    for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+                        del self._cache[key]
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return addresses
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+class ResolvedConnection:
+    # Mixed into urllib3's connection classes: connects to the first address the resolver
+    # has for the host. TLS still sends SNI for, and verifies, the host name.
+    resolver = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            address = self.resolver.resolve(host, self.port)[0]
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to resolve '{host}' ({e})") from e
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+
+class ResolvingAdapter(HTTPAdapter):
+    def __init__(self, resolver, **kwargs):
+        self.resolver = resolver
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pools = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: type(pool.__name__, (pool,), {"ConnectionCls": type(
+                pool.ConnectionCls.__name__, (ResolvedConnection, pool.ConnectionCls), {"resolver": self.resolver})})
+            for scheme, pool in pools.items()
+        }
+
+
+class Fetcher:
+    def __init__(self, pool_size=20, max_bytes=2 * 1024 * 1024, timeout=10, dns_ttl=300, dns_entries=1024,
+                 chunk_size=16384, public_only=False):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.resolver = Resolver(ttl=dns_ttl, max_entries=dns_entries, public_only=public_only)
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        # A proxy from the environment would connect on our behalf, past the resolver
+        self.session.trust_env = not public_only
+        adapter = ResolvingAdapter(self.resolver, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._timings = deque(maxlen=200)
+        self.fetches = 0
+        self.failures = 0
+        self.skipped = 0
+        self.truncated = 0
+
+    def iter_body(self, url, accept=HTML_TYPES):
+        # Yields (response, chunk) pairs so callers can stop reading early
+        response = self.session.get(url, timeout=self.timeout, stream=True)
+        try:
+            if not 200 <= response.status_code < 300:
+                raise HTTPStatusError(response.status_code, response.url)
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if accept and content_type and content_type not in accept:
+                raise NotHTML(f"Unsupported content type: {content_type}")
+            read = 0
+            for chunk in response.iter_content(self.chunk_size):
+                if read + len(chunk) > self.max_bytes:
+                    chunk = chunk[:self.max_bytes - read]
+                read += len(chunk)
+                yield response, chunk
+                if read >= self.max_bytes:
+                    break
+        finally:
+            response.close()
+
+    def fetch(self, url, accept=HTML_TYPES, on_chunk=None):
+        # With on_chunk(chunk, encoding) the body is handed over as it arrives instead of
+        # being buffered; returning True from it stops the download early
+        start = time.perf_counter()
+        timing = {"url": url}
+        body = bytearray()
+        response = None
+        read = 0
+        stopped = False
+        try:
+            body_iter = self.iter_body(url, accept=accept)
+            encoding = None
+            for response, chunk in body_iter:
+                if "headers" not in timing:
+                    timing["headers"] = round(response.elapsed.total_seconds(), 4)
+                    encoding = self.encoding_for(response)
+                read += len(chunk)
+                if on_chunk is None:
+                    body += chunk
+                elif on_chunk(chunk, encoding):
+                    stopped = True
+                    body_iter.close()
+                    break
+        except NotHTML:
+            with self._lock:
+                self.skipped += 1
+            raise
+        except HTTPStatusError:
+            with self._lock:
+                self.failures += 1
+            raise
+        except requests.RequestException as e:
+            with self._lock:
+                self.failures += 1
+            raise FetchError(str(e)) from e
+        finally:
+            timing["total"] = round(time.perf_counter() - start, 4)
+            timing["bytes"] = read
+            with self._lock:
+                self.fetches += 1
+                self._timings.append(timing)
+
+        if response is None:
+            return {"url": url, "status": None, "contentType": "", "text": "", "bytes": 0,
+                    "truncated": False, "stoppedEarly": False, "timings": timing}
+        is_truncated = not stopped and read >= self.max_bytes
+        if is_truncated:
+            with self._lock:
+                self.truncated += 1
+        return {
+            "url": response.url,
+            "status": response.status_code,
+            "contentType": response.headers.get("Content-Type", ""),
+            "text": bytes(body).decode(self.encoding_for(response), errors="replace") if on_chunk is None else None,
+            "bytes": read,
+            "stoppedEarly": stopped,
+            "truncated": is_truncated,
+            "timings": timing,
+        }
+
+    @staticmethod
+    def encoding_for(response):
+        content_type = response.headers.get("Content-Type", "")
+        if "charset=" in content_type:
+            charset = content_type.split("charset=")[-1].split(";")[0].strip().strip('"')
+            try:
+                return codecs.lookup(charset).name
+            except LookupError:
+                pass
+        return "utf-8"
+
+    def stats(self):
+        with self._lock:
+            totals = sorted(t["total"] for t in self._timings)
+            return {
+                "fetches": self.fetches, "failures": self.failures, "skipped": self.skipped,
+                "truncated": self.truncated, "dns": self.resolver.stats(),
+                "p50": totals[len(totals) // 2] if totals else None,
+                "p95": totals[int(len(totals) * 0.95)] if totals else None,
+                "recent": list(self._timings)[-10:],
+            }
+
+
+class ShardedTransport(httpx.AsyncBaseTransport if httpx else object):
+    # max_connections spread over several small httpx pools, taken in turn. httpcore's
+    # pool does O(connections^2) bookkeeping on every request, so one pool of hundreds
+    # of connections costs more CPU than the requests themselves. The shards share one
+    # SSL context; loading the CA bundle is the slow part of building a transport.
+    def __init__(self, max_connections=100, shard_size=32, network_backend=None, **kwargs):
+        shards = max(1, -(-max_connections // shard_size))
+        per_shard = -(-max_connections // shards)
+        limits = httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard)
+        kwargs.setdefault("verify", httpx.create_ssl_context())
+        self.transports = [httpx.AsyncHTTPTransport(limits=limits, **kwargs) for _ in range(shards)]
+        if network_backend is not None:
+            # httpx has no option for it; set before the pools open any connection
+            for transport in self.transports:
+                transport._pool._network_backend = network_backend
+        self._next = itertools.cycle(self.transports)
+
+    async def handle_async_request(self, request):
+        return await next(self._next).handle_async_request(request)
+
+    async def aclose(self):
+        for transport in self.transports:
+            await transport.aclose()
+
+
+class ResolvingBackend(httpcore.AsyncNetworkBackend if httpx else object):
+    # httpcore's network backend with host lookups through a Resolver; a cache miss is
+    # resolved in a thread so the event loop never blocks on DNS
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = self.resolver.cached(host, port) or await asyncio.to_thread(self.resolver.resolve, host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(f"Failed to resolve '{host}' ({e})") from e
+        return await self.backend.connect_tcp(addresses[0], port, timeout=timeout, local_address=local_address,
+                                              socket_options=socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+class AsyncFetcher(Fetcher):
+    # fetch() on httpx.AsyncClient for the asyncio pipeline; same limits, stats and
+    # early stop. The client binds to the event loop it is first used on.
+    def __init__(self, pool_size=100, max_bytes=2 * 1024 * 1024, timeout=10, dns_ttl=300, dns_entries=1024,
+                 chunk_size=16384, public_only=False):
+        if httpx is None:
+            raise RuntimeError("AsyncFetcher needs httpx (pip install httpx)")
+        super().__init__(pool_size=1, max_bytes=max_bytes, timeout=timeout, dns_ttl=dns_ttl, dns_entries=dns_entries,
+                         chunk_size=chunk_size, public_only=public_only)
+        self.pool_size = pool_size
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(headers=DEFAULT_HEADERS, timeout=self.timeout, follow_redirects=True,
+                                            trust_env=self.session.trust_env,
+                                            transport=ShardedTransport(self.pool_size,
+                                                                       network_backend=ResolvingBackend(self.resolver)))
+        return self.client
+
+    async def fetch(self, url, accept=HTML_TYPES, on_chunk=None):
+        start = time.perf_counter()
+        timing = {"url": url}
+        body = bytearray()
+        read = 0
+        stopped = False
+        response = None
+        try:
+            async with self._client().stream("GET", url) as response:
+                timing["headers"] = round(time.perf_counter() - start, 4)
+                if not 200 <= response.status_code < 300:
+                    raise HTTPStatusError(response.status_code, response.url)
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if accept and content_type and content_type not in accept:
+                    raise NotHTML(f"Unsupported content type: {content_type}")
+                encoding = self.encoding_for(response)
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    if read + len(chunk) > self.max_bytes:
+                        chunk = chunk[:self.max_bytes - read]
+                    read += len(chunk)
+                    if on_chunk is None:
+                        body += chunk
+                    elif on_chunk(chunk, encoding):
+                        stopped = True
+                        break
+                    if read >= self.max_bytes:
+                        break
+        except NotHTML:
+            with self._lock:
+                self.skipped += 1
+            raise
+        except HTTPStatusError:
+            with self._lock:
+                self.failures += 1
+            raise
+        except httpx.HTTPError as e:
+            with self._lock:
+                self.failures += 1
+            raise FetchError(str(e)) from e
+        finally:
+            timing["total"] = round(time.perf_counter() - start, 4)
+            timing["bytes"] = read
+            with self._lock:
+                self.fetches += 1
+                self._timings.append(timing)
+
+        is_truncated = not stopped and read >= self.max_bytes
+        if is_truncated:
+            with self._lock:
+                self.truncated += 1
+        return {
+            "url": str(response.url),
+            "status": response.status_code,
+            "contentType": response.headers.get("Content-Type", ""),
+            "text": bytes(body).decode(self.encoding_for(response), errors="replace") if on_chunk is None else None,
+            "bytes": read,
+            "stoppedEarly": stopped,
+            "truncated": is_truncated,
+            "timings": timing,
+        }
@@ -0,0 +1,187 @@
+import gzip
+import hashlib
+import threading
+
+from db import database
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ["br", "gzip", "identity"] if brotli else ["gzip", "identity"]
+
+
+def parse_accept_encoding(header):
+    # Returns {coding: q}; codings with q=0 are refused
+    accepted = {}
+    for part in (header or "").split(","):
+        if not part.strip():
+            continue
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = parse_accept_encoding(header)
+    best, best_q = "identity", accepted.get("identity", accepted.get("*", 0.001))
+    for coding in ENCODINGS:
+        if coding == "identity":
+            continue
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def compress_variants(body):
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    br = brotli.compress(body, quality=11) if brotli else None
+    return etag, gz, br
+
+
+class StaticBody:
+    # A response body fixed at startup, held in memory with its compressed variants
+    def __init__(self, body, content_type, cache_control):
+        self.identity = body.encode("utf-8") if isinstance(body, str) else body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag, self.gzip, self.br = compress_variants(self.identity)
+
+    def respond(self, request):
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("If-None-Match"), self.etag):
+            return "", 304, headers
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        body = getattr(self, encoding)
+        if body is None:
+            encoding, body = "identity", self.identity
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        headers["Content-Type"] = self.content_type
+        return body, 200, headers
+
+
+class PageCache:
+    # Stores each rendered campaign response once, with its ETag and pre-built
+    # gzip/brotli encodings, so repeat hits never re-query, re-render or re-compress.
+    def __init__(self, db_file, cache_control="public, max-age=300, s-maxage=3600, stale-while-revalidate=86400"):
+        self.db = database(db_file)
+        self.cache_control = cache_control
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        self.builds = 0
+
+    def init_db(self, version=None):
+        # version identifies whatever the stored bodies embed (asset URLs); a change drops them
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_cache (
+                    campaign_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    content_type TEXT NOT NULL,
+                    etag TEXT NOT NULL,
+                    identity BLOB NOT NULL,
+                    gzip BLOB,
+                    br BLOB,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (campaign_id, kind)
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS page_cache_meta (key TEXT PRIMARY KEY, value TEXT)")
+            if version is not None:
+                row = conn.execute("SELECT value FROM page_cache_meta WHERE key = 'version'").fetchone()
+                if not row or row[0] != version:
+                    conn.execute("DELETE FROM page_cache")
+                    conn.execute("INSERT OR REPLACE INTO page_cache_meta (key, value) VALUES ('version', ?)",
+                                 (version,))
+
+    def store(self, campaign_id, kind, content_type, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        etag, gz, br = compress_variants(body)
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO page_cache (campaign_id, kind, content_type, etag, identity, gzip, br)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (campaign_id, kind, content_type, etag, body, gz, br))
+        with self._lock:
+            self.builds += 1
+        return etag
+
+    def invalidate(self, campaign_id):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM page_cache WHERE campaign_id = ?", (campaign_id,))
+
+    def _etag(self, campaign_id, kind):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT etag FROM page_cache WHERE campaign_id = ? AND kind = ?",
+                               (campaign_id, kind)).fetchone()
+        return row[0] if row else None
+
+    def respond(self, request, campaign_id, kind, build):
+        # build() returns (content_type, body), or None when the campaign does not exist
+        etag = self._etag(campaign_id, kind)
+        if etag is None:
+            built = build()
+            if built is None:
+                return None
+            etag = self.store(campaign_id, kind, *built)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return "", 304, headers
+
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        with self.db.connection() as conn:
+            row = conn.execute(f"SELECT content_type, {encoding}, etag FROM page_cache WHERE campaign_id = ? AND kind = ?",
+                               (campaign_id, kind)).fetchone()
+            if row and row[1] is None:
+                encoding = "identity"
+                row = conn.execute("SELECT content_type, identity, etag FROM page_cache WHERE campaign_id = ? AND kind = ?",
+                                   (campaign_id, kind)).fetchone()
+        if row is None:
+            # Invalidated between the two reads
+            return self.respond(request, campaign_id, kind, build)
+        content_type, body, headers["ETag"] = row
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        headers["Content-Type"] = content_type
+        with self._lock:
+            self.hits += 1
+        return bytes(body), 200, headers
+
+    def purge(self, max_age_days=None):
+        # Pages of deleted campaigns, and with max_age_days any built longer ago than
+        # that; they are rebuilt on the next request
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM page_cache WHERE campaign_id NOT IN (SELECT id FROM campaigns)").rowcount
+            if max_age_days:
+                removed += conn.execute("DELETE FROM page_cache WHERE updated_at < datetime('now', ?)",
+                                        (f"-{int(max_age_days)} days",)).rowcount
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "notModified": self.not_modified, "builds": self.builds,
+                    "encodings": ENCODINGS}
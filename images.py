@@ -0,0 +1,441 @@
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import threading
+import time
+
+from db import database
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+EVICTED = "evicted"
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+CONTENT_TYPES = {ext: content_type for content_type, ext in EXTENSIONS.items()}
+# <sha256 of the downloaded bytes, 32 hex>-<width>.<ext>
+FILE_NAME = re.compile(r"^([0-9a-f]{32})-(\d+)\.(jpg|png|webp|gif)$")
+MAX_PIXELS = 40_000_000
+
+_pillow = None
+
+
+def pillow():
+    # Pillow is slow to import, so it's loaded by the first image worker rather than at
+    # startup. It's in requirements.txt; without it images are served as downloaded, one
+    # size, which is what this module exists to avoid.
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageOps, features
+            _pillow = (Image, ImageOps, features.check("webp"))
+        except ImportError:
+            print("WARNING: Pillow is not installed, so images are served full size with no "
+                  "WebP or resized variants. Install it with: pip install -r requirements.txt")
+            _pillow = False
+    return _pillow
+
+
+def image_size(data):
+    # (content type, width, height) read from the file header, or None
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return ("image/png",) + struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return ("image/gif",) + struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return "image/webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return "image/webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return "image/webp", int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # Fill byte or a marker without a length
+                i += 1 if marker == 0xFF else 2
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return "image/jpeg", width, height
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+class ImageStore:
+    # Product images for campaign pages. index() queues a campaign's scraped image URLs
+    # in campaign_images inside the save transaction; worker threads claim them (so
+    # several processes can share the queue), download each, and write resized WebP and
+    # JPEG variants under the hash of the original, so a picture used by many campaigns
+    # is stored once. Files are kept under max_bytes by evicting the least recently
+    # served; the next build of a page that used one queues it again. on_ready(campaign_id)
+    # runs when a campaign's images are done, to rebuild its cached pages, and
+    # on_evict(campaign_id) when one is evicted, to drop them (not rebuild: that would
+    # fetch the image straight back).
+    def __init__(self, db_file, directory, fetcher, widths=(320, 640, 1024, 1600), quality=80,
+                 max_bytes=512 * 1024 * 1024, min_age=3600, per_campaign=4, workers=2, max_attempts=3,
+                 poll_interval=5.0, on_ready=None, on_evict=None):
+        self.db = database(db_file)
+        self.directory = os.path.abspath(directory)
+        self.fetcher = fetcher
+        self.widths = sorted(widths)
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.per_campaign = per_campaign
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.on_ready = on_ready
+        self.on_evict = on_evict
+        self.recover_on_start = True
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self._touched = {}
+        self.downloads = 0
+        self.reused = 0
+        self.failures = 0
+        self.evictions = 0
+        self.served = 0
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    digest TEXT PRIMARY KEY,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    variants TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    used_at REAL NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_images_used ON images (used_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_images (
+                    campaign_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    source_url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    digest TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    worker INTEGER,
+                    PRIMARY KEY (campaign_id, position)
+                )
+            """)
+            if "worker" not in [row[1] for row in conn.execute("PRAGMA table_info(campaign_images)")]:
+                conn.execute("ALTER TABLE campaign_images ADD COLUMN worker INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_images_status ON campaign_images (status, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_images_digest ON campaign_images (digest)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_images_source ON campaign_images (source_url)")
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            if self.recover_on_start:
+                self.recover()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"image-worker-{i}", daemon=True).start()
+
+    def recover(self):
+        # Downloads cut off by a restart; like JobQueue.recover(), once before forking
+        with self.db.transaction() as conn:
+            conn.execute("UPDATE campaign_images SET status = ? WHERE status = ?", (PENDING, RUNNING))
+
+    def requeue(self, worker):
+        # Downloads claimed by a server process that died, as JobQueue.requeue()
+        with self.db.transaction() as conn:
+            requeued = conn.execute("UPDATE campaign_images SET status = ?, worker = NULL WHERE status = ? AND worker = ?",
+                                    (PENDING, RUNNING, worker)).rowcount
+        if requeued:
+            self._wake.set()
+        return requeued
+
+    def index(self, conn, items):
+        # items: [(campaign_id, campaign)]; runs inside the caller's write transaction.
+        # Only campaigns that came from a scrape carry sourceImages; others keep theirs.
+        rows = []
+        for cid, campaign in items:
+            urls = campaign.get("sourceImages")
+            if urls is None:
+                continue
+            conn.execute("DELETE FROM campaign_images WHERE campaign_id = ?", (cid,))
+            rows += [(cid, position, url, PENDING) for position, url in enumerate(urls[:self.per_campaign])]
+        if rows:
+            conn.executemany("INSERT INTO campaign_images (campaign_id, position, source_url, status) "
+                             "VALUES (?, ?, ?, ?)", rows)
+            self._wake.set()
+
+    def for_campaign(self, campaign_id):
+        # The campaign's ready images, as template/API dicts; evicted ones are queued again
+        with self.db.connection() as conn:
+            rows = conn.execute("""
+                SELECT ci.position, ci.status, i.variants FROM campaign_images ci
+                LEFT JOIN images i ON i.digest = ci.digest
+                WHERE ci.campaign_id = ? ORDER BY ci.position
+            """, (campaign_id,)).fetchall()
+        images, evicted = [], []
+        for position, status, variants in rows:
+            if status == READY and variants:
+                images.append(self._describe(json.loads(variants)))
+            elif status == EVICTED:
+                evicted.append(position)
+        if evicted:
+            with self.db.transaction() as conn:
+                conn.executemany("""
+                    UPDATE campaign_images SET status = ?, attempts = 0, updated_at = CURRENT_TIMESTAMP
+                    WHERE campaign_id = ? AND position = ? AND status = ?
+                """, [(PENDING, campaign_id, position, EVICTED) for position in evicted])
+            self._wake.set()
+        return images
+
+    def _describe(self, variants):
+        # variants: [[width, height, content type, file name]], narrowest first. The
+        # fallback src is the widest in the most compatible format, near 640px.
+        by_type = {}
+        for w, h, content_type, name in variants:
+            by_type.setdefault(content_type, []).append((w, h, f"/images/{name}"))
+        fallback_type = next(t for t in ("image/jpeg", "image/png", "image/gif", "image/webp") if t in by_type)
+        fallback = by_type[fallback_type]
+        src = next((v for v in fallback if v[0] >= 640), fallback[-1])
+        srcset = lambda vs: ", ".join(f"{url} {w}w" for w, _, url in vs)  # noqa: E731
+        return {
+            "src": src[2], "width": src[0], "height": src[1], "srcset": srcset(fallback),
+            "sources": [{"type": t, "srcset": srcset(vs)} for t, vs in by_type.items() if t != fallback_type],
+        }
+
+    def path(self, name):
+        # (file path, content type) for an /images/<name> request, or None
+        m = FILE_NAME.match(name)
+        if not m:
+            return None
+        path = os.path.join(self.directory, name[:2], name)
+        if not os.path.exists(path):
+            return None
+        self._touch(m.group(1))
+        return path, CONTENT_TYPES[m.group(3)]
+
+    def _touch(self, digest):
+        # Recency for eviction, written at most hourly per image
+        now = time.time()
+        with self._lock:
+            self.served += 1
+            if now - self._touched.get(digest, 0) < 3600:
+                return
+            # Re-inserted so the dict stays oldest first, and whatever is past the hour
+            # (and so would be written again anyway) is dropped from the front
+            self._touched.pop(digest, None)
+            self._touched[digest] = now
+            while now - next(iter(self._touched.values())) >= 3600:
+                del self._touched[next(iter(self._touched))]
+        try:
+            with self.db.transaction() as conn:
+                conn.execute("UPDATE images SET used_at = ? WHERE digest = ?", (now, digest))
+        except Exception as e:
+            print(f"Image cache error: {e}")
+
+    def _claim_next(self):
+        with self.db.transaction(immediate=True) as conn:
+            row = conn.execute("""
+                SELECT campaign_id, position, source_url, attempts FROM campaign_images
+                WHERE status = ? ORDER BY updated_at LIMIT 1
+            """, (PENDING,)).fetchone()
+            if row:
+                conn.execute("""
+                    UPDATE campaign_images SET status = ?, attempts = attempts + 1, worker = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE campaign_id = ? AND position = ?
+                """, (RUNNING, os.getpid(), row[0], row[1]))
+        return row
+
+    def _work(self):
+        while True:
+            try:
+                row = self._claim_next()
+                if row is None:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                cid, position, url, attempts = row
+                try:
+                    digest = self._reuse(url) or self._download(url)
+                    status, error = READY, None
+                except Exception as e:
+                    with self._lock:
+                        self.failures += 1
+                    digest, error = None, str(e)[:500]
+                    status = PENDING if attempts + 1 < self.max_attempts else FAILED
+                with self.db.transaction() as conn:
+                    conn.execute("""
+                        UPDATE campaign_images SET status = ?, digest = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE campaign_id = ? AND position = ? AND source_url = ? AND status = ?
+                    """, (status, digest, error, cid, position, url, RUNNING))
+                    left = conn.execute("SELECT count(*) FROM campaign_images WHERE campaign_id = ? AND status IN (?, ?)",
+                                        (cid, PENDING, RUNNING)).fetchone()[0]
+                if status == READY:
+                    self.evict()
+                if not left and self.on_ready:
+                    self.on_ready(cid)
+            except Exception as e:
+                print(f"Image worker error: {e}")
+                time.sleep(self.poll_interval)
+
+    def _reuse(self, url):
+        # The same source URL already processed for another campaign
+        with self.db.connection() as conn:
+            row = conn.execute("""
+                SELECT i.digest FROM campaign_images ci JOIN images i ON i.digest = ci.digest
+                WHERE ci.source_url = ? AND ci.status = ? LIMIT 1
+            """, (url, READY)).fetchone()
+        if row:
+            with self.db.transaction() as conn:
+                conn.execute("UPDATE images SET used_at = ? WHERE digest = ?", (time.time(), row[0]))
+            with self._lock:
+                self.reused += 1
+            return row[0]
+        return None
+
+    def _download(self, url):
+        # The URL comes from the scraped page, so it is only fetched over http(s), and
+        # self.fetcher should be one that refuses private addresses (public_only)
+        if not url.lower().startswith(("http://", "https://")):
+            raise ValueError("Not an http(s) URL")
+        body = bytearray()
+        fetched = self.fetcher.fetch(url, accept=IMAGE_TYPES, on_chunk=lambda chunk, encoding: body.extend(chunk))
+        if fetched["status"] != 200:
+            raise ValueError(f"HTTP {fetched['status']}")
+        if fetched["truncated"]:
+            raise ValueError("Image too large")
+        data = bytes(body)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            self.downloads += 1
+        with self.db.connection() as conn:
+            if conn.execute("SELECT 1 FROM images WHERE digest = ?", (digest,)).fetchone():
+                return digest
+        width, height, variants = self._variants(data)
+        written = []
+        for w, h, content_type, encoded in variants:
+            name = f"{digest}-{w}.{EXTENSIONS[content_type]}"
+            self._write(name, encoded)
+            written.append([w, h, content_type, name])
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO images (digest, width, height, variants, bytes, used_at) VALUES (?, ?, ?, ?, ?, ?)
+            """, (digest, width, height, json.dumps(written), sum(len(v[3]) for v in variants), time.time()))
+        return digest
+
+    def _variants(self, data):
+        # Returns (width, height, [(width, height, content type, bytes)]) for the widest
+        # variant and all of them, narrowest first
+        size = image_size(data)
+        if size is None:
+            raise ValueError("Unrecognised image format")
+        content_type, width, height = size
+        if not width or not height or width * height > MAX_PIXELS:
+            raise ValueError(f"Unusable image size {width}x{height}")
+        pil = pillow()
+        if not pil:
+            return width, height, [(width, height, content_type, data)]
+        Image, ImageOps, webp = pil
+        img = Image.open(io.BytesIO(data))
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, much faster than full size
+        img.draft("RGB", (self.widths[-1], self.widths[-1] * height // width))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        # WebP keeps transparency; the JPEG fallback gets a white background
+        flat = None
+        if img.mode == "RGBA":
+            flat = Image.alpha_composite(Image.new("RGBA", img.size, (255, 255, 255, 255)), img).convert("RGB")
+        width, height = img.size
+        targets = sorted({w for w in self.widths if w < width} | {min(width, self.widths[-1])}, reverse=True)
+        variants = []
+        # Widest first, each resized from the one before: cheaper than always from the original
+        for w in targets:
+            h = max(1, round(height * w / width))
+            if (w, h) != img.size:
+                img = img.resize((w, h), Image.LANCZOS, reducing_gap=3.0)
+                flat = flat.resize((w, h), Image.LANCZOS, reducing_gap=3.0) if flat else None
+            if webp:
+                out = io.BytesIO()
+                img.save(out, "WEBP", quality=self.quality, method=4)
+                variants.append((w, h, "image/webp", out.getvalue()))
+            out = io.BytesIO()
+            (flat or img).save(out, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            variants.append((w, h, "image/jpeg", out.getvalue()))
+        variants.reverse()
+        return variants[-1][0], variants[-1][1], variants
+
+    def _write(self, name, data):
+        directory = os.path.join(self.directory, name[:2])
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{name}.{threading.get_ident()}")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(directory, name))
+
+    def evict(self):
+        # Drops the least recently served images until the cache fits max_bytes. Returns
+        # how many were removed. Images used in the last min_age seconds stay even over
+        # budget; otherwise a page's images could evict each other as each one arrives.
+        removed, campaigns = 0, set()
+        while True:
+            with self.db.transaction(immediate=True) as conn:
+                total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM images").fetchone()[0]
+                if total <= self.max_bytes:
+                    break
+                row = conn.execute("SELECT digest, variants FROM images WHERE used_at < ? ORDER BY used_at LIMIT 1",
+                                   (time.time() - self.min_age,)).fetchone()
+                if row is None:
+                    break
+                digest, variants = row
+                conn.execute("DELETE FROM images WHERE digest = ?", (digest,))
+                campaigns.update(cid for (cid,) in conn.execute(
+                    "SELECT campaign_id FROM campaign_images WHERE digest = ?", (digest,)))
+                conn.execute("UPDATE campaign_images SET status = ?, digest = NULL WHERE digest = ?", (EVICTED, digest))
+            for _, _, _, name in json.loads(variants):
+                try:
+                    os.remove(os.path.join(self.directory, name[:2], name))
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            for cid in campaigns:
+                if self.on_evict:
+                    self.on_evict(cid)
+        return removed
+
+    def purge(self):
+        # Rows of deleted campaigns, then anything over max_bytes
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM campaign_images WHERE campaign_id NOT IN (SELECT id FROM campaigns)").rowcount
+        return removed + self.evict()
+
+    def stats(self):
+        pil = pillow() if _pillow is not None else None
+        with self._lock:
+            return {"downloads": self.downloads, "reused": self.reused, "failures": self.failures,
+                    "evictions": self.evictions, "served": self.served, "widths": self.widths,
+                    "resizing": None if pil is None else bool(pil), "webp": bool(pil and pil[2])}
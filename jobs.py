@@ -0,0 +1,237 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from db import database
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    # Jobs are claimed from the jobs table with a conditional UPDATE, so several server
+    # processes can share it: a process runs the jobs it was handed, and idle workers
+    # pick up whatever is queued (e.g. recovered after a crash) every poll_interval.
+    def __init__(self, db_file, handler, workers=4, max_pending=100, poll_interval=1.0):
+        self.db = database(db_file)
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.recover_on_start = True
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._events = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    worker INTEGER
+                )
+            """)
+            if "worker" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self.init_db()
+            if self.recover_on_start:
+                for job_id in self.recover():
+                    self._queue.put(job_id)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+
+    def recover(self):
+        # Anything queued or mid-flight when the server died is run again. With several
+        # processes this must run once, before they start, not in each of them.
+        with self.db.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE status = ?",
+                         (QUEUED, RUNNING))
+            rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def requeue(self, worker):
+        # A server process died: the jobs it was running go back on the queue for the
+        # others (worker is its pid, recorded when it claimed them)
+        with self.db.transaction() as conn:
+            return conn.execute("""
+                UPDATE jobs SET status = ?, worker = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = ? AND worker = ?
+            """, (QUEUED, RUNNING, worker)).rowcount
+
+    def submit(self, kind, payload, listen=False):
+        # listen=True: the caller will read the job's progress with events()
+        self.start()
+        if self._queue.qsize() >= self.max_pending:
+            raise QueueFull("Too many pending jobs")
+        job_id = uuid.uuid4().hex
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO jobs (id, kind, payload, status) VALUES (?, ?, ?, ?)",
+                         (job_id, kind, json.dumps(payload), QUEUED))
+        if listen:
+            with self._cond:
+                self._events[job_id] = []
+        self._queue.put(job_id)
+        return job_id
+
+    def progress(self, event, data):
+        # For handlers: passes (event, data) to whoever is listening to the job running on
+        # this thread; a no-op when nobody is
+        job_id = getattr(self._local, "job_id", None)
+        with self._cond:
+            events = self._events.get(job_id)
+            if events is not None:
+                events.append((event, data))
+                self._cond.notify_all()
+
+    def events(self, job_id, heartbeat=15):
+        # For a job submitted with listen=True: yields what its handler reports through
+        # progress(), ("ping", None) after heartbeat seconds without any, and finally
+        # ("job", job) once it has finished. Progress is only seen when the job runs in
+        # this process, as it normally does; run by another one, just the outcome arrives.
+        quiet = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    events = self._events.get(job_id, [])
+                    if not events:
+                        self._cond.wait(min(heartbeat, self.poll_interval))
+                    pending = events[:]
+                    events.clear()
+                if pending:
+                    quiet = time.monotonic()
+                    yield from pending
+                    continue
+                if self._status(job_id) in (DONE, FAILED, None):
+                    # Whatever the handler reported before finishing came first
+                    with self._cond:
+                        pending = self._events.get(job_id, [])[:]
+                    yield from pending
+                    yield "job", self.get(job_id)
+                    return
+                if time.monotonic() - quiet >= heartbeat:
+                    quiet = time.monotonic()
+                    yield "ping", None
+        finally:
+            with self._cond:
+                self._events.pop(job_id, None)
+
+    def get(self, job_id):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT id, kind, status, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0], "kind": row[1], "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4], "createdAt": row[5], "updatedAt": row[6]
+        }
+
+    def wait(self, job_id, timeout=25):
+        # Long-poll: block until the job reaches a terminal state or the timeout expires
+        job = self.get(job_id)
+        if not job:
+            return None
+        # Re-checks every poll_interval too: another process may be running the job
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._status(job_id) not in (DONE, FAILED):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, self.poll_interval))
+        return self.get(job_id)
+
+    def purge(self, max_age_days=7):
+        # Finished jobs older than max_age_days; their results are only polled shortly after
+        with self.db.transaction() as conn:
+            return conn.execute("""
+                DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < datetime('now', ?)
+            """, (DONE, FAILED, f"-{int(max_age_days)} days")).rowcount
+
+    def _status(self, job_id):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _claim(self, job_id):
+        with self.db.transaction() as conn:
+            claimed = conn.execute("""
+                UPDATE jobs SET status = ?, worker = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?
+            """, (RUNNING, os.getpid(), job_id, QUEUED)).rowcount
+        return claimed == 1
+
+    def _claim_next(self):
+        # Idle workers in every process poll here, so look with a plain read and only take
+        # the write lock (in _claim) when there is a queued job; losing the race to another
+        # worker moves on to the next one
+        with self.db.connection() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 5",
+                                (QUEUED,)).fetchall()
+        for (job_id,) in rows:
+            if self._claim(job_id):
+                return job_id
+        return None
+
+    def _update(self, job_id, status, result=None, error=None):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, json.dumps(result) if result is not None else None, error, job_id))
+        with self._cond:
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                job_id = None
+            try:
+                if job_id is None:
+                    job_id = self._claim_next()
+                    if job_id is None:
+                        continue
+                elif not self._claim(job_id):
+                    continue
+                with self.db.connection() as conn:
+                    row = conn.execute("SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                self._local.job_id = job_id
+                try:
+                    result = self.handler(row[0], json.loads(row[1]))
+                    self._update(job_id, DONE, result=result)
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    self._update(job_id, FAILED, error=str(e))
+                finally:
+                    self._local.job_id = None
+            except Exception as e:
+                print(f"Job worker error: {e}")
@@ -0,0 +1,175 @@
+import json
+import re
+
+from codec import plain
+from db import database
+
+MAX_TERM = 100
+
+
+def normalize_keyword(term):
+    term = re.sub(r"\s+", " ", str(term or "")).strip().lower()
+    return term[:MAX_TERM]
+
+
+class KeywordIndex:
+    # keywords and features broken out of generated_content into indexed child tables.
+    # Per-keyword totals and per-day counts are kept current by triggers on
+    # campaign_keywords, so frequency queries never touch the campaigns table.
+    def __init__(self, db_file, backfill_batch=1000, decode=None):
+        self.db = database(db_file)
+        self.backfill_batch = backfill_batch
+        # decode(value, tag) for generated_content stored by a ContentCodec
+        self.decode = decode or plain
+
+    def init_db(self):
+        with self.db.transaction(immediate=True) as conn:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'campaign_keywords'").fetchone()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS keywords (
+                    id INTEGER PRIMARY KEY,
+                    term TEXT NOT NULL UNIQUE,
+                    campaigns INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_keywords_campaigns ON keywords (campaigns DESC)")
+            # created_at is copied from the campaign so a keyword filter can page in
+            # (created_at, id) order straight off idx_campaign_keywords_keyword
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_keywords (
+                    campaign_id INTEGER NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+                    keyword_id INTEGER NOT NULL REFERENCES keywords (id),
+                    position INTEGER NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    PRIMARY KEY (campaign_id, keyword_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_campaign_keywords_keyword
+                ON campaign_keywords (keyword_id, created_at DESC, campaign_id DESC)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_features (
+                    campaign_id INTEGER NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    feature TEXT NOT NULL,
+                    PRIMARY KEY (campaign_id, position)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_features_feature ON campaign_features (feature)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS keyword_daily (
+                    keyword_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    campaigns INTEGER NOT NULL,
+                    PRIMARY KEY (day, keyword_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS campaign_keywords_insert AFTER INSERT ON campaign_keywords BEGIN
+                    UPDATE keywords SET campaigns = campaigns + 1 WHERE id = NEW.keyword_id;
+                    INSERT INTO keyword_daily (keyword_id, day, campaigns)
+                    VALUES (NEW.keyword_id, date(NEW.created_at), 1)
+                    ON CONFLICT (day, keyword_id) DO UPDATE SET campaigns = campaigns + 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS campaign_keywords_delete AFTER DELETE ON campaign_keywords BEGIN
+                    UPDATE keywords SET campaigns = campaigns - 1 WHERE id = OLD.keyword_id;
+                    UPDATE keyword_daily SET campaigns = campaigns - 1
+                    WHERE day = date(OLD.created_at) AND keyword_id = OLD.keyword_id;
+                    DELETE FROM keyword_daily
+                    WHERE day = date(OLD.created_at) AND keyword_id = OLD.keyword_id AND campaigns <= 0;
+                END
+            """)
+        if not exists:
+            total = self.rebuild()
+            if total:
+                print(f"Keyword index: backfilled {total} campaigns")
+
+    def index(self, conn, items):
+        # items: [(campaign_id, campaign)]; runs inside the caller's write transaction.
+        # Re-indexing a campaign replaces its rows, and the triggers keep the counts exact.
+        if not items:
+            return
+        ids = [cid for cid, _ in items]
+        marks = ", ".join("?" * len(ids))
+        created = dict(conn.execute(f"SELECT id, created_at FROM campaigns WHERE id IN ({marks})", ids))
+        conn.execute(f"DELETE FROM campaign_keywords WHERE campaign_id IN ({marks})", ids)
+        conn.execute(f"DELETE FROM campaign_features WHERE campaign_id IN ({marks})", ids)
+
+        links, features = [], []
+        for cid, campaign in items:
+            if cid not in created:
+                continue
+            content = campaign.get("generatedContent") or {}
+            terms = []
+            for term in content.get("keywords") or []:
+                term = normalize_keyword(term)
+                if term and term not in terms:
+                    terms.append(term)
+            links += [(cid, term, position, created[cid]) for position, term in enumerate(terms)]
+            features += [(cid, position, str(feature).strip())
+                         for position, feature in enumerate(content.get("features") or []) if str(feature).strip()]
+
+        conn.executemany("INSERT OR IGNORE INTO keywords (term) VALUES (?)", {(term,) for _, term, _, _ in links})
+        conn.executemany("""
+            INSERT INTO campaign_keywords (campaign_id, keyword_id, position, created_at)
+            SELECT ?, id, ?, ? FROM keywords WHERE term = ?
+        """, [(cid, position, created_at, term) for cid, term, position, created_at in links])
+        conn.executemany("INSERT INTO campaign_features (campaign_id, position, feature) VALUES (?, ?, ?)", features)
+
+    def rebuild(self):
+        with self.db.transaction(immediate=True) as conn:
+            conn.execute("DELETE FROM campaign_keywords")
+            conn.execute("DELETE FROM campaign_features")
+            conn.execute("DELETE FROM keyword_daily")
+            conn.execute("DELETE FROM keywords")
+        last, total = 0, 0
+        while True:
+            with self.db.transaction(immediate=True) as conn:
+                rows = conn.execute("""
+                    SELECT id, generated_content, content_codec FROM campaigns WHERE id > ? ORDER BY id LIMIT ?
+                """, (last, self.backfill_batch)).fetchall()
+                items = []
+                for cid, content, tag in rows:
+                    try:
+                        content = json.loads(self.decode(content, tag)) if content else {}
+                    except ValueError:
+                        content = {}
+                    items.append((cid, {"generatedContent": content if isinstance(content, dict) else {}}))
+                self.index(conn, items)
+            if not rows:
+                break
+            last = rows[-1][0]
+            total += len(rows)
+        return total
+
+    def keyword_id(self, conn, term):
+        row = conn.execute("SELECT id FROM keywords WHERE term = ?", (normalize_keyword(term),)).fetchone()
+        return row[0] if row else None
+
+    def top(self, limit=20, since=None):
+        # Most used keywords overall, or since a given day (YYYY-MM-DD) from the daily rollup
+        with self.db.connection() as conn:
+            if since is None:
+                rows = conn.execute("""
+                    SELECT term, campaigns FROM keywords WHERE campaigns > 0
+                    ORDER BY campaigns DESC, term LIMIT ?
+                """, (limit,)).fetchall()
+            else:
+                rows = conn.execute("""
+                    SELECT k.term, SUM(d.campaigns) AS n FROM keyword_daily d JOIN keywords k ON k.id = d.keyword_id
+                    WHERE d.day >= ? GROUP BY d.keyword_id ORDER BY n DESC, k.term LIMIT ?
+                """, (since, limit)).fetchall()
+        return [{"keyword": term, "campaigns": n} for term, n in rows]
+
+    def daily(self, term, since=None):
+        with self.db.connection() as conn:
+            keyword_id = self.keyword_id(conn, term)
+            if keyword_id is None:
+                return None
+            rows = conn.execute("""
+                SELECT day, campaigns FROM keyword_daily WHERE keyword_id = ? AND day >= ? ORDER BY day
+            """, (keyword_id, since or "")).fetchall()
+        return [{"day": day, "campaigns": n} for day, n in rows]
@@ -0,0 +1,27 @@
+import threading
+
+
+class Lazy:
+    # Stands in for an object that is slow to import or build (an SDK client, an HTTP
+    # stack): factory() runs on first attribute access, once, and the result is used
+    # from then on. Keeps that cost off process startup.
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._value is not None
+
+    def _load(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
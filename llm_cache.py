@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from db import database
+
+
+def completion_key(params):
+    raw = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CompletionCache:
+    def __init__(self, db_file, max_entries=1000):
+        self.db = database(db_file)
+        self.max_entries = max_entries
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    content TEXT NOT NULL,
+                    latency REAL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+    def _lookup(self, key):
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute("SELECT content, latency FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+            return row
+        except sqlite3.Error as e:
+            print(f"Completion cache error: {e}")
+            return None
+
+    def _store(self, key, model, content, latency):
+        now = time.time()
+        try:
+            with self.db.transaction() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO llm_cache (key, model, content, latency, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (key, model, content, latency, now, now))
+                conn.execute("""
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        except sqlite3.Error as e:
+            print(f"Completion cache error: {e}")
+
+    def get(self, params):
+        row = self._lookup(completion_key(params))
+        if row:
+            with self._lock:
+                self.hits += 1
+                self.saved_seconds += row[1] or 0.0
+            return row[0]
+        return None
+
+    def put(self, params, content, latency):
+        with self._lock:
+            self.misses += 1
+        self._store(completion_key(params), params.get("model"), content, latency)
+
+    def discard(self, params):
+        try:
+            with self.db.transaction() as conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (completion_key(params),))
+        except sqlite3.Error as e:
+            print(f"Completion cache error: {e}")
+
+    def complete(self, params, call, force=False):
+        key = completion_key(params)
+        if force:
+            with self._lock:
+                self.bypassed += 1
+        else:
+            cached = self.get(params)
+            if cached is not None:
+                return cached
+
+        # Single flight: identical concurrent requests wait on the first caller
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            with self._lock:
+                self.coalesced += 1
+                self.saved_seconds += flight.result[1]
+            return flight.result[0]
+
+        try:
+            start = time.perf_counter()
+            content = call()
+            latency = time.perf_counter() - start
+            self._store(key, params.get("model"), content, latency)
+            flight.result = (content, latency)
+            return content
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def acomplete(self, params, call, force=False):
+        # complete() for a coroutine call on the pipeline's event loop; identical
+        # concurrent requests await one task. The SQLite lookups are sub-millisecond
+        # and stay synchronous.
+        key = completion_key(params)
+        if force:
+            with self._lock:
+                self.bypassed += 1
+        else:
+            cached = self.get(params)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self._tasks[key] = asyncio.ensure_future(self._acall(key, params, call))
+                self.misses += 1
+
+        content, latency = await asyncio.shield(task)
+        if not leader:
+            with self._lock:
+                self.coalesced += 1
+                self.saved_seconds += latency
+        return content
+
+    async def _acall(self, key, params, call):
+        try:
+            start = time.perf_counter()
+            content = await call()
+            latency = time.perf_counter() - start
+            self._store(key, params.get("model"), content, latency)
+            return content, latency
+        finally:
+            with self._lock:
+                self._tasks.pop(key, None)
+
+    def purge(self, max_age=None):
+        # Entries beyond max_entries, and with max_age (seconds) any not used for that long
+        with self.db.transaction() as conn:
+            removed = conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            if max_age:
+                removed += conn.execute("DELETE FROM llm_cache WHERE last_used < ?",
+                                        (time.time() - max_age,)).rowcount
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits, "coalesced": self.coalesced, "misses": self.misses,
+                "bypassed": self.bypassed, "savedSeconds": round(self.saved_seconds, 3),
+                "hitRate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,363 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+from db import database
+
+# Request errors: the same prompt would fail on every provider
+FATAL_STATUSES = {400, 422}
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# groq/openai SDK connection and timeout errors, matched by name to stay SDK-agnostic
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class GatewayError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Unavailable(GatewayError):
+    # One provider could not serve the request; the gateway moves down the chain
+    pass
+
+
+def status_of(error):
+    return getattr(error, "status_code", None)
+
+
+def retryable(error):
+    status = status_of(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after(error):
+    # Seconds from Retry-After / retry-after-ms on the error's HTTP response, if any
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(params):
+    # ~4 characters per token for the prompt, plus the completion budget
+    prompt = sum(len(m.get("content") or "") for m in params.get("messages", []))
+    return prompt // 4 + int(params.get("max_tokens") or 1024)
+
+
+class TokenBucket:
+    # Reservations may drive the balance negative; the returned delay is how long the
+    # caller must wait for its share, so concurrent callers queue fairly.
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class SharedTokenBucket:
+    # TokenBucket kept in SQLite, so the server's processes draw on one provider quota
+    # instead of each spending its own copy of it. One short write per call; LLM calls
+    # are rare enough for that not to matter.
+    def __init__(self, db_file, name, per_minute, capacity=None):
+        self.db = database(db_file)
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._ready = False
+
+    def _change(self, amount):
+        # Adds amount (negative to take) after refilling; returns the new balance
+        with self.db.transaction(immediate=True) as conn:
+            if not self._ready:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rate_limits (
+                        name TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated REAL NOT NULL
+                    )
+                """)
+                self._ready = True
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity,
+                                                           row[0] + max(0.0, now - row[1]) * self.rate)
+            tokens = min(self.capacity, tokens + amount)
+            conn.execute("""
+                INSERT INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+            """, (self.name, tokens, now))
+        return tokens
+
+    def reserve(self, amount):
+        return max(0.0, -self._change(-min(amount, self.capacity)) / self.rate)
+
+    def refund(self, amount):
+        self._change(amount)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            return self.state != OPEN
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)) if self.state == OPEN else 0.0
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class Provider:
+    # One entry in the fallback chain: an SDK client (groq.Groq, openai.OpenAI or anything
+    # with chat.completions.create), optionally its async twin for acreate(), an optional
+    # model override and its own quota. bucket(name, per_minute) makes the quota's
+    # buckets; the default keeps them in this process.
+    def __init__(self, name, client, model=None, rpm=None, tpm=None, breaker=None, async_client=None, bucket=None):
+        self.name = name
+        self.client = client
+        self.async_client = async_client
+        self.model = model
+        bucket = bucket or (lambda key, per_minute: TokenBucket(per_minute))
+        self.requests = bucket(f"{name}:rpm", rpm) if rpm else None
+        self.tokens = bucket(f"{name}:tpm", tpm) if tpm else None
+        self.breaker = breaker or CircuitBreaker()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+
+    def reserve(self, tokens):
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def release(self, tokens):
+        if self.requests:
+            self.requests.refund(1)
+        if self.tokens:
+            self.tokens.refund(tokens)
+
+    def block(self, seconds):
+        # Provider said 429: nobody calls it again until Retry-After has passed
+        with self._lock:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._lock:
+            return {"model": self.model, "calls": self.calls, "failures": self.failures,
+                    "rateLimited": self.rate_limited, "waitedSeconds": round(self.waited, 3),
+                    "breaker": self.breaker.state}
+
+
+class LLMGateway:
+    def __init__(self, providers, max_retries=3, backoff=0.5, max_backoff=20, max_wait=30):
+        self.providers = providers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.fallbacks = 0
+        self.exhausted = 0
+
+    def create(self, **params):
+        # Drop-in for client.chat.completions.create: tries each provider in order
+        errors, waits = [], []
+        for i, provider in enumerate(self.providers):
+            if not self._allow(provider, errors, waits):
+                continue
+            try:
+                response = self._call(provider, params)
+            except Unavailable as e:
+                errors.append(f"{provider.name}: {e}")
+                waits.append(e.retry_after)
+                continue
+            return self._served(i, response)
+        raise self._exhausted(errors, waits)
+
+    async def acreate(self, **params):
+        # create() for asyncio: providers without an async_client run in a thread
+        errors, waits = [], []
+        for i, provider in enumerate(self.providers):
+            if not self._allow(provider, errors, waits):
+                continue
+            try:
+                response = await self._acall(provider, params)
+            except Unavailable as e:
+                errors.append(f"{provider.name}: {e}")
+                waits.append(e.retry_after)
+                continue
+            return self._served(i, response)
+        raise self._exhausted(errors, waits)
+
+    def _allow(self, provider, errors, waits):
+        if provider.breaker.allow():
+            return True
+        errors.append(f"{provider.name}: circuit open")
+        waits.append(provider.breaker.retry_in())
+        return False
+
+    def _served(self, i, response):
+        if i:
+            with self._lock:
+                self.fallbacks += 1
+        return response
+
+    def _exhausted(self, errors, waits):
+        with self._lock:
+            self.exhausted += 1
+        waits = [w for w in waits if w is not None]
+        return GatewayError("LLM providers unavailable: " + "; ".join(errors), min(waits) if waits else None)
+
+    def _call(self, provider, params):
+        if provider.model:
+            params = dict(params, model=provider.model)
+        estimate = estimate_tokens(params)
+        attempt = 0
+        while True:
+            wait = self._reserve(provider, estimate)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = provider.client.chat.completions.create(**params)
+            except Exception as e:
+                time.sleep(self._failed(provider, e, estimate, attempt))
+                attempt += 1
+                continue
+            return self._succeeded(provider, response, estimate)
+
+    async def _acall(self, provider, params):
+        if provider.model:
+            params = dict(params, model=provider.model)
+        estimate = estimate_tokens(params)
+        attempt = 0
+        while True:
+            wait = self._reserve(provider, estimate)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                if provider.async_client:
+                    response = await provider.async_client.chat.completions.create(**params)
+                else:
+                    response = await asyncio.to_thread(provider.client.chat.completions.create, **params)
+            except Exception as e:
+                await asyncio.sleep(self._failed(provider, e, estimate, attempt))
+                attempt += 1
+                continue
+            return self._succeeded(provider, response, estimate)
+
+    def _reserve(self, provider, estimate):
+        # Seconds to wait for the provider's quota; Unavailable if that is too long
+        wait = provider.reserve(estimate)
+        if wait > self.max_wait:
+            provider.release(estimate)
+            raise Unavailable(f"rate limited for {wait:.1f}s", wait)
+        with provider._lock:
+            provider.waited += wait
+            provider.calls += 1
+        return wait
+
+    def _failed(self, provider, error, estimate, attempt):
+        # Seconds to wait before retrying the same provider, or raises
+        with provider._lock:
+            provider.failures += 1
+        if provider.tokens:
+            provider.tokens.refund(estimate)
+        status = status_of(error)
+        if status in FATAL_STATUSES:
+            raise error
+        hint = retry_after(error)
+        if status == 429:
+            provider.block(hint if hint is not None else self._backoff(attempt))
+            # _reserve() waits the block out on the next attempt
+            delay = 0.0
+        else:
+            provider.breaker.record_failure()
+            delay = self._backoff(attempt) if hint is None else hint
+        if not retryable(error) or attempt >= self.max_retries or not provider.breaker.allow():
+            raise Unavailable(f"{type(error).__name__}: {error}",
+                              hint if hint is not None else provider.breaker.retry_in() or None)
+        if delay > self.max_wait:
+            raise Unavailable(f"retry after {delay:.1f}s", delay)
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _succeeded(self, provider, response, estimate):
+        provider.breaker.record_success()
+        usage = getattr(response, "usage", None)
+        if provider.tokens and getattr(usage, "total_tokens", None):
+            provider.tokens.refund(max(0, estimate - usage.total_tokens))
+        return response
+
+    def _backoff(self, attempt):
+        # Full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def stats(self):
+        with self._lock:
+            totals = {"retries": self.retries, "fallbacks": self.fallbacks, "exhausted": self.exhausted}
+        return {**totals, "providers": {p.name: p.stats() for p in self.providers}}
@@ -2,115 +2,510 @@
 
 
 import os
+import sys
+import argparse
 import json
-import sqlite3
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-from flask import Flask, render_template_string, request, jsonify, redirect, url_for
-from groq import Groq
+import base64
+import zlib
+import time
+import threading
+from datetime import datetime, timedelta
+from flask import Flask, Response, g, request, jsonify, redirect, send_file, url_for, stream_with_context
 from dotenv import load_dotenv
+from db import database
+from jobs import JobQueue, QueueFull
+from scrape_cache import ScrapeCache
+from llm_cache import CompletionCache
+from extractor import HeadExtractor
+from batch import BatchRunner, parse_csv, valid_url
+from streaming import FieldStream, sse
+from renderer import Template
+from http_cache import PageCache, StaticBody, parse_accept_encoding
+from assets import AssetBundle
+from search import CampaignSearch
+from keywords import KeywordIndex, normalize_keyword
+from dedup import DuplicateIndex
+from codec import ContentCodec
+from archive import CampaignArchive, gunzip_lines, gzip_stream
+from images import ImageStore
+from llm_gateway import CircuitBreaker, GatewayError, LLMGateway, Provider, SharedTokenBucket
+from router import Router, approx_tokens, max_tokens_for, trim_to_tokens
+from structured import CAMPAIGN_SCHEMA, StructuredOutput, StructuredOutputError
+from aio import LoopThread
+from lazy import Lazy
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, Stages, begin_trace, end_trace,
+                     line_buffered_stdout, trace_id, traced)
 
 load_dotenv()
 
 app = Flask(__name__)
 
 
-GROQ_API_KEY = "grok api as open ai is not open source"  
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "grok api as open ai is not open source")
 # ============================================
 
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+LLM_RPM = int(os.environ.get("LLM_RPM", "30"))
+LLM_TPM = int(os.environ.get("LLM_TPM", "12000"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_MAX_WAIT = float(os.environ.get("LLM_MAX_WAIT", "30"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+# Connections to the LLM API, all kept alive (the SDK default keeps 20 of 100, so a busy
+# pipeline reconnects on most calls)
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "256"))
+# Fallback chain: a smaller Llama on Groq, then any OpenAI-compatible endpoint if configured
+LLM_FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", "llama-3.1-8b-instant")
+LLM_FALLBACK_RPM = int(os.environ.get("LLM_FALLBACK_RPM", "30"))
+LLM_FALLBACK_TPM = int(os.environ.get("LLM_FALLBACK_TPM", "6000"))
+OPENAI_FALLBACK_BASE_URL = os.environ.get("OPENAI_FALLBACK_BASE_URL")
+OPENAI_FALLBACK_API_KEY = os.environ.get("OPENAI_FALLBACK_API_KEY")
+OPENAI_FALLBACK_MODEL = os.environ.get("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
 
-client = Groq(api_key=GROQ_API_KEY)
+def llm_providers():
+    # The SDKs (and the HTTP stack under them) are imported here, when the first
+    # generation needs them, rather than when the app starts
+    import httpx
+    from groq import AsyncGroq, Groq
+    from fetcher import ShardedTransport
+    def breaker():
+        return CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+    def bucket(name, per_minute):
+        # LLM_RPM/LLM_TPM are the account's limits, shared by every server process
+        return SharedTokenBucket(DB_FILE, name, per_minute)
+    # Retries live in the gateway, not the SDK
+    llm_limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+    client = Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=LLM_TIMEOUT, max_retries=0,
+                  http_client=httpx.Client(timeout=LLM_TIMEOUT, limits=llm_limits))
+    async_client = AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=LLM_TIMEOUT, max_retries=0,
+                             http_client=httpx.AsyncClient(timeout=LLM_TIMEOUT,
+                                                           transport=ShardedTransport(LLM_MAX_CONNECTIONS)))
+    providers = [Provider("groq", client, rpm=LLM_RPM, tpm=LLM_TPM, breaker=breaker(), async_client=async_client,
+                          bucket=bucket)]
+    if LLM_FALLBACK_MODEL:
+        providers.append(Provider("groq-fallback", client, model=LLM_FALLBACK_MODEL, rpm=LLM_FALLBACK_RPM,
+                                  tpm=LLM_FALLBACK_TPM, breaker=breaker(), async_client=async_client, bucket=bucket))
+    if OPENAI_FALLBACK_BASE_URL or OPENAI_FALLBACK_API_KEY:
+        from openai import AsyncOpenAI, OpenAI
+        options = dict(api_key=OPENAI_FALLBACK_API_KEY or "none", base_url=OPENAI_FALLBACK_BASE_URL,
+                       timeout=LLM_TIMEOUT, max_retries=0)
+        # Own httpx clients only for the connection limits, as with Groq's above
+        openai_client = OpenAI(**options, http_client=httpx.Client(timeout=LLM_TIMEOUT, limits=llm_limits))
+        openai_async = AsyncOpenAI(**options, http_client=httpx.AsyncClient(
+            timeout=LLM_TIMEOUT, transport=ShardedTransport(LLM_MAX_CONNECTIONS)))
+        providers.append(Provider("openai", openai_client, model=OPENAI_FALLBACK_MODEL, breaker=breaker(),
+                                  async_client=openai_async))
+    return providers
+
+llm = Lazy(lambda: LLMGateway(llm_providers(), max_retries=LLM_MAX_RETRIES, max_wait=LLM_MAX_WAIT))
+
+# Model routing: ROUTER_MODE is auto, fast or quality
+ROUTER_MODE = os.environ.get("ROUTER_MODE", "auto")
+ROUTER_FAST_MODEL = os.environ.get("ROUTER_FAST_MODEL", "llama-3.1-8b-instant")
+ROUTER_QUALITY_MODEL = os.environ.get("ROUTER_QUALITY_MODEL", "llama-3.3-70b-versatile")
+ROUTER_SLO_P95 = float(os.environ.get("ROUTER_SLO_P95", "10"))
+ROUTER_SMALL_CONTEXT_TOKENS = int(os.environ.get("ROUTER_SMALL_CONTEXT_TOKENS", "32"))
+PROMPT_TITLE_TOKENS = int(os.environ.get("PROMPT_TITLE_TOKENS", "48"))
+PROMPT_CONTEXT_TOKENS = int(os.environ.get("PROMPT_CONTEXT_TOKENS", "400"))
+
+router = Router(ROUTER_FAST_MODEL, ROUTER_QUALITY_MODEL, mode=ROUTER_MODE, slo_p95=ROUTER_SLO_P95,
+                small_context_tokens=ROUTER_SMALL_CONTEXT_TOKENS)
+
+# Provider-side JSON: json_object (JSON mode), json_schema or off
+LLM_JSON_MODE = os.environ.get("LLM_JSON_MODE", "json_object")
+LLM_FIELD_FOLLOWUP = int(os.environ.get("LLM_FIELD_FOLLOWUP", "1"))
+
+campaign_output = StructuredOutput(CAMPAIGN_SCHEMA, mode=LLM_JSON_MODE)
 
 DB_FILE = "campaigns.db"
 
+db = database(DB_FILE)
+
+PAGE_CACHE_CONTROL = os.environ.get("PAGE_CACHE_CONTROL", "public, max-age=300, s-maxage=3600, stale-while-revalidate=86400")
+
+page_cache = PageCache(DB_FILE, cache_control=PAGE_CACHE_CONTROL)
+
+HOME_CACHE_CONTROL = os.environ.get("HOME_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+
+assets = AssetBundle()
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "100"))
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "5000"))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "8"))
+
+SCRAPE_CACHE_TTL = int(os.environ.get("SCRAPE_CACHE_TTL", "3600"))
+SCRAPE_CACHE_ENTRIES = int(os.environ.get("SCRAPE_CACHE_ENTRIES", "512"))
+
+scrape_cache = ScrapeCache(DB_FILE, ttl=SCRAPE_CACHE_TTL, max_entries=SCRAPE_CACHE_ENTRIES)
+
+FETCH_POOL_SIZE = int(os.environ.get("FETCH_POOL_SIZE", "20"))
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "10"))
+DNS_CACHE_TTL = int(os.environ.get("DNS_CACHE_TTL", "300"))
+DNS_CACHE_ENTRIES = int(os.environ.get("DNS_CACHE_ENTRIES", "1024"))
+
+def make_fetcher():
+    from fetcher import Fetcher
+    return Fetcher(pool_size=FETCH_POOL_SIZE, max_bytes=FETCH_MAX_BYTES, timeout=FETCH_TIMEOUT, dns_ttl=DNS_CACHE_TTL,
+                   dns_entries=DNS_CACHE_ENTRIES)
+
+fetcher = Lazy(make_fetcher)
+
+# Product images from og:image and friends, downloaded in the background and served from
+# IMAGE_CACHE_DIR as resized WebP/JPEG
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_CONTROL = os.environ.get("IMAGE_CACHE_CONTROL", "public, max-age=31536000, immutable")
+IMAGE_CACHE_MAX_MB = int(os.environ.get("IMAGE_CACHE_MAX_MB", "512"))
+IMAGE_WIDTHS = [int(w) for w in os.environ.get("IMAGE_WIDTHS", "320,640,1024,1600").split(",")]
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGES_PER_CAMPAIGN = int(os.environ.get("IMAGES_PER_CAMPAIGN", "4"))
+
+def make_image_fetcher():
+    # Its own fetcher because the page picks the image URLs: nothing on a private,
+    # loopback or link-local address (cloud metadata included) is fetched for it
+    from fetcher import Fetcher
+    return Fetcher(pool_size=IMAGE_WORKERS, max_bytes=FETCH_MAX_BYTES, timeout=FETCH_TIMEOUT, dns_ttl=DNS_CACHE_TTL,
+                   dns_entries=DNS_CACHE_ENTRIES, public_only=True)
+
+image_fetcher = Lazy(make_image_fetcher)
+
+image_store = ImageStore(DB_FILE, IMAGE_CACHE_DIR, image_fetcher, widths=IMAGE_WIDTHS, quality=IMAGE_QUALITY,
+                         max_bytes=IMAGE_CACHE_MAX_MB * 1024 * 1024, per_campaign=IMAGES_PER_CAMPAIGN,
+                         workers=IMAGE_WORKERS, on_ready=lambda cid: refresh_page_cache(cid),
+                         on_evict=page_cache.invalidate)
+
+# Batches run as asyncio tasks on one event-loop thread per process (httpx for pages,
+# the async Groq client for completions) rather than a thread per in-flight URL
+ASYNC_PIPELINE = int(os.environ.get("ASYNC_PIPELINE", "1"))
+ASYNC_FETCH_POOL_SIZE = int(os.environ.get("ASYNC_FETCH_POOL_SIZE", "100"))
+
+def make_async_fetcher():
+    from fetcher import AsyncFetcher
+    return AsyncFetcher(pool_size=ASYNC_FETCH_POOL_SIZE, max_bytes=FETCH_MAX_BYTES, timeout=FETCH_TIMEOUT,
+                        dns_ttl=DNS_CACHE_TTL, dns_entries=DNS_CACHE_ENTRIES)
+
+pipeline = LoopThread("pipeline")
+async_fetcher = Lazy(make_async_fetcher) if ASYNC_PIPELINE else None
+
+COMPLETION_CACHE_ENTRIES = int(os.environ.get("COMPLETION_CACHE_ENTRIES", "1000"))
+
+completion_cache = CompletionCache(DB_FILE, max_entries=COMPLETION_CACHE_ENTRIES)
+
+# generated_content codec: zlib, zstd (needs zstandard) or none. Rows keep the codec
+# they were written with until `python main.py compact` moves them to the current one.
+CONTENT_CODEC = os.environ.get("CONTENT_CODEC", "zlib")
+CONTENT_DICTIONARY_SIZE = int(os.environ.get("CONTENT_DICTIONARY_SIZE", "0")) or None  # bytes; per-codec default
+
+content_codec = ContentCodec(DB_FILE, codec=CONTENT_CODEC, dictionary_size=CONTENT_DICTIONARY_SIZE)
+
+# What `compact` purges: completions unused this long, cached pages and finished jobs this old
+COMPLETION_CACHE_MAX_AGE = int(os.environ.get("COMPLETION_CACHE_MAX_AGE", str(30 * 86400)))
+PAGE_CACHE_MAX_AGE_DAYS = int(os.environ.get("PAGE_CACHE_MAX_AGE_DAYS", "30"))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+
+campaign_search = CampaignSearch(DB_FILE, decode=content_codec.decode)
+
+keyword_index = KeywordIndex(DB_FILE, decode=content_codec.decode)
+
+DEDUP_ENABLED = int(os.environ.get("DEDUP_ENABLED", "1"))
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.9"))
+
+dedup_index = DuplicateIndex(DB_FILE, threshold=DEDUP_THRESHOLD)
+
+# What stats() reports for a Lazy client that hasn't been built: a metrics scrape or
+# /stats request mustn't be what imports the SDK or HTTP stack and creates the client
+IDLE_LLM_STATS = {"retries": 0, "fallbacks": 0, "exhausted": 0, "providers": {}}
+IDLE_FETCH_STATS = {"fetches": 0, "failures": 0, "skipped": 0, "truncated": 0,
+                    "dns": {"entries": 0, "hits": 0, "misses": 0}, "p50": None, "p95": None, "recent": []}
+
+def llm_stats():
+    return llm.stats() if llm.created else IDLE_LLM_STATS
+
+def fetch_stats(client):
+    return client.stats() if client.created else IDLE_FETCH_STATS
+
+metrics = Registry()
+request_seconds = metrics.histogram("http_request_duration_seconds", "Request latency by route",
+                                    ["method", "route", "status"])
+stage = Stages(metrics.histogram("campaign_stage_duration_seconds", "Time per generation pipeline stage",
+                                 ["stage", "status"]))
+scrape_failures = metrics.counter("scrape_failures_total", "Pages that could not be fetched or parsed")
+llm_failures = metrics.counter("llm_failures_total", "Generations that failed at the LLM", ["reason"])
+metrics.collect("llm_tokens_total", "LLM tokens by route",
+                lambda: {(name, kind): r[f"{kind}Tokens"] for name, r in router.stats()["routes"].items()
+                         for kind in ("prompt", "completion")}, "counter", ["route", "type"])
+metrics.collect("llm_calls_total", "LLM calls by route",
+                lambda: {name: r["calls"] for name, r in router.stats()["routes"].items()}, "counter", ["route"])
+metrics.collect("llm_provider_calls_total", "LLM provider calls by outcome",
+                lambda: {(name, outcome): p[key] for name, p in llm_stats()["providers"].items()
+                         for outcome, key in (("attempt", "calls"), ("failure", "failures"),
+                                              ("rate_limited", "rateLimited"))},
+                "counter", ["provider", "outcome"])
+metrics.collect("llm_circuit_open", "1 while a provider's circuit breaker is open",
+                lambda: {name: int(p["breaker"] == "open") for name, p in llm_stats()["providers"].items()},
+                labels=["provider"])
+metrics.collect("llm_gateway_events_total", "Gateway retries, fallbacks and exhausted chains",
+                lambda: {k: v for k, v in llm_stats().items() if k != "providers"}, "counter", ["event"])
+metrics.collect("llm_cache_requests_total", "Completion cache lookups",
+                lambda: {k: completion_cache.stats()[k] for k in ("hits", "coalesced", "misses")},
+                "counter", ["result"])
+metrics.collect("llm_structured_responses_total", "Parsed completions by outcome",
+                lambda: {k: campaign_output.stats()[k] for k in ("clean", "repaired", "unparseable", "followups")},
+                "counter", ["result"])
+metrics.collect("scrape_cache_requests_total", "Scrape cache lookups",
+                lambda: {k: scrape_cache.stats()[k] for k in ("hits", "dbHits", "misses")}, "counter", ["result"])
+metrics.collect("page_cache_requests_total", "Rendered page cache lookups",
+                lambda: {k: page_cache.stats()[k] for k in ("hits", "notModified", "builds")}, "counter", ["result"])
+metrics.collect("dedup_lookups_total", "Duplicate lookups before generation",
+                lambda: {k: dedup_index.stats()[k] for k in ("urlHits", "contentHits", "misses", "skipped")},
+                "counter", ["result"])
+metrics.collect("fetch_requests_total", "Page fetches by outcome",
+                lambda: {k: fetch_stats(fetcher)[k] for k in ("fetches", "failures", "skipped", "truncated")},
+                "counter", ["result"])
+
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS campaigns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            original_url TEXT,
-            product_name TEXT,
-            product_description TEXT,
-            generated_content TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS campaigns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_url TEXT,
+                product_name TEXT,
+                product_description TEXT,
+                generated_content TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_campaigns_created ON campaigns (created_at DESC, id DESC)")
+    db.migrate(MIGRATIONS)
+    content_codec.init_db()
+    image_store.init_db()
+    job_queue.init_db()
+    scrape_cache.init_db()
+    completion_cache.init_db()
+    batch_runner.init_db()
+    page_cache.init_db(version=assets.version)
+    campaign_search.init_db()
+    keyword_index.init_db()
+    dedup_index.init_db()
+
+def add_content_codec(conn):
+    # NULL: generated_content is plain JSON text, as every row was before
+    conn.execute("ALTER TABLE campaigns ADD COLUMN content_codec TEXT")
+
+# Changes to the campaigns table, as (user_version, fn(conn)), applied once per database
+# in order; tables the other modules own are created by their init_db()
+MIGRATIONS = [(1, add_content_codec)]
+
+_startup_lock = threading.Lock()
+_started = False
+
+def startup():
+    # Schema setup and migrations, once per process; init_db() is idempotent, so several
+    # workers starting together are fine
+    global _started
+    with _startup_lock:
+        if not _started:
+            # Request logs are JSON lines; keep other threads' prints from splitting them
+            line_buffered_stdout()
+            init_db()
+            _started = True
+
+def create_app():
+    # WSGI entry point, e.g. gunicorn 'main:create_app()'. The database is ready before
+    # the first request; the LLM SDKs and HTTP clients are built when first used.
+    startup()
+    return app
 
 def scrape_url(url):
-    try:
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        title = (soup.find("meta", property="og:title") or soup.find("meta", {"name": "og:title"}))
-        title = title.get("content", "") if title else soup.find("title").text if soup.find("title") else "Product"
-        
-        desc = (soup.find("meta", property="og:description") or soup.find("meta", {"name": "description"}))
-        desc = desc.get("content", "") if desc else ""
-        
-        text = soup.get_text()[:500].strip() if soup.get_text() else ""
-        
-        return {"title": title, "description": desc, "text": text}
-    except:
-        return {"title": "Product", "description": "", "text": ""}
+    with stage("scrape"):
+        cached = scrape_cache.get(url)
+        if cached is not None:
+            return cached
+        try:
+            scraped = fetch_page(url)
+        except:
+            scrape_failures.inc()
+            return {"title": "Product", "description": "", "text": ""}
+        scrape_cache.put(url, scraped, scraped["status"])
+        return scraped
 
-def generate_campaign(url):
-    try:
-        scraped = scrape_url(url)
-        
-        prompt = f"""You are an expert digital marketer creating a D2C landing page.
+def fetch_page(url):
+    extractor = HeadExtractor()
+    fetched = fetcher.fetch(url, on_chunk=extractor.feed_bytes)
+    extractor.finish()
+    return dict(extractor.result(base_url=fetched["url"]), status=fetched["status"])
+
+async def async_scrape_url(url):
+    with stage("scrape"):
+        cached = scrape_cache.get(url)
+        if cached is not None:
+            return cached
+        try:
+            scraped = await async_fetch_page(url)
+        except:
+            scrape_failures.inc()
+            return {"title": "Product", "description": "", "text": ""}
+        scrape_cache.put(url, scraped, scraped["status"])
+        return scraped
+
+async def async_fetch_page(url):
+    extractor = HeadExtractor()
+    fetched = await async_fetcher.fetch(url, on_chunk=extractor.feed_bytes)
+    extractor.finish()
+    return dict(extractor.result(base_url=fetched["url"]), status=fetched["status"])
+
+def completion_params(url, scraped):
+    # Returns (params, route, reason): the scraped context is trimmed to the prompt
+    # budget and its size picks the route along with the routes' recent latency
+    title = trim_to_tokens(scraped["title"], PROMPT_TITLE_TOKENS)
+    description = trim_to_tokens(scraped["description"], PROMPT_CONTEXT_TOKENS - approx_tokens(title))
+    route, reason = router.choose(approx_tokens(title) + approx_tokens(description))
+    prompt = f"""You are an expert digital marketer creating a D2C landing page.
 URL: {url}
-Title: {scraped['title']}
-Description: {scraped['description']}
+Title: {title}
+Description: {description}
 
 Generate compelling D2C ad content in JSON format. Make sure all text is properly escaped for JSON.
-{{
-    "productName": "product name",
-    "productDescription": "2-3 sentences",
-    "adCopy": "3 compelling paragraphs about the product",
-    "keywords": ["keyword1", "keyword2", "keyword3", "keyword4", "keyword5"],
-    "celebrityEndorsement": "A celebrity quote endorsement",
-    "features": ["feature1", "feature2", "feature3", "feature4"]
-}}
+{campaign_output.example()}
 
 IMPORTANT: Return ONLY valid JSON with no newlines in strings, no control characters, and proper escaping."""
-        
-        # Using Groq with Llama model
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Fast and capable Llama model
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=2048,
+    
+    params = {
+        "model": route.model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7,
+        "max_tokens": max_tokens_for(campaign_output.token_budgets()),
+    }
+    response_format = campaign_output.response_format()
+    if response_format:
+        params["response_format"] = response_format
+    return params, route, reason
+
+def json_completion(call):
+    # call()'s text, or, when JSON mode rejected it, the text the model wrote, for
+    # parse_completion() to repair
+    try:
+        return call()
+    except Exception as e:
+        content = campaign_output.rejected_output(e)
+        if content is None:
+            raise
+        print("JSON mode rejected the completion; repairing it")
+        return content
+
+async def async_json_completion(call):
+    try:
+        return await call()
+    except Exception as e:
+        content = campaign_output.rejected_output(e)
+        if content is None:
+            raise
+        print("JSON mode rejected the completion; repairing it")
+        return content
+
+def field_followup(params, force=False):
+    # Re-requests only the fields that failed validation, on the model that wrote the rest
+    if not LLM_FIELD_FOLLOWUP:
+        return None
+    def followup(valid, failed):
+        followup_params = campaign_output.followup_params(params, valid, failed)
+        print(f"Re-requesting fields: {', '.join(failed)}")
+        return completion_cache.complete(
+            followup_params,
+            lambda: json_completion(lambda: llm.create(**followup_params).choices[0].message.content), force=force
         )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```"):
-            content = content.split("```")[1].replace("json", "").strip()
-        
-        # Clean up control characters that might break JSON parsing
-        import re
-        # Remove control characters except newline, tab, and carriage return
-        content = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f]', '', content)
-        
-        data = json.loads(content)
-        return {
-            "originalUrl": url,
-            "productName": data.get("productName", "Product"),
-            "productDescription": data.get("productDescription", ""),
-            "generatedContent": {
-                "adCopy": data.get("adCopy", ""),
-                "keywords": data.get("keywords", []),
-                "celebrityEndorsement": data.get("celebrityEndorsement", ""),
-                "features": data.get("features", [])
-            }
+    return followup
+
+def async_field_followup(params, force=False):
+    if not LLM_FIELD_FOLLOWUP:
+        return None
+    async def followup(valid, failed):
+        followup_params = campaign_output.followup_params(params, valid, failed)
+        print(f"Re-requesting fields: {', '.join(failed)}")
+        async def call():
+            return (await llm.acreate(**followup_params)).choices[0].message.content
+        return await completion_cache.acomplete(followup_params, lambda: async_json_completion(call), force=force)
+    return followup
+
+def parse_completion(url, content, followup=None):
+    with stage("parse"):
+        data = campaign_output.complete(content, followup)
+    return campaign_from(url, data)
+
+async def async_parse_completion(url, content, followup=None):
+    with stage("parse"):
+        data = await campaign_output.acomplete(content, followup)
+    return campaign_from(url, data)
+
+def campaign_from(url, data):
+    return {
+        "originalUrl": url,
+        "productName": data["productName"],
+        "productDescription": data["productDescription"],
+        "generatedContent": {
+            "adCopy": data["adCopy"],
+            "keywords": data["keywords"],
+            "celebrityEndorsement": data["celebrityEndorsement"],
+            "features": data["features"]
         }
-    except json.JSONDecodeError as e:
+    }
+
+def with_images(campaign_data, scraped):
+    # The page's image URLs, queued by image_store.index() when the campaign is saved.
+    # Pages scraped before images were extracted have none; index() then keeps what it had.
+    campaign_data["sourceImages"] = scraped.get("images")
+    return campaign_data
+
+def existing_campaign(cid, match, similarity=1.0):
+    campaign_data = get_campaign(cid)
+    if campaign_data:
+        campaign_data["duplicateOf"] = {"id": cid, "match": match, "similarity": similarity}
+    return campaign_data
+
+def find_duplicate(url, scraped=None, force=False):
+    # A stored campaign for the same canonical URL, or (given the scrape) for a page
+    # whose SimHash is within DEDUP_THRESHOLD; the fingerprint is kept for the new campaign
+    lookup = DEDUP_ENABLED and not force
+    if scraped is None:
+        cid = dedup_index.find_url(url) if lookup else None
+        return existing_campaign(cid, "url") if cid else None
+    fingerprint = dedup_index.fingerprint(scraped)
+    match = dedup_index.find_similar(fingerprint) if lookup else None
+    if match:
+        return existing_campaign(match[0], "content", match[1])
+    dedup_index.remember(url, fingerprint)
+    return None
+
+def generate_campaign(url, force=False):
+    content = ""
+    try:
+        existing = find_duplicate(url, force=force)
+        if existing:
+            return existing
+        scraped = scrape_url(url)
+        existing = find_duplicate(url, scraped, force)
+        if existing:
+            return existing
+        params, route, reason = completion_params(url, scraped)
+        with stage("llm"):
+            content = completion_cache.complete(
+                params, lambda: json_completion(lambda: router.complete(route, reason, params, llm.create)),
+                force=force
+            )
+        return with_images(parse_completion(url, content, field_followup(params, force)), scraped)
+    except GatewayError:
+        # Let the job/batch record why (and when to retry) instead of a bare failure
+        llm_failures.inc(reason="gateway")
+        raise
+    except StructuredOutputError as e:
+        llm_failures.inc(reason="parse")
+        completion_cache.discard(params)
         print(f"JSON Parse Error: {e}")
         print(f"Content received: {content[:500]}")
         return None
@@ -118,54 +513,314 @@ IMPORTANT: Return ONLY valid JSON with no newlines in strings, no control charac
         print(f"Error: {e}")
         return None
 
+async def async_generate_campaign(url, force=False):
+    # generate_campaign() as a coroutine for the pipeline loop: the page fetch and the
+    # LLM calls are awaited; the cache and duplicate lookups are local SQLite reads
+    content = ""
+    try:
+        existing = find_duplicate(url, force=force)
+        if existing:
+            return existing
+        scraped = await async_scrape_url(url)
+        existing = find_duplicate(url, scraped, force)
+        if existing:
+            return existing
+        params, route, reason = completion_params(url, scraped)
+        with stage("llm"):
+            content = await completion_cache.acomplete(
+                params, lambda: async_json_completion(lambda: router.acomplete(route, reason, params, llm.acreate)),
+                force=force
+            )
+        return with_images(await async_parse_completion(url, content, async_field_followup(params, force)), scraped)
+    except GatewayError:
+        llm_failures.inc(reason="gateway")
+        raise
+    except StructuredOutputError as e:
+        llm_failures.inc(reason="parse")
+        completion_cache.discard(params)
+        print(f"JSON Parse Error: {e}")
+        print(f"Content received: {content[:500]}")
+        return None
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+INSERT_CAMPAIGN = """
+    INSERT INTO campaigns (original_url, product_name, product_description, generated_content, content_codec)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+def campaign_row(campaign):
+    return (campaign["originalUrl"], campaign["productName"], campaign["productDescription"],
+            *content_codec.encode(json.dumps(campaign["generatedContent"])))
+
+def stream_generate_campaign(url, force=False):
+    # generate_campaign() for a job someone is watching over SSE: streams the completion
+    # and reports progress through job_queue.progress(), the stage and then each JSON
+    # field as soon as it is complete
+    content = ""
+    try:
+        existing = find_duplicate(url, force=force)
+        if existing:
+            return existing
+        job_queue.progress("status", {"stage": "scraping"})
+        scraped = scrape_url(url)
+        existing = find_duplicate(url, scraped, force)
+        if existing:
+            return existing
+        params, route, reason = completion_params(url, scraped)
+        fields = FieldStream()
+        content = None if force else completion_cache.get(params)
+        if content is None:
+            job_queue.progress("status", {"stage": "generating"})
+            start = time.perf_counter()
+            parts = []
+            # Groq's JSON mode does not stream; parse_completion() repairs the text instead
+            stream_params = {k: v for k, v in params.items() if k != "response_format"}
+            with stage("llm"):
+                for chunk in llm.create(**stream_params, stream=True):
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    for kind, key, value in fields.feed(delta):
+                        job_queue.progress(kind, {"name": key, "value": value})
+            content = "".join(parts)
+            router.record(route, reason, params, time.perf_counter() - start, content=content)
+            completion_cache.put(params, content, time.perf_counter() - start)
+        else:
+            for kind, key, value in fields.feed(content):
+                if kind == "field":
+                    job_queue.progress(kind, {"name": key, "value": value})
+        return with_images(parse_completion(url, content, field_followup(params, force)), scraped)
+    except GatewayError as e:
+        llm_failures.inc(reason="gateway")
+        job_queue.progress("error", {"message": "The AI service is busy, please try again shortly",
+                                     "retryAfter": e.retry_after})
+        raise
+    except StructuredOutputError as e:
+        llm_failures.inc(reason="parse")
+        completion_cache.discard(params)
+        print(f"JSON Parse Error: {e}")
+        print(f"Content received: {(content or '')[:500]}")
+        return None
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+def relay_job(job_id, status_url, held):
+    # SSE for a generate job: its id first (a client that loses the stream polls it
+    # instead), then the job's progress and outcome. held is the stream slot, or None
+    # when every slot is taken: the client is told to poll.
+    try:
+        yield sse("job", {"id": job_id, "statusUrl": status_url})
+        if held is None:
+            yield sse("poll", {"id": job_id, "statusUrl": status_url})
+            return
+        failed = False
+        for event, data in job_queue.events(job_id):
+            if event == "ping":
+                yield ": ping\n\n"
+            elif event == "error":
+                failed = True
+                yield sse("error", data)
+            elif event != "job":
+                yield sse(event, data)
+            elif data and data["status"] == "done":
+                yield sse("done", data["result"])
+            elif not failed:
+                yield sse("error", {"message": (data or {}).get("error") or "Failed to generate campaign"})
+    finally:
+        if held is not None:
+            held.release()
+
 def save_campaign(campaign):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO campaigns (original_url, product_name, product_description, generated_content)
-            VALUES (?, ?, ?, ?)
-        """, (campaign["originalUrl"], campaign["productName"], campaign["productDescription"], 
-              json.dumps(campaign["generatedContent"])))
-        conn.commit()
-        cid = c.lastrowid
-        conn.close()
+        with stage("save"), db.transaction() as conn:
+            cid = conn.execute(INSERT_CAMPAIGN, campaign_row(campaign)).lastrowid
+            index_campaigns(conn, [(cid, campaign)])
         return cid
     except Exception as e:
         print(f"DB Error: {e}")
         return None
 
+def update_campaign(cid, campaign):
+    with stage("save"), db.transaction() as conn:
+        conn.execute("""
+            UPDATE campaigns SET original_url = ?, product_name = ?, product_description = ?, generated_content = ?,
+                content_codec = ?
+            WHERE id = ?
+        """, (*campaign_row(campaign), cid))
+        index_campaigns(conn, [(cid, campaign)])
+    page_cache.invalidate(cid)
+
+IMPORT_CAMPAIGN = """
+    INSERT INTO campaigns (original_url, product_name, product_description, generated_content, content_codec,
+                           created_at)
+    VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
+
+def insert_campaigns(conn, campaigns, keep_created=False):
+    # Bulk insert inside the caller's write transaction. AUTOINCREMENT ids are handed
+    # out sequentially while the write lock is held, so the new ids are contiguous.
+    if not campaigns:
+        return []
+    if keep_created:
+        conn.executemany(IMPORT_CAMPAIGN, [(*campaign_row(c), c.get("createdAt")) for c in campaigns])
+    else:
+        conn.executemany(INSERT_CAMPAIGN, [campaign_row(c) for c in campaigns])
+    last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'campaigns'").fetchone()[0]
+    ids = list(range(last - len(campaigns) + 1, last + 1))
+    index_campaigns(conn, list(zip(ids, campaigns)))
+    return ids
+
+def index_campaigns(conn, items):
+    # Derived tables, written in the same transaction as the campaign rows
+    campaign_search.index(conn, items)
+    keyword_index.index(conn, items)
+    dedup_index.index(conn, items)
+    image_store.index(conn, items)
+
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+BATCH_COMMIT_EVERY = int(os.environ.get("BATCH_COMMIT_EVERY", "25"))
+BATCH_MAX_URLS = int(os.environ.get("BATCH_MAX_URLS", "1000"))
+# Threads cap out in the tens; tasks on the pipeline loop don't
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "256" if ASYNC_PIPELINE else "32"))
+
+batch_runner = BatchRunner(DB_FILE, generate_campaign, insert_campaigns,
+                           concurrency=BATCH_CONCURRENCY, commit_every=BATCH_COMMIT_EVERY,
+                           agenerate=async_generate_campaign if ASYNC_PIPELINE else None, loop=pipeline)
+
+# NDJSON export/import: rows read per export chunk, campaigns per import transaction
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+
+campaign_archive = CampaignArchive(DB_FILE, CAMPAIGN_SCHEMA, content_codec.decode,
+                                   lambda conn, campaigns: insert_campaigns(conn, campaigns, keep_created=True),
+                                   dedup_index.known, chunk_size=EXPORT_CHUNK_SIZE, batch_size=IMPORT_BATCH_SIZE)
+
+def run_job(kind, payload):
+    # The job's log line carries the trace id of the request that queued it
+    with traced("job", payload.get("traceId"), job=kind):
+        return execute_job(kind, payload)
+
+def execute_job(kind, payload):
+    if kind == "batch":
+        return batch_runner.run(payload["batchId"], concurrency=payload.get("concurrency"),
+                                force=payload.get("force", False))
+    if kind == "regenerate":
+        cid = payload["campaignId"]
+        existing = get_campaign(cid)
+        if not existing:
+            raise RuntimeError("Campaign not found")
+        campaign_data = generate_campaign(existing["originalUrl"], force=True)
+        if not campaign_data:
+            raise RuntimeError("Failed to generate campaign")
+        update_campaign(cid, campaign_data)
+        warm_page_cache(cid)
+        campaign_data["id"] = cid
+        campaign_data["createdAt"] = existing["createdAt"]
+        return campaign_data
+    if kind != "generate":
+        raise ValueError(f"Unknown job kind: {kind}")
+    generate = stream_generate_campaign if payload.get("stream") else generate_campaign
+    campaign_data = generate(payload["url"], force=payload.get("force", False))
+    if not campaign_data:
+        raise RuntimeError("Failed to generate campaign")
+    if campaign_data.get("duplicateOf"):
+        return campaign_data
+    cid = save_campaign(campaign_data)
+    if not cid:
+        raise RuntimeError("Failed to save")
+    warm_page_cache(cid)
+    campaign_data["id"] = cid
+    campaign_data["createdAt"] = datetime.now().isoformat()
+    return campaign_data
+
+job_queue = JobQueue(DB_FILE, run_job, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+
+# SSE streams each hold a request thread for a whole generation; past this many per
+# process the client polls the job instead
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", str(max(1, SERVER_THREADS // 2))))
+
+stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+SELECT_CAMPAIGN = """
+    SELECT id, original_url, product_name, product_description, generated_content, created_at, content_codec
+    FROM campaigns WHERE id = ?
+"""
+
 def get_campaign(cid):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT * FROM campaigns WHERE id = ?", (cid,))
-        row = c.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            row = conn.execute(SELECT_CAMPAIGN, (cid,)).fetchone()
         if not row:
             return None
         return {
             "id": row[0], "originalUrl": row[1], "productName": row[2],
-            "productDescription": row[3], "generatedContent": json.loads(row[4]),
-            "createdAt": row[5]
+            "productDescription": row[3], "generatedContent": content_codec.loads(row[4], row[6]),
+            "createdAt": row[5], "images": image_store.for_campaign(row[0])
         }
     except:
         return None
 
-def get_campaigns():
+CAMPAIGN_COLUMNS = {
+    "id": "id", "originalUrl": "original_url", "productName": "product_name",
+    "productDescription": "product_description", "generatedContent": "generated_content",
+    "createdAt": "created_at"
+}
+SUMMARY_FIELDS = ["id", "originalUrl", "productName", "productDescription", "createdAt"]
+
+def encode_cursor(created_at, cid):
+    return base64.urlsafe_b64encode(json.dumps([created_at, cid]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT * FROM campaigns ORDER BY created_at DESC")
-        rows = c.fetchall()
-        conn.close()
-        return [{
-            "id": row[0], "originalUrl": row[1], "productName": row[2],
-            "productDescription": row[3], "generatedContent": json.loads(row[4]),
-            "createdAt": row[5]
-        } for row in rows]
-    except:
-        return []
+        created_at, cid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), int(cid)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def get_campaigns(limit=50, cursor=None, fields=None, keyword=None):
+    # Keyset pagination on (created_at, id), served from idx_campaigns_created, or from
+    # idx_campaign_keywords_keyword when filtering by keyword.
+    # generated_content is only read and decoded when asked for.
+    fields = fields or SUMMARY_FIELDS
+    unknown = [f for f in fields if f not in CAMPAIGN_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    selected = ["id", "created_at"] + [CAMPAIGN_COLUMNS[f] for f in fields]
+    if "generatedContent" in fields:
+        selected.append("content_codec")
+    columns = ", ".join(f"c.{column}" for column in selected)
+    where, args = [], []
+    if keyword:
+        sql = f"SELECT {columns} FROM campaign_keywords k JOIN campaigns c ON c.id = k.campaign_id"
+        where.append("k.keyword_id = (SELECT id FROM keywords WHERE term = ?)")
+        args.append(normalize_keyword(keyword))
+        created_at, cid = "k.created_at", "k.campaign_id"
+    else:
+        sql = f"SELECT {columns} FROM campaigns c"
+        created_at, cid = "c.created_at", "c.id"
+    if cursor:
+        where.append(f"({created_at}, {cid}) < (?, ?)")
+        args += list(decode_cursor(cursor))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {created_at} DESC, {cid} DESC LIMIT ?"
+    args.append(limit + 1)
+    
+    with db.connection() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    
+    items = []
+    for row in rows[:limit]:
+        item = dict(zip(fields, row[2:]))
+        if "generatedContent" in item:
+            item["generatedContent"] = content_codec.loads(item["generatedContent"], row[-1])
+        items.append(item)
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return items, next_cursor
 
 HOME_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
@@ -174,202 +829,7 @@ HOME_TEMPLATE = """<!DOCTYPE html>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Ad Campaign Generator</title>
     <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&family=Playfair+Display:wght@400;600;700&display=swap" rel="stylesheet">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { 
-            font-family: 'Outfit', sans-serif; 
-            background: #f7f6f3;
-            color: #1a1a1a;
-            line-height: 1.6;
-        }
-        .container { max-width: 1280px; margin: 0 auto; padding: 0 20px; }
-        
-        /* Hero Section */
-        .hero {
-            padding: 100px 20px;
-            text-align: center;
-            background: linear-gradient(135deg, #f7f6f3 0%, #eeebe5 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        
-        .hero h1 {
-            font-family: 'Playfair Display', serif;
-            font-size: 72px;
-            font-weight: 700;
-            margin-bottom: 20px;
-            color: #1a1a1a;
-            letter-spacing: -2px;
-        }
-        
-        .hero .subtitle {
-            font-size: 20px;
-            color: #666;
-            margin-bottom: 40px;
-            max-width: 600px;
-            margin-left: auto;
-            margin-right: auto;
-        }
-        
-        .form-group {
-            display: flex;
-            gap: 12px;
-            justify-content: center;
-            margin-bottom: 40px;
-            flex-wrap: wrap;
-        }
-        
-        .form-group input {
-            flex: 1;
-            min-width: 300px;
-            padding: 18px 24px;
-            font-size: 16px;
-            border: 1px solid #ddd;
-            border-radius: 8px;
-            background: white;
-            font-family: 'Outfit', sans-serif;
-            transition: all 0.3s;
-        }
-        
-        .form-group input:focus {
-            outline: none;
-            border-color: #1a1a1a;
-            box-shadow: 0 0 0 3px rgba(26,26,26,0.1);
-        }
-        
-        .form-group button {
-            padding: 18px 40px;
-            background: #1a1a1a;
-            color: white;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            font-family: 'Outfit', sans-serif;
-            transition: all 0.3s;
-            white-space: nowrap;
-        }
-        
-        .form-group button:hover {
-            background: #333;
-            transform: translateY(-2px);
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        }
-        
-        .form-group button:disabled {
-            background: #ccc;
-            cursor: not-allowed;
-            transform: none;
-        }
-        
-        /* Recent Campaigns Section */
-        .campaigns-section {
-            padding: 80px 20px;
-            background: white;
-        }
-        
-        .section-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 50px;
-        }
-        
-        .section-header h2 {
-            font-family: 'Playfair Display', serif;
-            font-size: 48px;
-            font-weight: 700;
-            color: #1a1a1a;
-        }
-        
-        .campaigns-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
-            gap: 30px;
-        }
-        
-        .campaign-card {
-            background: #f7f6f3;
-            border-radius: 12px;
-            padding: 30px;
-            cursor: pointer;
-            transition: all 0.3s;
-            text-decoration: none;
-            color: inherit;
-        }
-        
-        .campaign-card:hover {
-            transform: translateY(-10px);
-            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            background: #eeebe5;
-        }
-        
-        .campaign-card h3 {
-            font-family: 'Playfair Display', serif;
-            font-size: 24px;
-            font-weight: 700;
-            margin-bottom: 12px;
-            color: #1a1a1a;
-        }
-        
-        .campaign-card p {
-            color: #666;
-            font-size: 14px;
-            margin-bottom: 15px;
-            line-height: 1.5;
-        }
-        
-        .campaign-card .meta {
-            display: flex;
-            justify-content: space-between;
-            font-size: 12px;
-            color: #999;
-        }
-        
-        .empty-state {
-            grid-column: 1 / -1;
-            padding: 60px 20px;
-            text-align: center;
-            background: #f7f6f3;
-            border-radius: 12px;
-            border: 2px dashed #ddd;
-        }
-        
-        .empty-state p {
-            font-size: 18px;
-            color: #999;
-        }
-        
-        .message {
-            padding: 15px 20px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-            font-size: 14px;
-        }
-        
-        .message.success {
-            background: #e8f5e9;
-            color: #2e7d32;
-            border-left: 4px solid #2e7d32;
-        }
-        
-        .message.error {
-            background: #ffebee;
-            color: #c62828;
-            border-left: 4px solid #c62828;
-        }
-        
-        .loading {
-            display: none;
-            text-align: center;
-            padding: 30px;
-            color: #1a1a1a;
-            font-weight: 600;
-        }
-    </style>
+    <link rel="stylesheet" href="{{ assets.home_css }}">
 </head>
 <body>
     <div class="hero">
@@ -379,6 +839,12 @@ HOME_TEMPLATE = """<!DOCTYPE html>
             
             <div id="message"></div>
             <div class="loading" id="loading">⏳ Generating your campaign...</div>
+            <div class="preview" id="preview">
+                <h3 data-field="productName"></h3>
+                <p data-field="productDescription"></p>
+                <div class="copy" data-field="adCopy"></div>
+                <ul data-field="features"></ul>
+            </div>
             
             <form id="form" class="form-group">
                 <input 
@@ -406,66 +872,7 @@ HOME_TEMPLATE = """<!DOCTYPE html>
         </div>
     </div>
 
-    <script>
-        document.getElementById('form').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            const url = document.getElementById('url').value;
-            const msg = document.getElementById('message');
-            const loading = document.getElementById('loading');
-            
-            msg.innerHTML = '';
-            loading.style.display = 'block';
-            
-            try {
-                const res = await fetch('/api/campaigns/generate', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({url})
-                });
-                const data = await res.json();
-                loading.style.display = 'none';
-                
-                if (!res.ok) {
-                    msg.innerHTML = `<div class="message error">❌ ${data.message || 'Failed to generate'}</div>`;
-                    return;
-                }
-                
-                msg.innerHTML = '<div class="message success">✓ Campaign generated! Redirecting...</div>';
-                setTimeout(() => window.location.href = `/campaign/${data.id}`, 1500);
-            } catch (err) {
-                loading.style.display = 'none';
-                msg.innerHTML = `<div class="message error">Error: ${err.message}</div>`;
-            }
-        });
-        
-        async function loadCampaigns() {
-            try {
-                const res = await fetch('/api/campaigns');
-                const campaigns = await res.json();
-                const grid = document.getElementById('campaigns');
-                
-                if (campaigns.length === 0) {
-                    grid.innerHTML = '<div class="empty-state"><p>No campaigns yet. Create your first one!</p></div>';
-                    return;
-                }
-                
-                grid.innerHTML = campaigns.slice(0, 6).map(c => `
-                    <a href="/campaign/${c.id}" class="campaign-card">
-                        <h3>${c.productName}</h3>
-                        <p>${c.productDescription.substring(0, 100)}...</p>
-                        <div class="meta">
-                            <span>${new Date(c.createdAt).toLocaleDateString()}</span>
-                            <span>View →</span>
-                        </div>
-                    </a>
-                `).join('');
-            } catch (err) {
-                console.error('Failed to load campaigns:', err);
-            }
-        }
-        
-        loadCampaigns();
-    </script>
+    <script src="{{ assets.home_js }}" defer></script>
 </body>
 </html>"""
 
@@ -476,268 +883,7 @@ CAMPAIGN_TEMPLATE = """<!DOCTYPE html>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{{ campaign.productName }} - Ad Campaign</title>
     <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&family=Playfair+Display:wght@400;600;700&display=swap" rel="stylesheet">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: 'Outfit', sans-serif; background: white; color: #1a1a1a; }
-        
-        /* Navigation */
-        nav {
-            position: fixed;
-            top: 0;
-            left: 0;
-            right: 0;
-            z-index: 1000;
-            background: rgba(255,255,255,0.8);
-            backdrop-filter: blur(10px);
-            border-bottom: 1px solid #f0f0f0;
-            padding: 0 20px;
-        }
-        
-        nav .container {
-            max-width: 1280px;
-            margin: 0 auto;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            height: 80px;
-        }
-        
-        nav a { text-decoration: none; color: inherit; }
-        nav button {
-            background: none;
-            border: none;
-            cursor: pointer;
-            font-size: 16px;
-            font-family: 'Outfit', sans-serif;
-            padding: 8px 16px;
-            color: #1a1a1a;
-            border-radius: 6px;
-            transition: all 0.3s;
-        }
-        
-        nav button:hover { background: #f0f0f0; }
-        
-        /* Hero Section */
-        .hero {
-            margin-top: 80px;
-            height: 600px;
-            background: linear-gradient(135deg, #1a1a1a 0%, #333 100%);
-            color: white;
-            display: flex;
-            align-items: center;
-            overflow: hidden;
-            position: relative;
-        }
-        
-        .hero::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: url('https://placehold.co/1920x600/1a1a1a/fff?text=Product') center/cover;
-            opacity: 0.3;
-        }
-        
-        .hero .container {
-            position: relative;
-            z-index: 10;
-            max-width: 1280px;
-            width: 100%;
-            margin: 0 auto;
-            padding: 0 20px;
-        }
-        
-        .hero h1 {
-            font-family: 'Playfair Display', serif;
-            font-size: 64px;
-            font-weight: 700;
-            margin-bottom: 20px;
-            max-width: 800px;
-        }
-        
-        .hero p {
-            font-size: 18px;
-            color: #ddd;
-            margin-bottom: 30px;
-            max-width: 600px;
-            line-height: 1.6;
-        }
-        
-        .hero .cta {
-            display: flex;
-            gap: 15px;
-            flex-wrap: wrap;
-        }
-        
-        .btn {
-            padding: 15px 32px;
-            font-size: 16px;
-            font-weight: 600;
-            border-radius: 8px;
-            border: none;
-            cursor: pointer;
-            font-family: 'Outfit', sans-serif;
-            transition: all 0.3s;
-            text-decoration: none;
-            display: inline-block;
-        }
-        
-        .btn-primary {
-            background: white;
-            color: #1a1a1a;
-        }
-        
-        .btn-primary:hover {
-            background: #f0f0f0;
-            transform: translateY(-2px);
-        }
-        
-        .btn-outline {
-            background: transparent;
-            color: white;
-            border: 2px solid white;
-        }
-        
-        .btn-outline:hover {
-            background: white;
-            color: #1a1a1a;
-        }
-        
-        /* Sections */
-        section {
-            padding: 80px 20px;
-        }
-        
-        section .container {
-            max-width: 1280px;
-            margin: 0 auto;
-        }
-        
-        .story {
-            background: white;
-        }
-        
-        .story h2 {
-            font-family: 'Playfair Display', serif;
-            font-size: 44px;
-            text-align: center;
-            margin-bottom: 40px;
-        }
-        
-        .story .content {
-            max-width: 800px;
-            margin: 0 auto;
-            font-size: 16px;
-            line-height: 1.8;
-            color: #333;
-            white-space: pre-wrap;
-        }
-        
-        /* Features */
-        .features {
-            background: #f7f6f3;
-        }
-        
-        .features h2 {
-            font-family: 'Playfair Display', serif;
-            font-size: 44px;
-            text-align: center;
-            margin-bottom: 50px;
-        }
-        
-        .features-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 30px;
-        }
-        
-        .feature-item {
-            background: white;
-            padding: 30px;
-            border-radius: 12px;
-            border-left: 4px solid #1a1a1a;
-            transition: all 0.3s;
-        }
-        
-        .feature-item:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        }
-        
-        .feature-item p {
-            font-size: 16px;
-            line-height: 1.6;
-        }
-        
-        /* Endorsement */
-        .endorsement {
-            background: linear-gradient(135deg, #1a1a1a 0%, #333 100%);
-            color: white;
-            text-align: center;
-        }
-        
-        .endorsement blockquote {
-            font-family: 'Playfair Display', serif;
-            font-size: 36px;
-            font-weight: 700;
-            margin-bottom: 30px;
-            line-height: 1.4;
-            max-width: 800px;
-            margin-left: auto;
-            margin-right: auto;
-        }
-        
-        .endorsement .credit {
-            font-size: 14px;
-            color: #999;
-            font-style: italic;
-        }
-        
-        /* Gallery */
-        .gallery {
-            background: white;
-        }
-        
-        .gallery-grid {
-            display: grid;
-            grid-template-columns: 2fr 1fr 1fr;
-            gap: 20px;
-            height: 500px;
-        }
-        
-        .gallery-item {
-            background: #f0f0f0;
-            border-radius: 12px;
-            overflow: hidden;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: #999;
-            transition: all 0.3s;
-        }
-        
-        .gallery-item:hover {
-            transform: scale(1.02);
-        }
-        
-        .gallery-item:nth-child(2),
-        .gallery-item:nth-child(3) {
-            grid-column: span 1;
-        }
-        
-        @media (max-width: 768px) {
-            .hero h1 { font-size: 42px; }
-            .story h2 { font-size: 32px; }
-            .features h2 { font-size: 32px; }
-            .endorsement blockquote { font-size: 24px; }
-            .gallery-grid {
-                grid-template-columns: 1fr;
-                height: auto;
-            }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ assets.campaign_css }}">
 </head>
 <body>
     <nav>
@@ -748,8 +894,14 @@ CAMPAIGN_TEMPLATE = """<!DOCTYPE html>
         </div>
     </nav>
 
-    <!-- Hero -->
+    <!-- Hero: the first product image, loaded first -->
     <section class="hero">
+        {% for image in hero %}
+        <picture class="hero-image">
+            {% for source in image.sources %}<source type="{{ source.type }}" srcset="{{ source.srcset }}" sizes="100vw">{% endfor %}
+            <img src="{{ image.src }}" srcset="{{ image.srcset }}" sizes="100vw" width="{{ image.width }}" height="{{ image.height }}" alt="" fetchpriority="high" decoding="async">
+        </picture>
+        {% endfor %}
         <div class="container">
             <div style="margin-bottom: 20px; display: inline-block; background: rgba(255,255,255,0.1); padding: 8px 16px; border-radius: 20px; border: 1px solid rgba(255,255,255,0.2);">
                 ⭐ Trending on Social
@@ -797,35 +949,92 @@ CAMPAIGN_TEMPLATE = """<!DOCTYPE html>
     <section class="gallery">
         <div class="container">
             <div class="gallery-grid">
-                <div class="gallery-item">Image 1</div>
-                <div class="gallery-item">Image 2</div>
-                <div class="gallery-item">Image 3</div>
+                {% for image in gallery %}
+                <div class="gallery-item">
+                    <picture>
+                        {% for source in image.sources %}<source type="{{ source.type }}" srcset="{{ source.srcset }}" sizes="(max-width: 768px) 100vw, 50vw">{% endfor %}
+                        <img src="{{ image.src }}" srcset="{{ image.srcset }}" sizes="(max-width: 768px) 100vw, 50vw" width="{{ image.width }}" height="{{ image.height }}" alt="{{ campaign.productName }}" loading="lazy" decoding="async">
+                    </picture>
+                </div>
+                {% endfor %}
+                {% for label in placeholders %}
+                <div class="gallery-item">{{ label }}</div>
+                {% endfor %}
             </div>
         </div>
     </section>
 </body>
 </html>"""
 
+campaign_page = Template(CAMPAIGN_TEMPLATE)
+
+def build_campaign_page(cid):
+    campaign_data = get_campaign(cid)
+    if not campaign_data:
+        return None
+    if not valid_url(campaign_data["originalUrl"] or ""):
+        # Rows saved before submitted URLs were checked: never render e.g. javascript: as the link
+        campaign_data["originalUrl"] = "#"
+    images = campaign_data["images"]
+    # The template has loops but no conditionals: empty lists leave sections out
+    gallery = images[:3]
+    placeholders = [f"Image {n}" for n in range(len(gallery) + 1, 4)]
+    with stage("render"):
+        return "text/html; charset=utf-8", campaign_page.render(campaign=campaign_data, assets=assets,
+                                                                hero=images[:1], gallery=gallery,
+                                                                placeholders=placeholders)
+
+def build_campaign_json(cid):
+    campaign_data = get_campaign(cid)
+    if not campaign_data:
+        return None
+    return "application/json", app.json.dumps(campaign_data)
+
+def refresh_page_cache(cid):
+    # A campaign's images are ready
+    page_cache.invalidate(cid)
+    warm_page_cache(cid)
+
+def warm_page_cache(cid):
+    # Pre-build the page and API responses (with their compressed variants) at save time
+    try:
+        for kind, build in (("page", build_campaign_page), ("json", build_campaign_json)):
+            built = build(cid)
+            if built:
+                page_cache.store(cid, kind, *built)
+    except Exception as e:
+        print(f"Page cache error: {e}")
+
+# The home page has no per-request data, so it is rendered and compressed once
+home_page = StaticBody(Template(HOME_TEMPLATE).render(assets=assets), "text/html; charset=utf-8",
+                       HOME_CACHE_CONTROL)
+
 @app.route("/")
 def home():
-    return render_template_string(HOME_TEMPLATE)
+    return home_page.respond(request)
+
+@app.route("/assets/<name>")
+def asset(name):
+    body = assets.get(name)
+    if body is None:
+        return "Not found", 404
+    return body.respond(request)
+
+@app.route("/images/<name>")
+def image(name):
+    # Names carry the image's content hash, so a URL's bytes never change
+    found = image_store.path(name)
+    if found is None:
+        return "Not found", 404
+    path, content_type = found
+    response = send_file(path, mimetype=content_type, conditional=True, etag=False)
+    response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+    return response
 
 @app.route("/campaign/<int:cid>")
 def campaign(cid):
-    campaign_data = get_campaign(cid)
-    if not campaign_data:
-        return "Campaign not found", 404
-    
-    html = CAMPAIGN_TEMPLATE.replace("{{ campaign.productName }}", campaign_data["productName"])
-    html = html.replace("{{ campaign.productDescription }}", campaign_data["productDescription"])
-    html = html.replace("{{ campaign.originalUrl }}", campaign_data["originalUrl"])
-    html = html.replace("{{ campaign.generatedContent.adCopy }}", campaign_data["generatedContent"]["adCopy"])
-    html = html.replace("{{ campaign.generatedContent.celebrityEndorsement }}", campaign_data["generatedContent"]["celebrityEndorsement"])
-    
-    features_html = "".join([f'<div class="feature-item"><p>✓ {f}</p></div>' for f in campaign_data["generatedContent"]["features"]])
-    html = html.replace('{% for feature in campaign.generatedContent.features %}<div class="feature-item"><p>✓ {{ feature }}</p></div>{% endfor %}', features_html)
-    
-    return html
+    response = page_cache.respond(request, cid, "page", lambda: build_campaign_page(cid))
+    return response or ("Campaign not found", 404)
 
 @app.route("/api/campaigns/generate", methods=["POST"])
 def generate():
@@ -835,33 +1044,395 @@ def generate():
         
         if not url:
             return jsonify({"message": "URL required"}), 400
-        
-        campaign_data = generate_campaign(url)
-        if not campaign_data:
-            return jsonify({"message": "Failed to generate campaign"}), 500
-        
-        cid = save_campaign(campaign_data)
-        if not cid:
-            return jsonify({"message": "Failed to save"}), 500
-        
-        campaign_data["id"] = cid
-        campaign_data["createdAt"] = datetime.now().isoformat()
-        return jsonify(campaign_data), 201
+        if not valid_url(url):
+            return jsonify({"message": "URL must start with http:// or https://"}), 400
+        
+        try:
+            job_id = job_queue.submit("generate", {"url": url, "force": bool(data.get("force", False)),
+                                                   "traceId": trace_id()})
+        except QueueFull as e:
+            return jsonify({"message": str(e)}), 503, {"Retry-After": "5"}
+        
+        job = job_queue.get(job_id)
+        job["statusUrl"] = url_for("job_status", job_id=job_id)
+        return jsonify(job), 202, {"Location": job["statusUrl"]}
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
+@app.route("/api/campaigns/generate/stream")
+def generate_stream():
+    # The generation runs as a job like POST /api/campaigns/generate; this request only
+    # relays its progress, and only while a stream slot is free
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"message": "URL required"}), 400
+    if not valid_url(url):
+        return jsonify({"message": "URL must start with http:// or https://"}), 400
+    force = request.args.get("force", "").lower() in ("1", "true")
+    held = stream_slots if stream_slots.acquire(blocking=False) else None
+    try:
+        job_id = job_queue.submit("generate", {"url": url, "force": force, "stream": True, "traceId": trace_id()},
+                                  listen=held is not None)
+    except QueueFull as e:
+        if held is not None:
+            held.release()
+        body = sse("error", {"message": str(e), "retryAfter": 5})
+    else:
+        body = stream_with_context(relay_job(job_id, url_for("job_status", job_id=job_id), held))
+    return Response(body, mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/campaigns/generate/batch", methods=["POST"])
+def generate_batch():
+    try:
+        if request.files.get("file"):
+            data = request.form
+            urls = parse_csv(request.files["file"].read().decode("utf-8-sig"))
+        else:
+            data = request.get_json() or {}
+            urls = [u.strip() for u in data.get("urls", []) if isinstance(u, str) and u.strip()]
+        
+        concurrency = int(data.get("concurrency", BATCH_CONCURRENCY))
+        if concurrency < 1:
+            return jsonify({"message": "concurrency must be at least 1"}), 400
+        concurrency = min(concurrency, BATCH_MAX_CONCURRENCY)
+        
+        batch_id = data.get("batchId")
+        if batch_id:
+            if not batch_runner.exists(batch_id):
+                return jsonify({"message": "Batch not found"}), 404
+        elif not urls:
+            return jsonify({"message": "URLs required"}), 400
+        elif len(urls) > BATCH_MAX_URLS:
+            return jsonify({"message": f"At most {BATCH_MAX_URLS} URLs per batch"}), 400
+        else:
+            batch_id = batch_runner.create(urls)
+        
+        force = str(data.get("force", "")).lower() in ("1", "true")
+        try:
+            job_id = job_queue.submit("batch", {"batchId": batch_id, "concurrency": concurrency, "force": force,
+                                                "traceId": trace_id()})
+        except QueueFull as e:
+            return jsonify({"message": str(e), "batchId": batch_id}), 503, {"Retry-After": "5"}
+        
+        status_url = url_for("batch_status", batch_id=batch_id)
+        return jsonify({"batchId": batch_id, "jobId": job_id, "statusUrl": status_url,
+                        "jobUrl": url_for("job_status", job_id=job_id)}), 202, {"Location": status_url}
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": str(e)}), 500
+
+@app.route("/api/campaigns/generate/batch/<batch_id>")
+def batch_status(batch_id):
+    results = batch_runner.results(batch_id)
+    return jsonify(results) if results["total"] else (jsonify({"message": "Batch not found"}), 404)
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    return jsonify(job) if job else (jsonify({"message": "Job not found"}), 404)
+
+@app.route("/api/jobs/<job_id>/wait")
+def job_wait(job_id):
+    timeout = min(float(request.args.get("timeout", 25)), 60)
+    job = job_queue.wait(job_id, timeout=timeout)
+    return jsonify(job) if job else (jsonify({"message": "Job not found"}), 404)
+
 @app.route("/api/campaigns")
 def list_campaigns():
-    return jsonify(get_campaigns()), 200
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 200))
+        fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+        items, next_cursor = get_campaigns(limit, request.args.get("cursor"), fields,
+                                           keyword=request.args.get("keyword"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    headers = {}
+    if next_cursor:
+        args = {k: v for k, v in request.args.items() if k != "cursor"}
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{url_for("list_campaigns", cursor=next_cursor, **args)}>; rel="next"'
+    return jsonify(items), 200, headers
+
+@app.route("/api/campaigns/export")
+def export_campaigns():
+    # NDJSON, streamed a chunk at a time; resume a broken download with since_id set to
+    # the id on the last complete line
+    try:
+        since_id = max(0, int(request.args.get("since_id", 0)))
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError:
+        return jsonify({"message": "since_id and limit must be integers"}), 400
+    body = campaign_archive.export(since_id, limit)
+    headers = {"Cache-Control": "no-store", "X-Accel-Buffering": "no", "Vary": "Accept-Encoding",
+               "Content-Disposition": f'attachment; filename="campaigns-{since_id}.ndjson"'}
+    if parse_accept_encoding(request.headers.get("Accept-Encoding")).get("gzip", 0) > 0:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(body), mimetype="application/x-ndjson", headers=headers)
+
+@app.route("/api/campaigns/import", methods=["POST"])
+def import_campaigns():
+    # An NDJSON body (an export), gzipped or not; read and inserted as it arrives
+    gzipped = (request.headers.get("Content-Encoding", "").lower() == "gzip"
+               or request.mimetype in ("application/gzip", "application/x-gzip"))
+    lines = gunzip_lines(request.stream) if gzipped else request.stream
+    try:
+        counts = campaign_archive.load(lines)
+    except zlib.error as e:
+        return jsonify({"message": f"Invalid gzip body: {e}"}), 400
+    return jsonify(counts), 200
+
+@app.route("/api/campaigns/search")
+def search_campaigns():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"message": "q required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        return jsonify({"message": "limit and offset must be integers"}), 400
+    results, has_more = campaign_search.search(q, limit, offset)
+    headers = {}
+    if has_more:
+        args = {k: v for k, v in request.args.items() if k != "offset"}
+        headers["Link"] = f'<{url_for("search_campaigns", offset=offset + limit, **args)}>; rel="next"'
+    return jsonify(results), 200, headers
+
+def parse_since(value):
+    # "7d" -> the date 7 days ago; otherwise an ISO date
+    if not value:
+        return None
+    if value.endswith("d") and value[:-1].isdigit():
+        return (datetime.utcnow() - timedelta(days=int(value[:-1]))).date().isoformat()
+    return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+
+@app.route("/api/keywords")
+def top_keywords():
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 500))
+        since = parse_since(request.args.get("since"))
+    except ValueError:
+        return jsonify({"message": "limit must be an integer and since like 7d or YYYY-MM-DD"}), 400
+    return jsonify(keyword_index.top(limit, since)), 200
+
+@app.route("/api/keywords/<path:term>")
+def keyword_stats(term):
+    try:
+        since = parse_since(request.args.get("since"))
+    except ValueError:
+        return jsonify({"message": "since must look like 7d or YYYY-MM-DD"}), 400
+    daily = keyword_index.daily(term, since)
+    if daily is None:
+        return jsonify({"message": "Not found"}), 404
+    return jsonify({"keyword": normalize_keyword(term), "campaigns": sum(d["campaigns"] for d in daily),
+                    "daily": daily,
+                    "campaignsUrl": url_for("list_campaigns", keyword=normalize_keyword(term))}), 200
 
 @app.route("/api/campaigns/<int:cid>")
 def get_one(cid):
-    campaign_data = get_campaign(cid)
-    return jsonify(campaign_data) if campaign_data else ("Not found", 404)
+    response = page_cache.respond(request, cid, "json", lambda: build_campaign_json(cid))
+    return response or ("Not found", 404)
 
-if __name__ == "__main__":
-    init_db()
+@app.route("/api/campaigns/<int:cid>/regenerate", methods=["POST"])
+def regenerate(cid):
+    if not get_campaign(cid):
+        return jsonify({"message": "Not found"}), 404
+    try:
+        job_id = job_queue.submit("regenerate", {"campaignId": cid, "traceId": trace_id()})
+    except QueueFull as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "5"}
+    job = job_queue.get(job_id)
+    job["statusUrl"] = url_for("job_status", job_id=job_id)
+    return jsonify(job), 202, {"Location": job["statusUrl"]}
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify({"scrape": scrape_cache.stats(), "completions": completion_cache.stats(),
+                    "fetch": fetch_stats(fetcher),
+                    "asyncFetch": fetch_stats(async_fetcher) if async_fetcher else None,
+                    "imageFetch": fetch_stats(image_fetcher),
+                    "pipeline": pipeline.stats(), "db": db.stats(),
+                    "pages": page_cache.stats(), "assets": assets.stats(),
+                    "dedup": dedup_index.stats(), "llm": llm_stats(), "router": router.stats(),
+                    "structured": campaign_output.stats(), "content": content_codec.stats(),
+                    "images": image_store.stats()}), 200
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return metrics.render(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+
+@app.before_request
+def start_workers():
+    startup()
+    job_queue.start()
+    image_store.start()
+
+@app.before_request
+def start_request_trace():
+    g.trace = begin_trace((request.headers.get("X-Request-Id") or "")[:64] or None, method=request.method, path=request.path)
+
+@app.after_request
+def trace_response(response):
+    trace = g.get("trace")
+    if trace:
+        trace.fields["status"] = response.status_code
+        response.headers["X-Request-Id"] = trace.id
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    # Runs after a streamed body has been sent, so SSE requests are timed end to end
+    trace = g.pop("trace", None)
+    end_trace()
+    if trace is None:
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = trace.fields.get("status", 500)
+    request_seconds.observe(trace.elapsed(), method=request.method, route=route, status=status)
+    trace.log("request", route=route, error=str(error) if error else None)
+
+def run_server(args):
     print("\n Ad Campaign Generator (Groq + Llama)")
-    print(" http://127.0.0.1:5000")
+    print(f" http://{args.host}:{args.port}")
     print(" Open your browser!\n")
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    if args.debug:
+        app.run(debug=True, host=args.host, port=args.port)
+        return
+
+    from server import serve
+
+    def before_fork():
+        # Requeue interrupted jobs once, here, not in every worker; and don't hand the
+        # parent's SQLite connections to the children
+        job_queue.recover()
+        job_queue.recover_on_start = False
+        image_store.recover()
+        image_store.recover_on_start = False
+        db.close()
+
+    def worker_exited(pid):
+        # Its jobs and image downloads would otherwise stay running forever; recover()
+        # only runs when the server starts
+        requeued = job_queue.requeue(pid) + image_store.requeue(pid)
+        if requeued:
+            print(f"Requeued {requeued} jobs and downloads from worker {pid}", flush=True)
+        db.close()
+
+    serve(app, args.host, args.port, workers=args.workers, threads=args.threads, before_fork=before_fork,
+          on_worker_exit=worker_exited)
+
+def run_batch(args):
+    if args.resume:
+        batch_id = args.resume
+        if not batch_runner.exists(batch_id):
+            sys.exit(f"Batch {batch_id} not found")
+    else:
+        with open(args.file, encoding="utf-8-sig") as f:
+            batch_id = batch_runner.create(parse_csv(f.read()))
+    print(f"Batch {batch_id} (resume with: python main.py batch --resume {batch_id})")
+    summary = batch_runner.run(batch_id, concurrency=args.concurrency, force=args.force)
+    for r in summary["results"]:
+        print(f"{r['status']:<8} {r['campaignId'] or '-':<6} {r['url']} {r['error'] or ''}")
+    print(f"{summary['done']} done, {summary['failed']} failed, {summary['pending']} pending")
+
+def run_compact(args):
+    # Safe alongside the running app: every step is a series of short transactions
+    # (except --full, whose VACUUM blocks writes until it finishes)
+    if args.train or not content_codec.dictionary_id:
+        trained = content_codec.train(samples=args.samples)
+        print(f"Dictionary: {f'trained #{trained}' if trained else 'not enough campaigns to train one'}")
+    counts = content_codec.compact(batch_size=args.batch, pause=args.pause)
+    print(f"Campaigns: {counts['rewritten']} of {counts['scanned']} rewritten as {content_codec.tag or 'plain JSON'}, "
+          f"{counts['before']:,} -> {counts['after']:,} bytes")
+    purged = {"scrape cache": scrape_cache.purge(),
+              "completion cache": completion_cache.purge(max_age=COMPLETION_CACHE_MAX_AGE),
+              "page cache": page_cache.purge(max_age_days=PAGE_CACHE_MAX_AGE_DAYS),
+              "jobs": job_queue.purge(max_age_days=JOB_RETENTION_DAYS),
+              "images": image_store.purge()}
+    print("Purged: " + ", ".join(f"{n} {name}" for name, n in purged.items()))
+    before, after = db.vacuum(pause=args.pause, full=args.full)
+    print(f"Database: {before['bytes']:,} -> {after['bytes']:,} bytes ({after['freeBytes']:,} still free)")
+    if not after["incremental"]:
+        print("Free pages can't be returned while the app runs on this database: "
+              "run `python main.py compact --full` once in a maintenance window")
+
+def run_export(args):
+    # To a file (gzipped when it ends in .gz) or stdout; the id to resume from goes to stderr
+    done = {"count": 0, "last": args.since_id}
+    def progress(rows, last_id):
+        done["count"] += rows
+        done["last"] = last_id
+    chunks = campaign_archive.export(args.since_id, args.limit, progress)
+    if args.file and args.file.endswith(".gz"):
+        chunks = gzip_stream(chunks)
+    out = open(args.file, "wb") if args.file else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    finally:
+        if args.file:
+            out.close()
+        print(f"Exported {done['count']} campaigns (resume with --since-id {done['last']})", file=sys.stderr)
+
+def run_import(args):
+    with open(args.file, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+        f.seek(0)
+        campaign_archive.batch_size = args.batch
+        counts = campaign_archive.load(gunzip_lines(f) if gzipped else f)
+    for error in counts["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    ids = f" (ids {counts['firstId']}-{counts['lastId']})" if counts["imported"] else ""
+    print(f"{counts['imported']} imported{ids}, {counts['duplicates']} duplicate URLs skipped, "
+          f"{counts['invalid']} invalid")
+
+def run_reindex(args):
+    print(f"Search index rebuilt: {campaign_search.rebuild()} campaigns")
+    print(f"Keyword index rebuilt: {keyword_index.rebuild()} campaigns")
+
+def cli():
+    parser = argparse.ArgumentParser(description="Ad Campaign Generator")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("serve", help="run the web app (default)")
+    p.add_argument("--host", default=SERVER_HOST)
+    p.add_argument("--port", type=int, default=SERVER_PORT)
+    p.add_argument("--workers", type=int, default=SERVER_WORKERS, help="processes")
+    p.add_argument("--threads", type=int, default=SERVER_THREADS, help="request threads per process")
+    p.add_argument("--debug", action="store_true", help="Flask's reloading development server instead")
+    p.set_defaults(func=run_server)
+    p = sub.add_parser("batch", help="generate campaigns for a CSV/text file of URLs")
+    p.add_argument("file", nargs="?", help="CSV with a url column, or one URL per line")
+    p.add_argument("--resume", metavar="BATCH_ID", help="continue an interrupted batch")
+    p.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    p.add_argument("--force", action="store_true", help="bypass the completion cache")
+    p.set_defaults(func=run_batch)
+    sub.add_parser("reindex", help="rebuild the search and keyword indexes").set_defaults(func=run_reindex)
+    p = sub.add_parser("compact", help="recompress campaigns, purge stale cache rows and vacuum")
+    p.add_argument("--train", action="store_true", help="train a new dictionary even if there is one")
+    p.add_argument("--samples", type=int, default=1000, help="recent campaigns to train on")
+    p.add_argument("--batch", type=int, default=500, help="campaigns per write transaction")
+    p.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    p.add_argument("--full", action="store_true",
+                   help="finish with a full VACUUM, which repacks rewritten rows but blocks writes while it runs")
+    p.set_defaults(func=run_compact)
+    p = sub.add_parser("export", help="write campaigns as NDJSON")
+    p.add_argument("file", nargs="?", help="output file, gzipped if it ends in .gz (default: stdout)")
+    p.add_argument("--since-id", type=int, default=0, help="only campaigns with a greater id")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(func=run_export)
+    p = sub.add_parser("import", help="load campaigns from an NDJSON export, skipping URLs already stored")
+    p.add_argument("file", help="NDJSON file, optionally gzipped")
+    p.add_argument("--batch", type=int, default=IMPORT_BATCH_SIZE, help="campaigns per write transaction")
+    p.set_defaults(func=run_import)
+    args = parser.parse_args(sys.argv[1:] or ["serve"])
+    if args.command == "batch" and not (args.file or args.resume):
+        parser.error("batch needs a file or --resume")
+    if args.command == "batch" and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    startup()
+    args.func(args)
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,249 @@
+import contextvars
+import json
+import math
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(name, labelnames, values, value):
+    labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(labelnames, values))
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in self._values.items()]
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket counts, then sum and count; buckets are made cumulative on render
+            entry = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in self._values.items():
+                total = 0
+                for bound, count in zip(self.buckets, entry):
+                    total += count
+                    le = "+Inf" if bound == math.inf else bound
+                    samples.append((self.name + "_bucket", self.labelnames + ("le",), key + (le,), total))
+                samples.append((self.name + "_sum", self.labelnames, key, round(entry[-2], 6)))
+                samples.append((self.name + "_count", self.labelnames, key, entry[-1]))
+        return samples
+
+
+class Collected:
+    # Values read from an existing stats() when /metrics is scraped: fn returns a number,
+    # or {label value (or tuple of them): number}
+    def __init__(self, name, help, fn, kind="gauge", labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labelnames = tuple(labels)
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, self.labelnames, key if isinstance(key, tuple) else (key,), value)
+                for key, value in values.items() if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collect(self, name, help, fn, kind="gauge", labels=()):
+        return self._add(Collected(name, help, fn, kind, labels))
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Metrics error in {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format(*sample) for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    # One request or job: an id carried through its stages, their timings, and the
+    # fields of the JSON log line written when it ends
+    def __init__(self, trace_id=None, **fields):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.fields = fields
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def log(self, event, **fields):
+        line = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), "event": event,
+                "traceId": self.id, "durationMs": round(self.elapsed() * 1000, 1),
+                "stagesMs": {k: round(v * 1000, 1) for k, v in self.stages.items()}}
+        line.update((k, v) for k, v in {**self.fields, **fields}.items() if v is not None)
+        # One write, newline included, so the line can't be split by another thread's output
+        sys.stdout.write(json.dumps(line, default=str) + "\n")
+        sys.stdout.flush()
+
+
+class LineWriter:
+    # Wraps a text stream so every line goes out in a single write. print() writes its
+    # text and the newline separately, so lines from concurrent request, job and loop
+    # threads could otherwise be spliced together and the JSON lines stop parsing.
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        head, newline, rest = (getattr(self._local, "pending", "") + text).rpartition("\n")
+        self._local.pending = rest
+        if newline:
+            with self._lock:
+                self.stream.write(head + newline)
+                self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        pending = getattr(self._local, "pending", "")
+        self._local.pending = ""
+        with self._lock:
+            if pending:
+                self.stream.write(pending)
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def line_buffered_stdout():
+    if not isinstance(sys.stdout, LineWriter):
+        sys.stdout = LineWriter(sys.stdout)
+
+
+def current_trace():
+    return _current.get()
+
+
+def trace_id():
+    trace = _current.get()
+    return trace.id if trace else None
+
+
+def begin_trace(trace_id=None, **fields):
+    trace = Trace(trace_id, **fields)
+    _current.set(trace)
+    return trace
+
+
+def end_trace():
+    _current.set(None)
+
+
+@contextmanager
+def traced(event, trace_id=None, **fields):
+    # A trace for work outside a request (e.g. a job): logs one line when it ends
+    trace = Trace(trace_id, **fields)
+    token = _current.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except Exception as e:
+        status = "error"
+        trace.fields["error"] = str(e)
+        raise
+    finally:
+        _current.reset(token)
+        trace.log(event, status=status)
+
+
+class Stages:
+    # with stage("scrape"): times a pipeline stage into the histogram and the current trace
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.histogram.observe(elapsed, stage=name, status=status)
+            trace = _current.get()
+            if trace:
+                trace.add(name, elapsed)
+                if status == "error":
+                    trace.fields.setdefault("failedStage", name)
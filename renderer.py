@@ -0,0 +1,86 @@
+import re
+from html import escape
+
+# The subset of Jinja syntax the page templates use: {{ a.b.c }} and {% for x in a.b %}...{% endfor %}
+TOKEN = re.compile(r"\{\{\s*([\w.]+)\s*\}\}|\{%\s*for\s+(\w+)\s+in\s+([\w.]+)\s*%\}|\{%\s*endfor\s*%\}")
+
+
+class TemplateError(Exception):
+    pass
+
+
+def _lookup(context, path):
+    value = context
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+        if value is None:
+            return None
+    return value
+
+
+class Template:
+    # Compiled once into static segments and slots; render() walks them and joins once.
+    def __init__(self, source):
+        self.nodes = self._compile(source)
+
+    @staticmethod
+    def _compile(source):
+        root = []
+        stack = [root]
+        pos = 0
+        for m in TOKEN.finditer(source):
+            if m.start() > pos:
+                stack[-1].append(source[pos:m.start()])
+            if m.group(1):
+                stack[-1].append(("var", tuple(m.group(1).split("."))))
+            elif m.group(2):
+                body = []
+                stack[-1].append(("for", m.group(2), tuple(m.group(3).split(".")), body))
+                stack.append(body)
+            else:
+                if len(stack) == 1:
+                    raise TemplateError(f"Unexpected endfor at offset {m.start()}")
+                stack.pop()
+            pos = m.end()
+        if len(stack) != 1:
+            raise TemplateError("Unclosed for block")
+        if pos < len(source):
+            root.append(source[pos:])
+        return Template._merge(root)
+
+    @staticmethod
+    def _merge(nodes):
+        merged = []
+        for node in nodes:
+            if isinstance(node, str) and merged and isinstance(merged[-1], str):
+                merged[-1] += node
+            elif isinstance(node, tuple) and node[0] == "for":
+                merged.append((node[0], node[1], node[2], Template._merge(node[3])))
+            else:
+                merged.append(node)
+        return merged
+
+    def render(self, **context):
+        out = []
+        self._render(self.nodes, context, out)
+        return "".join(out)
+
+    def _render(self, nodes, context, out):
+        append = out.append
+        for node in nodes:
+            if isinstance(node, str):
+                append(node)
+            elif node[0] == "var":
+                value = _lookup(context, node[1])
+                if value is not None:
+                    append(escape(str(value)))
+            else:
+                _, name, path, body = node
+                items = _lookup(context, path) or ()
+                scope = dict(context)
+                for item in items:
+                    scope[name] = item
+                    self._render(body, scope, out)
@@ -0,0 +1,126 @@
+import re
+import threading
+import time
+from collections import deque
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def approx_tokens(text):
+    # Llama tokenizers average ~4 characters per token on English marketing copy
+    return (len(text or "") + 3) // 4
+
+
+def trim_to_tokens(text, budget):
+    # Cut on a sentence boundary when one falls in the budget, else on a word
+    text = (text or "").strip()
+    if approx_tokens(text) <= budget:
+        return text
+    limit = max(0, budget * 4)
+    cut = text[:limit]
+    sentences = SENTENCE_END.split(cut)
+    if len(sentences) > 1:
+        return " ".join(sentences[:-1])
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def max_tokens_for(field_budgets, margin=1.3, overhead=40):
+    # Expected output size from the schema, with headroom so valid JSON is never cut off
+    return int((sum(field_budgets.values()) + overhead) * margin)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Route:
+    def __init__(self, name, model, window=50):
+        self.name = name
+        self.model = model
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reasons = {}
+
+    def p95(self):
+        return percentile(list(self.latencies), 0.95)
+
+
+class Router:
+    # Picks the fast or the quality route per request:
+    #   mode "fast"/"quality" pins a route;
+    #   thin scraped context (under small_context_tokens) goes to the fast model;
+    #   otherwise quality, unless its rolling p95 breaks the SLO and the fast route's doesn't.
+    # While shed, every probe_every-th request still goes to quality so its p95 can recover.
+    def __init__(self, fast_model, quality_model, mode="auto", slo_p95=10.0, small_context_tokens=32,
+                 window=50, min_samples=5, probe_every=10):
+        self.routes = {"fast": Route("fast", fast_model, window), "quality": Route("quality", quality_model, window)}
+        self.mode = mode
+        self.slo_p95 = slo_p95
+        self.small_context_tokens = small_context_tokens
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self._shed = 0
+        self._lock = threading.Lock()
+
+    def choose(self, context_tokens):
+        fast, quality = self.routes["fast"], self.routes["quality"]
+        if self.mode in self.routes:
+            return self.routes[self.mode], "pinned"
+        if context_tokens < self.small_context_tokens:
+            return fast, "thin-context"
+        with self._lock:
+            quality_p95 = quality.p95() if len(quality.latencies) >= self.min_samples else None
+            fast_p95 = fast.p95() if len(fast.latencies) >= self.min_samples else None
+            if quality_p95 is not None and quality_p95 > self.slo_p95 and (fast_p95 is None or fast_p95 < quality_p95):
+                self._shed += 1
+                if self._shed % self.probe_every:
+                    return fast, "slo"
+                return quality, "probe"
+        return quality, "default"
+
+    def complete(self, route, reason, params, create):
+        # Runs one non-streaming call on the route and records it
+        start = time.perf_counter()
+        return self._recorded(route, reason, params, start, create(**params))
+
+    async def acomplete(self, route, reason, params, create):
+        start = time.perf_counter()
+        return self._recorded(route, reason, params, start, await create(**params))
+
+    def _recorded(self, route, reason, params, start, response):
+        content = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        self.record(route, reason, params, time.perf_counter() - start,
+                    getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), content,
+                    getattr(response, "model", None))
+        return content
+
+    def record(self, route, reason, params, latency, prompt_tokens=None, completion_tokens=None, content="",
+               model=None):
+        # model is what actually served the call, which differs from params after a gateway fallback
+        if prompt_tokens is None:
+            prompt_tokens = sum(approx_tokens(m.get("content")) for m in params.get("messages", []))
+        if completion_tokens is None:
+            completion_tokens = approx_tokens(content)
+        with self._lock:
+            route.latencies.append(latency)
+            route.calls += 1
+            route.prompt_tokens += prompt_tokens
+            route.completion_tokens += completion_tokens
+            route.reasons[reason] = route.reasons.get(reason, 0) + 1
+        print(f"LLM route={route.name} reason={reason} model={model or params.get('model')} "
+              f"prompt_tokens={prompt_tokens} completion_tokens={completion_tokens} "
+              f"max_tokens={params.get('max_tokens')} latency={latency:.2f}s")
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "sloP95": self.slo_p95, "routes": {
+                name: {"model": r.model, "calls": r.calls, "promptTokens": r.prompt_tokens,
+                       "completionTokens": r.completion_tokens, "reasons": dict(r.reasons),
+                       "p50": percentile(list(r.latencies), 0.5), "p95": r.p95()}
+                for name, r in self.routes.items()}}
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from db import database
+
+# Query parameters that never change what a page shows
+TRACKING_PARAMS = {"img_index", "igshid", "igsh", "fbclid", "gclid", "dclid", "msclkid",
+                   "mc_cid", "mc_eid", "si", "ref_src", "ref_url"}
+
+
+def canonicalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m.", "mobile."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") + "/"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS)
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class ScrapeCache:
+    def __init__(self, db_file, ttl=3600, max_entries=512, max_bytes=4 * 1024 * 1024):
+        self.db = database(db_file)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lru = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_db(self):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_cache (
+                    url_key TEXT PRIMARY KEY,
+                    url TEXT,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_cache_fetched ON scrape_cache (fetched_at)")
+
+    def _remember(self, key, raw, fetched_at):
+        with self._lock:
+            if key in self._lru:
+                self._bytes -= len(self._lru.pop(key)[0])
+            self._lru[key] = (raw, fetched_at)
+            self._bytes += len(raw)
+            while self._lru and (len(self._lru) > self.max_entries or self._bytes > self.max_bytes):
+                _, (old, _) = self._lru.popitem(last=False)
+                self._bytes -= len(old)
+                self.evictions += 1
+
+    def get(self, url):
+        key = canonicalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[0])
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute("SELECT data, fetched_at FROM scrape_cache WHERE url_key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Scrape cache error: {e}")
+            row = None
+        if row and now - row[1] < self.ttl:
+            self._remember(key, row[0], row[1])
+            with self._lock:
+                self.db_hits += 1
+            return json.loads(row[0])
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, url, data, status=200):
+        # Only pages that loaded: an error or login page would otherwise stand in for
+        # the product page until the TTL ran out
+        if status is None or not 200 <= status < 300:
+            return False
+        key = canonicalize_url(url)
+        raw = json.dumps(data)
+        now = time.time()
+        self._remember(key, raw, now)
+        try:
+            with self.db.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO scrape_cache (url_key, url, data, fetched_at) VALUES (?, ?, ?, ?)",
+                             (key, url, raw, now))
+                conn.execute("DELETE FROM scrape_cache WHERE fetched_at < ?", (now - self.ttl,))
+        except sqlite3.Error as e:
+            print(f"Scrape cache error: {e}")
+        return True
+
+    def purge(self):
+        # Expired rows; put() only clears them as new pages come in
+        with self.db.transaction() as conn:
+            return conn.execute("DELETE FROM scrape_cache WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.db_hits + self.misses
+            return {
+                "hits": self.hits, "dbHits": self.db_hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self._lru), "bytes": self._bytes,
+                "hitRate": round((self.hits + self.db_hits) / lookups, 4) if lookups else 0.0
+            }
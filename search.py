@@ -0,0 +1,118 @@
+import json
+import re
+from html import escape
+
+from codec import plain
+from db import database
+
+# bm25 weights, in column order: a hit in the product name counts most
+WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+QUERY_TERM = re.compile(r'"([^"]*)"|([\w]+)', re.UNICODE)
+# Private-use markers survive snippet() untouched and are swapped for <mark> after escaping
+OPEN, CLOSE = "\ue000", "\ue001"
+
+
+def match_query(q):
+    # Free text -> FTS5 MATCH expression. Every term is quoted so user input can never be
+    # read as FTS5 syntax; "quoted phrases" stay phrases and the last bare word is a prefix.
+    terms = []
+    for phrase, word in QUERY_TERM.findall(q or ""):
+        words = re.findall(r"\w+", phrase) if phrase else [word]
+        if words:
+            terms.append(('"' + " ".join(words) + '"', bool(word)))
+    if not terms:
+        return None
+    if terms[-1][1]:
+        terms[-1] = (terms[-1][0] + "*", True)
+    return " ".join(t for t, _ in terms)
+
+
+def highlight(snippet):
+    return escape(snippet or "").replace(OPEN, "<mark>").replace(CLOSE, "</mark>")
+
+
+def document(campaign):
+    content = campaign.get("generatedContent") or {}
+    return (campaign.get("productName") or "", campaign.get("productDescription") or "",
+            content.get("adCopy") or "", " ".join(content.get("keywords") or []))
+
+
+class CampaignSearch:
+    def __init__(self, db_file, backfill_batch=1000, decode=None):
+        self.db = database(db_file)
+        self.backfill_batch = backfill_batch
+        # generated_content may be compressed (codec.py)
+        self.decode = decode or plain
+
+    def init_db(self):
+        with self.db.transaction(immediate=True) as conn:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'campaigns_fts'").fetchone()
+            if not exists:
+                # rowid is the campaign id
+                conn.execute("""
+                    CREATE VIRTUAL TABLE campaigns_fts USING fts5(
+                        product_name, product_description, ad_copy, keywords,
+                        tokenize = 'porter unicode61 remove_diacritics 2',
+                        prefix = '2 3'
+                    )
+                """)
+                conn.execute("INSERT INTO campaigns_fts (campaigns_fts, rank) VALUES ('rank', ?)",
+                             (f"bm25({', '.join(map(str, WEIGHTS))})",))
+        if not exists:
+            total = self.rebuild()
+            if total:
+                print(f"Search index: backfilled {total} campaigns")
+
+    def index(self, conn, items):
+        # items: [(campaign_id, campaign)]; runs inside the caller's write transaction
+        conn.executemany("INSERT OR REPLACE INTO campaigns_fts (rowid, product_name, product_description, "
+                         "ad_copy, keywords) VALUES (?, ?, ?, ?, ?)",
+                         [(cid, *document(campaign)) for cid, campaign in items])
+
+    def rebuild(self):
+        # One-off backfill of existing rows, in batches so writers are not blocked for long
+        with self.db.transaction(immediate=True) as conn:
+            conn.execute("DELETE FROM campaigns_fts")
+        last, total = 0, 0
+        while True:
+            with self.db.transaction(immediate=True) as conn:
+                rows = conn.execute("""
+                    SELECT id, product_name, product_description, generated_content, content_codec
+                    FROM campaigns WHERE id > ? ORDER BY id LIMIT ?
+                """, (last, self.backfill_batch)).fetchall()
+                items = []
+                for cid, name, description, content, tag in rows:
+                    try:
+                        content = json.loads(self.decode(content, tag)) if content else {}
+                    except ValueError:
+                        content = {}
+                    items.append((cid, {"productName": name, "productDescription": description,
+                                        "generatedContent": content if isinstance(content, dict) else {}}))
+                self.index(conn, items)
+            if not rows:
+                break
+            last = rows[-1][0]
+            total += len(rows)
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO campaigns_fts (campaigns_fts) VALUES ('optimize')")
+        return total
+
+    def search(self, q, limit=20, offset=0):
+        # Returns (results, has_more), best match first
+        match = match_query(q)
+        if match is None:
+            return [], False
+        with self.db.connection() as conn:
+            rows = conn.execute("""
+                SELECT c.id, c.original_url, c.product_name, c.product_description, c.created_at,
+                       snippet(campaigns_fts, -1, ?, ?, '…', 16), campaigns_fts.rank
+                FROM campaigns_fts JOIN campaigns c ON c.id = campaigns_fts.rowid
+                WHERE campaigns_fts MATCH ?
+                ORDER BY campaigns_fts.rank LIMIT ? OFFSET ?
+            """, (OPEN, CLOSE, match, limit + 1, offset)).fetchall()
+        results = [{
+            "id": row[0], "originalUrl": row[1], "productName": row[2],
+            "productDescription": row[3], "createdAt": row[4],
+            "snippet": highlight(row[5]), "score": round(-row[6], 4)
+        } for row in rows[:limit]]
+        return results, len(rows) > limit
@@ -0,0 +1,149 @@
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+class RequestHandler(WSGIRequestHandler):
+    # Idle keep-alive connections give their thread back after this many seconds
+    timeout = 5
+
+    def log_request(self, *args, **kwargs):
+        # The app writes its own JSON line per request
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    # werkzeug's server with a fixed pool of request threads instead of one per connection
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(app, host="127.0.0.1", port=5000, workers=1, threads=8, before_fork=None, on_worker_exit=None):
+    # gunicorn (gthread workers) when installed; otherwise a pre-fork of PooledWSGIServer
+    # sharing one listening socket, with dead workers replaced. before_fork() runs once
+    # in the parent, e.g. to close SQLite connections the children must not inherit;
+    # on_worker_exit(pid) runs in the parent for each worker that exits, before its
+    # replacement starts.
+    if BaseApplication is not None:
+        return _gunicorn(app, host, port, workers, threads, before_fork, on_worker_exit)
+    sock = listen(host, port)
+    if before_fork:
+        before_fork()
+    if workers <= 1 or not hasattr(os, "fork"):
+        return _worker(app, sock, threads)
+
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _worker(app, sock, threads)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f" {workers} workers x {threads} threads on {host}:{port} (pid {os.getpid()})", flush=True)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None:
+            continue
+        if on_worker_exit:
+            try:
+                on_worker_exit(pid)
+            except Exception as e:
+                print(f"Worker {pid} cleanup failed: {e}", flush=True)
+        if stopping:
+            continue
+        print(f"Worker {pid} exited with status {status}, restarting", flush=True)
+        if time.monotonic() - started < 1:
+            # Crashing on startup: don't spin
+            time.sleep(1)
+        spawn()
+    sock.close()
+
+
+def _worker(app, sock, threads):
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads=threads, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _gunicorn(app, host, port, workers, threads, before_fork, on_worker_exit):
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", 120)
+            if before_fork:
+                self.cfg.set("on_starting", lambda arbiter: before_fork())
+            if on_worker_exit:
+                self.cfg.set("child_exit", lambda arbiter, worker: on_worker_exit(worker.pid))
+
+        def load(self):
+            return app
+
+    Application().run()
+    sys.exit(0)
@@ -0,0 +1,131 @@
+function showField(name, value) {
+    const el = document.querySelector(`#preview [data-field="${name}"]`);
+    if (!el) return;
+    document.getElementById('preview').style.display = 'block';
+    if (Array.isArray(value)) {
+        el.innerHTML = '';
+        value.forEach(v => {
+            const li = document.createElement('li');
+            li.textContent = v;
+            el.appendChild(li);
+        });
+    } else {
+        el.textContent = value;
+    }
+}
+
+function generateWithStream(url, loading) {
+    // The server runs the generation as a job; if it has no stream slot free, or the
+    // connection drops, the same job is polled instead
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/campaigns/generate/stream?url=${encodeURIComponent(url)}`);
+        let job = null;
+        const poll = () => {
+            source.close();
+            waitForJob({id: job.id, status: 'queued'}, loading).then(resolve, reject);
+        };
+        source.addEventListener('job', e => {
+            job = JSON.parse(e.data);
+        });
+        source.addEventListener('poll', poll);
+        source.addEventListener('status', e => {
+            const stage = JSON.parse(e.data).stage;
+            loading.textContent = stage === 'scraping' ? '⏳ Reading the post...' : '⏳ Generating your campaign...';
+        });
+        source.addEventListener('partial', e => {
+            const d = JSON.parse(e.data);
+            showField(d.name, d.value);
+        });
+        source.addEventListener('field', e => {
+            const d = JSON.parse(e.data);
+            showField(d.name, d.value);
+        });
+        source.addEventListener('done', e => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.addEventListener('error', e => {
+            if (!e.data && job) return poll();
+            source.close();
+            reject(new Error(e.data ? JSON.parse(e.data).message : 'Connection lost'));
+        });
+    });
+}
+
+async function generateWithJob(url, loading) {
+    const res = await fetch('/api/campaigns/generate', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({url})
+    });
+    const job = await res.json();
+    if (!res.ok) throw new Error(job.message || 'Failed to generate');
+    return waitForJob(job, loading);
+}
+
+async function waitForJob(job, loading) {
+    while (job.status === 'queued' || job.status === 'running') {
+        loading.textContent = job.status === 'queued' ? '⏳ Waiting in queue...' : '⏳ Generating your campaign...';
+        const poll = await fetch(`/api/jobs/${job.id}/wait?timeout=25`);
+        job = await poll.json();
+        if (!poll.ok) break;
+    }
+    if (job.status !== 'done') throw new Error(job.error || job.message || 'Failed to generate');
+    return job.result;
+}
+
+document.getElementById('form').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const url = document.getElementById('url').value;
+    const msg = document.getElementById('message');
+    const loading = document.getElementById('loading');
+
+    msg.innerHTML = '';
+    document.getElementById('preview').style.display = 'none';
+    if (!/^https?:\/\//i.test(url.trim())) {
+        msg.innerHTML = '<div class="message error">❌ Enter a link starting with http:// or https://</div>';
+        return;
+    }
+    loading.textContent = '⏳ Generating your campaign...';
+    loading.style.display = 'block';
+
+    try {
+        const campaign = window.EventSource
+            ? await generateWithStream(url, loading)
+            : await generateWithJob(url, loading);
+        loading.style.display = 'none';
+        msg.innerHTML = '<div class="message success">✓ Campaign generated! Redirecting...</div>';
+        setTimeout(() => window.location.href = `/campaign/${campaign.id}`, 1500);
+    } catch (err) {
+        loading.style.display = 'none';
+        msg.innerHTML = `<div class="message error">❌ ${err.message || 'Failed to generate'}</div>`;
+    }
+});
+
+async function loadCampaigns() {
+    try {
+        const res = await fetch('/api/campaigns?limit=6&fields=id,productName,productDescription,createdAt');
+        const campaigns = await res.json();
+        const grid = document.getElementById('campaigns');
+
+        if (campaigns.length === 0) {
+            grid.innerHTML = '<div class="empty-state"><p>No campaigns yet. Create your first one!</p></div>';
+            return;
+        }
+
+        grid.innerHTML = campaigns.slice(0, 6).map(c => `
+            <a href="/campaign/${c.id}" class="campaign-card">
+                <h3>${c.productName}</h3>
+                <p>${c.productDescription.substring(0, 100)}...</p>
+                <div class="meta">
+                    <span>${new Date(c.createdAt).toLocaleDateString()}</span>
+                    <span>View →</span>
+                </div>
+            </a>
+        `).join('');
+    } catch (err) {
+        console.error('Failed to load campaigns:', err);
+    }
+}
+
+loadCampaigns();
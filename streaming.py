@@ -0,0 +1,101 @@
+import json
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class FieldStream:
+    # Incrementally scans a streamed JSON object and reports each top-level field as
+    # soon as its value is complete, plus the partial text of string values in flight.
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.key = None
+        self.value_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.emitted = set()
+
+    def feed(self, text):
+        # Returns a list of ("field", key, value) and ("partial", key, text) events
+        self.buf += text
+        events = []
+        buf = self.buf
+        while self.pos < len(buf):
+            ch = buf[self.pos]
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                self.pos += 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key is None and self.value_start is None:
+                        self.key = self._loads(buf[self.string_start:self.pos + 1])
+                    elif self.depth == 1 and self.value_start == self.string_start:
+                        self._emit(events, buf[self.value_start:self.pos + 1])
+                self.pos += 1
+                continue
+            if ch == '"':
+                self.in_string = True
+                self.string_start = self.pos
+                if self.depth == 1 and self.key is not None and self.value_start is None:
+                    self.value_start = self.pos
+            elif ch in "[{":
+                if self.depth == 1 and self.key is not None and self.value_start is None:
+                    self.value_start = self.pos
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    self._emit(events, buf[self.value_start:self.pos + 1])
+                elif self.depth == 0:
+                    self._emit(events, buf[self.value_start:self.pos])
+                    self.pos = len(buf)
+                    break
+            elif ch == "," and self.depth == 1:
+                self._emit(events, buf[self.value_start:self.pos])
+            elif self.depth == 1 and self.key is not None and self.value_start is None and not ch.isspace() and ch != ":":
+                self.value_start = self.pos
+            self.pos += 1
+        if self.in_string and self.depth == 1 and self.key is not None and self.value_start == self.string_start:
+            partial = self._partial_string(buf[self.value_start:])
+            if partial is not None:
+                events.append(("partial", self.key, partial))
+        return events
+
+    def _emit(self, events, raw):
+        if self.key is not None and self.value_start is not None and raw.strip():
+            value = self._loads(raw.strip())
+            if value is not None and self.key not in self.emitted:
+                self.emitted.add(self.key)
+                events.append(("field", self.key, value))
+        self.key = None
+        self.value_start = None
+
+    @staticmethod
+    def _loads(raw):
+        try:
+            return json.loads(raw, strict=False)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _partial_string(raw):
+        # Close the open string, dropping a dangling escape sequence if needed
+        for cut in range(0, 7):
+            candidate = raw[:len(raw) - cut] if cut else raw
+            value = FieldStream._loads(candidate + '"')
+            if value is not None:
+                return value
+        return None
@@ -0,0 +1,300 @@
+import copy
+import json
+import re
+import threading
+
+from router import max_tokens_for
+
+FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+CONTROL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+LIST_SEPARATOR = re.compile(r"\s*[,;\n]\s*")
+STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+# Fields without a default are required; "tokens" is the expected output size
+CAMPAIGN_SCHEMA = {
+    "productName": {"type": "string", "example": "product name", "tokens": 16},
+    "productDescription": {"type": "string", "example": "2-3 sentences", "tokens": 90},
+    "adCopy": {"type": "string", "example": "3 compelling paragraphs about the product", "tokens": 400},
+    "keywords": {"type": "array", "example": "keyword", "items": 5, "min_items": 3, "max_items": 10,
+                 "tokens": 5 * 6, "default": []},
+    "celebrityEndorsement": {"type": "string", "example": "A celebrity quote endorsement", "tokens": 50,
+                             "default": ""},
+    "features": {"type": "array", "example": "feature", "items": 4, "min_items": 3, "max_items": 8,
+                 "tokens": 4 * 14, "default": []},
+}
+
+
+class StructuredOutputError(ValueError):
+    def __init__(self, message, fields):
+        super().__init__(message)
+        self.fields = fields
+
+
+def _next_char(text, i):
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _closes_string(text, i, is_key):
+    # Is the quote at i the end of the string, or an unescaped quote inside it?
+    nxt = _next_char(text, i + 1)
+    if is_key:
+        return nxt in (":", "")
+    if nxt == ",":
+        # '"a", "b"' ends a value; '"quoted", she said' does not
+        return _next_char(text, text.index(",", i + 1) + 1) in ('"', "{", "[", "]", "}", "")
+    return nxt in ("}", "]", "")
+
+
+def repair_json(text):
+    # One pass over the first {...} in text: escapes raw newlines and stray quotes inside
+    # strings, drops trailing commas and anything after the object, and on truncation
+    # cuts back to the last complete value and closes the open brackets. Dropped values
+    # then fail validation and are re-requested instead of the whole response.
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("no JSON object in response")
+    out, stack = [], []
+    in_string = is_key = escape = expect_key = False
+    safe = (0, [])
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                out.append(c)
+                escape = False
+            elif c == "\\":
+                out.append(c)
+                escape = True
+            elif c == '"':
+                if _closes_string(text, i, is_key):
+                    out.append(c)
+                    in_string = False
+                    if not is_key:
+                        safe = (len(out), list(stack))
+                else:
+                    out.append('\\"')
+            elif c in STRING_ESCAPES:
+                out.append(STRING_ESCAPES[c])
+            elif c >= " ":
+                out.append(c)
+            continue
+        if c == '"':
+            in_string = True
+            is_key = expect_key and bool(stack) and stack[-1] == "{"
+            out.append(c)
+        elif c in "{[":
+            stack.append(c)
+            expect_key = c == "{"
+            out.append(c)
+            safe = (len(out), list(stack))
+        elif c in "}]":
+            if not stack:
+                break
+            while out and (out[-1] == "," or out[-1].isspace()):
+                out.pop()
+            out.append("}" if stack.pop() == "{" else "]")
+            expect_key = False
+            safe = (len(out), list(stack))
+            if not stack:
+                return "".join(out)
+        elif c == ",":
+            safe = (len(out), list(stack))
+            out.append(c)
+            expect_key = bool(stack) and stack[-1] == "{"
+        elif c == ":":
+            out.append(c)
+            expect_key = False
+        elif c >= " " or c in "\n\r\t":
+            out.append(c)
+    # Truncated: keep what was complete
+    length, stack = safe
+    out = out[:length]
+    while out and (out[-1] == "," or out[-1].isspace() or out[-1] == ":"):
+        out.pop()
+    return "".join(out) + "".join("}" if b == "{" else "]" for b in reversed(stack))
+
+
+def loads(content):
+    # Returns (data, repaired); raises ValueError if nothing usable is left
+    text = (content or "").strip()
+    if "```" in text:
+        text = FENCE.search(text).group(1).strip()
+    try:
+        data = json.loads(CONTROL.sub("", text))
+        repaired = False
+    except ValueError:
+        data = json.loads(repair_json(text))
+        repaired = True
+    if not isinstance(data, dict):
+        raise ValueError("response is not a JSON object")
+    return data, repaired
+
+
+class StructuredOutput:
+    # Declared schema for a JSON completion: prompt example, JSON mode / JSON schema
+    # response_format, tolerant parsing, per-field validation and a follow-up request
+    # for just the fields that failed.
+    def __init__(self, schema, name="campaign", mode="json_object"):
+        self.schema = schema
+        self.name = name
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.clean = 0
+        self.repaired = 0
+        self.unparseable = 0
+        self.field_failures = {}
+        self.followups = 0
+        self.recovered = 0
+        self.defaulted = 0
+        self.failed = 0
+        self.rejections = 0
+
+    def example(self, fields=None):
+        # The JSON shape shown in the prompt
+        lines = []
+        for name in fields or self.schema:
+            spec = self.schema[name]
+            value = spec["example"]
+            if spec["type"] == "array":
+                value = [f"{value}{i}" for i in range(1, spec["items"] + 1)]
+            lines.append(f"    {json.dumps(name)}: {json.dumps(value)}")
+        return "{\n" + ",\n".join(lines) + "\n}"
+
+    def json_schema(self, fields=None):
+        fields = list(fields or self.schema)
+        properties = {}
+        for name in fields:
+            spec = self.schema[name]
+            if spec["type"] == "array":
+                properties[name] = {"type": "array", "items": {"type": "string"},
+                                    "minItems": spec["min_items"], "maxItems": spec["max_items"]}
+            else:
+                properties[name] = {"type": "string", "minLength": 1}
+        return {"type": "object", "properties": properties, "required": fields, "additionalProperties": False}
+
+    def response_format(self, fields=None):
+        # Provider-side JSON: "json_object" (JSON mode), "json_schema" or "off"
+        if self.mode == "json_object":
+            return {"type": "json_object"}
+        if self.mode == "json_schema":
+            return {"type": "json_schema", "json_schema": {"name": self.name, "schema": self.json_schema(fields)}}
+        return None
+
+    def rejected_output(self, error):
+        # The text of a completion the provider's JSON mode refused, or None. Groq answers
+        # 400 json_validate_failed with it in the error body; it is repaired and
+        # followed up like any other response instead of losing the call.
+        body = getattr(error, "body", None)
+        if isinstance(body, dict):
+            body = body.get("error", body)
+        text = body.get("failed_generation") if isinstance(body, dict) else None
+        if not isinstance(text, str):
+            return None
+        with self._lock:
+            self.rejections += 1
+        return text
+
+    def token_budgets(self, fields=None):
+        return {name: self.schema[name]["tokens"] for name in fields or self.schema}
+
+    def validate(self, data, fields=None):
+        # Returns (valid, failed): valid values coerced to the schema, names of the rest
+        valid, failed = {}, []
+        for name in fields or self.schema:
+            spec = self.schema[name]
+            value = data.get(name)
+            if spec["type"] == "array":
+                if isinstance(value, str):
+                    value = LIST_SEPARATOR.split(value)
+                if isinstance(value, list):
+                    value = [str(v).strip() for v in value
+                             if isinstance(v, (str, int, float)) and str(v).strip()][:spec["max_items"]]
+                ok = isinstance(value, list) and len(value) >= spec["min_items"]
+            else:
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    value = str(value)
+                ok = isinstance(value, str) and bool(value.strip())
+                value = value.strip() if ok else value
+            if ok:
+                valid[name] = value
+            else:
+                failed.append(name)
+        return valid, failed
+
+    def parse(self, content, fields=None):
+        # Returns (valid, failed, how) where how is "clean", "repaired" or "unparseable"
+        try:
+            data, repaired = loads(content)
+        except ValueError:
+            return {}, list(fields or self.schema), "unparseable"
+        valid, failed = self.validate(data, fields)
+        return valid, failed, "repaired" if repaired else "clean"
+
+    def followup_params(self, params, valid, failed):
+        # Continues the original conversation asking for only the failed fields
+        messages = list(params["messages"]) + [
+            {"role": "assistant", "content": json.dumps(valid)},
+            {"role": "user", "content": f"""That response was incomplete. Keep the fields above and return ONLY a JSON object with these fields:
+{self.example(failed)}"""},
+        ]
+        followup = dict(params, messages=messages, max_tokens=max_tokens_for(self.token_budgets(failed)))
+        response_format = self.response_format(failed)
+        if response_format:
+            followup["response_format"] = response_format
+        return followup
+
+    def complete(self, content, followup=None):
+        # Parses a response; fields that fail are re-requested once through
+        # followup(valid, failed), which returns the follow-up response text. Optional
+        # fields that still fail get their defaults, required ones raise.
+        valid, failed = self._first(content)
+        if failed and followup:
+            failed = self._merge(valid, failed, followup(valid, failed))
+        return self._finish(valid, failed)
+
+    async def acomplete(self, content, followup=None):
+        # complete() with a coroutine followup
+        valid, failed = self._first(content)
+        if failed and followup:
+            failed = self._merge(valid, failed, await followup(valid, failed))
+        return self._finish(valid, failed)
+
+    def _first(self, content):
+        valid, failed, how = self.parse(content)
+        with self._lock:
+            self.responses += 1
+            setattr(self, how, getattr(self, how) + 1)
+            for name in failed:
+                self.field_failures[name] = self.field_failures.get(name, 0) + 1
+        return valid, failed
+
+    def _merge(self, valid, failed, content):
+        extra, failed, _ = self.parse(content, failed)
+        valid.update(extra)
+        with self._lock:
+            self.followups += 1
+            self.recovered += len(extra)
+        return failed
+
+    def _finish(self, valid, failed):
+        missing = [name for name in failed if "default" not in self.schema[name]]
+        if missing:
+            with self._lock:
+                self.failed += 1
+            raise StructuredOutputError(f"Invalid {self.name} fields: {', '.join(missing)}", missing)
+        for name in failed:
+            valid[name] = copy.deepcopy(self.schema[name]["default"])
+        with self._lock:
+            self.defaulted += len(failed)
+        return valid
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "responses": self.responses, "clean": self.clean, "repaired": self.repaired,
+                    "unparseable": self.unparseable, "fieldFailures": dict(self.field_failures),
+                    "followups": self.followups, "recoveredFields": self.recovered, "defaulted": self.defaulted,
+                    "failed": self.failed, "rejectedByProvider": self.rejections,
+                    "failureRate": round(self.failed / self.responses, 4) if self.responses else 0.0}